@@ -0,0 +1,109 @@
+"""
+短期上下文基准测试
+
+模拟 N 个同时在线的会话，每轮为随机一个会话写入一条消息并调用 format(exclude_last_n=1)
+(与 ChatService 每轮构造 Prompt 的路径一致)，对比：
+1. legacy：列表 + 字典存消息，溢出时切片复制列表，每轮重新渲染全部行 (旧实现)
+2. current：ConversationContext (deque + __slots__ 记录 + 增量渲染缓存 + token 预算)
+
+输出每轮 p50/p99 延迟与总吞吐，以及全部会话常驻后的内存占用 (tracemalloc)。
+
+用法:
+    python scripts/bench_context.py --contexts 10000 --turns 200000
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+import tracemalloc
+from pathlib import Path
+
+# 添加项目根目录到 sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.core.context import ConversationContext
+
+WORDS = ["今天", "好累", "哈哈", "你在干嘛", "吃饭了吗", "周末去看电影吧", "下雨了", "我刚下班", "晚安", "想你了",
+         "这个游戏好难", "明天要考试", "猫又把杯子打翻了", "老板让我加班", "好想去海边"]
+
+
+class LegacyContext:
+    """旧版 ConversationContext 的消息存储与格式化逻辑，作为对照。"""
+
+    def __init__(self, max_history: int = 20):
+        self.history = []
+        self.summary = "暂无前情提要"
+        self.max_history = max_history
+
+    def add_message(self, role: str, content: str):
+        self.history.append({"role": role, "content": content, "timestamp": time.time()})
+        if len(self.history) > self.max_history:
+            self.history = self.history[-self.max_history:]
+
+    def format(self, exclude_last_n: int = 0) -> str:
+        lines = ["【前情提要】", self.summary, "", "【近期对话】"]
+        msgs_to_show = self.history[:-exclude_last_n] if exclude_last_n > 0 else self.history
+        if not msgs_to_show:
+            lines.append("（暂无近期对话）")
+        else:
+            for msg in msgs_to_show:
+                role_name = "User" if msg["role"] == "user" else "AI"
+                lines.append(f"{role_name}: {msg['content']}")
+        return "\n".join(lines)
+
+
+def make_message() -> str:
+    return "，".join(random.choice(WORDS) for _ in range(random.randint(1, 6)))
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def bench(name: str, factory, contexts: int, turns: int, warmup: int):
+    tracemalloc.start()
+    pool = [factory() for _ in range(contexts)]
+    # 预热：每个会话先写满窗口
+    for ctx in pool:
+        for i in range(warmup):
+            ctx.add_message("user" if i % 2 == 0 else "ai", make_message())
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    plan = [(random.randrange(contexts), make_message()) for _ in range(turns)]
+    latencies = []
+    start = time.perf_counter()
+    for i, (index, text) in enumerate(plan):
+        ctx = pool[index]
+        t0 = time.perf_counter()
+        ctx.add_message("user" if i % 2 == 0 else "ai", text)
+        ctx.format(exclude_last_n=1)
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+
+    print(f"{name:<8} p50: {statistics.median(latencies) * 1e6:7.2f} us | p99: {percentile(latencies, 0.99) * 1e6:7.2f} us | "
+          f"throughput: {turns / total:10.0f} turns/s | memory: {memory / 1024 / 1024:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="短期上下文 (ConversationContext) 基准测试")
+    parser.add_argument("--contexts", type=int, default=10000, help="同时在线的会话数")
+    parser.add_argument("--turns", type=int, default=200000, help="总消息数")
+    parser.add_argument("--max-history", type=int, default=20, help="窗口消息条数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    print(f"== {args.contexts} contexts | {args.turns} turns | max_history: {args.max_history} ==")
+    for name, factory in (
+        ("legacy", lambda: LegacyContext(args.max_history)),
+        ("current", lambda: ConversationContext(max_history=args.max_history)),
+    ):
+        random.seed(args.seed)
+        bench(name, factory, args.contexts, args.turns, args.max_history)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+消息防抖 (debounce) 负载测试
+
+模拟 N 个用户在一个时间窗口内连续发送消息，每条消息都会重置该用户的收集计时，
+计时到期后 "处理" 该用户缓冲的全部消息 (用 sleep 模拟一次回复)。对比：
+1. timer：每条消息 cancel 旧的 threading.Timer 再新建一个 (旧实现)
+2. wheel：TimerWheel 单线程时间轮 + 有界线程池 (InteractionManager 当前实现)
+
+输出：调度调用的 p50/p99 耗时、进程线程数峰值、到期触发延迟 (lag) 的 p50/p99，
+以及每个用户是否恰好被处理一次。
+
+用法:
+    python scripts/bench_debounce.py --users 10000 --messages 3 --window 2 --delay 1
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+import statistics
+from pathlib import Path
+
+# 添加项目根目录到 sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.core.timer_wheel import TimerWheel
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Harness:
+    """记录每个用户的缓冲、最后期限与处理结果。"""
+
+    def __init__(self, work: float):
+        self.work = work
+        self.lock = threading.Lock()
+        self.buffers = {}
+        self.deadlines = {}
+        self.flushed = {}
+        self.lags = []
+
+    def add(self, user_id: int, delay: float):
+        with self.lock:
+            self.buffers[user_id] = self.buffers.get(user_id, 0) + 1
+            self.deadlines[user_id] = time.monotonic() + delay
+
+    def process(self, user_id: int):
+        with self.lock:
+            lag = time.monotonic() - self.deadlines[user_id]
+            count = self.buffers.pop(user_id, 0)
+            if not count:
+                return
+            self.flushed[user_id] = self.flushed.get(user_id, 0) + 1
+            self.lags.append(lag)
+        time.sleep(self.work)
+
+
+def run(mode: str, events, delay: float, work: float, workers: int):
+    harness = Harness(work)
+    timers = {}
+    wheel = None
+    if mode == "wheel":
+        wheel = TimerWheel(workers=workers, name="BenchTimer")
+        wheel.start()
+
+    def schedule(user_id: int):
+        harness.add(user_id, delay)
+        if wheel is not None:
+            wheel.schedule(("debounce", user_id), delay, harness.process, user_id)
+            return
+        old = timers.get(user_id)
+        if old is not None:
+            old.cancel()
+        timer = threading.Timer(delay, harness.process, args=[user_id])
+        timer.daemon = True
+        timer.start()
+        timers[user_id] = timer
+
+    peak_threads = [threading.active_count()]
+    stop_sampler = threading.Event()
+
+    def sample():
+        while not stop_sampler.wait(0.05):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    costs = []
+    start = time.monotonic()
+    for at, user_id in events:
+        wait = start + at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        t0 = time.perf_counter()
+        schedule(user_id)
+        costs.append(time.perf_counter() - t0)
+
+    users = {user_id for _, user_id in events}
+    # 等待全部用户处理完毕
+    deadline = time.monotonic() + delay + 30
+    while time.monotonic() < deadline:
+        with harness.lock:
+            if len(harness.flushed) == len(users) and not harness.buffers:
+                break
+        time.sleep(0.05)
+    stop_sampler.set()
+    if wheel is not None:
+        wheel.stop()
+
+    duplicates = sum(1 for count in harness.flushed.values() if count > 1)
+    print(f"{mode:<6} schedule p50: {statistics.median(costs) * 1e6:7.1f} us | p99: {percentile(costs, 0.99) * 1e6:8.1f} us | "
+          f"peak threads: {peak_threads[0]:6d} | lag p50: {statistics.median(harness.lags) * 1000:6.1f} ms | "
+          f"p99: {percentile(harness.lags, 0.99) * 1000:7.1f} ms | flushed: {len(harness.flushed)}/{len(users)} | duplicates: {duplicates}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息防抖负载测试 (threading.Timer vs TimerWheel)")
+    parser.add_argument("--users", type=int, default=10000, help="模拟用户数")
+    parser.add_argument("--messages", type=int, default=3, help="每个用户连发的消息数")
+    parser.add_argument("--window", type=float, default=2.0, help="消息到达的时间窗口 (秒)")
+    parser.add_argument("--delay", type=float, default=1.0, help="防抖收集时间 (秒)")
+    parser.add_argument("--work", type=float, default=0.001, help="每次处理缓冲的模拟耗时 (秒)")
+    parser.add_argument("--workers", type=int, default=8, help="时间轮线程池大小")
+    parser.add_argument("--modes", nargs="+", default=["timer", "wheel"], choices=["timer", "wheel"])
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logging.getLogger("TimerWheel").setLevel(logging.WARNING)
+
+    # 每个用户的消息在窗口内随机到达，间隔小于防抖时间时会不断重置计时
+    events = []
+    for user_id in range(args.users):
+        first = random.uniform(0, args.window)
+        for i in range(args.messages):
+            events.append((first + i * random.uniform(0, args.delay * 0.5), user_id))
+    events.sort()
+
+    print(f"== {args.users} users | {len(events)} messages | window: {args.window}s | delay: {args.delay}s ==")
+    for mode in args.modes:
+        run(mode, events, args.delay, args.work, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+LLMClient 传输层基准测试
+
+在本地启动一个 OpenAI 兼容的桩服务器 (stub server)，对比：
+1. 裸 requests.post（每次请求新建连接）
+2. LLMClient 共享连接池（Keep-Alive 复用）
+3. LLMClient 流式调用 (stream_chat_completion，SSE)
+
+分别统计顺序调用与并发调用下的 p50 / p99 延迟。
+桩服务器会校验流式请求体 (stream / stream_options)，不符合时返回 400，流式场景随之报错。
+
+用法:
+    python scripts/bench_llm_transport.py --requests 500 --concurrency 16
+"""
+
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import statistics
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# 添加项目根目录到 sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.core.config import SystemConfig
+from src.core.llm_client import LLMClient
+
+STUB_RESPONSE = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "嗯嗯$我在呢"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+}).encode("utf-8")
+
+STREAM_CHUNKS = ["嗯嗯", "$我在", "呢"]
+
+
+def stub_stream_body(include_usage: bool) -> bytes:
+    """按 OpenAI 流式格式拼出完整的 SSE 响应体；include_usage 时追加只含 usage 的最后一个 chunk。"""
+    events = [{"choices": [{"index": 0, "delta": {"content": text}}]} for text in STREAM_CHUNKS]
+    if include_usage:
+        events.append({"choices": [], "usage": {"prompt_tokens": 1, "completion_tokens": 3, "total_tokens": 4}})
+    lines = [f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events]
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 才会保持连接
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def setup(self):
+        super().setup()
+        # 关闭 Nagle，避免响应头与响应体分两次写入时触发 Delayed ACK 的 40ms 停顿
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.latency:
+            time.sleep(self.latency)
+        body, content_type, status = STUB_RESPONSE, "application/json", 200
+        if "stream_options" in request or request.get("stream"):
+            if request.get("stream") is not True:
+                body, status = b'{"error": "stream_options requires stream=true"}', 400
+            else:
+                include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                body, content_type = stub_stream_body(include_usage), "text/event-stream"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # 默认 backlog 只有 5，并发突发时会被内核直接重置连接
+    request_queue_size = 1024
+
+
+def start_stub_server(latency: float) -> ThreadingHTTPServer:
+    StubHandler.latency = latency
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(call, total: int, concurrency: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def one():
+        start = time.perf_counter()
+        call()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    wall_start = time.perf_counter()
+    if concurrency <= 1:
+        for _ in range(total):
+            one()
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in range(total):
+                pool.submit(one)
+    wall = time.perf_counter() - wall_start
+    return latencies, wall
+
+
+def report(name: str, latencies, wall: float):
+    print(
+        f"{name:<28} p50: {percentile(latencies, 50) * 1000:7.2f}ms | "
+        f"p99: {percentile(latencies, 99) * 1000:7.2f}ms | "
+        f"mean: {statistics.mean(latencies) * 1000:7.2f}ms | "
+        f"throughput: {len(latencies) / wall:8.1f} req/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLMClient 连接池基准测试")
+    parser.add_argument("--requests", type=int, default=300, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发场景的线程数")
+    parser.add_argument("--latency", type=float, default=0.0, help="桩服务器模拟的处理延迟 (秒)")
+    args = parser.parse_args()
+
+    # 逐请求日志会淹没测量结果
+    logging.getLogger("LLMClient").setLevel(logging.WARNING)
+
+    server = start_stub_server(args.latency)
+    api_url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    print(f"Stub server: {api_url}")
+
+    system_config = SystemConfig(
+        telegram={"bot_token": "bench"},
+        llm={"api_key": "bench", "api_url": api_url, "pool_maxsize": max(args.concurrency, 1)}
+    )
+    client = LLMClient(system_config)
+    messages = [{"role": "user", "content": "你好"}]
+    payload = {"model": "stub", "messages": messages}
+
+    def bare_call():
+        response = requests.post(api_url, json=payload, timeout=60)
+        response.raise_for_status()
+        response.json()
+
+    def pooled_call():
+        client.chat_completion(messages)
+
+    def stream_call():
+        for _ in client.stream_chat_completion(messages):
+            pass
+
+    # 预热，建立首批连接；同时确认流式请求体被桩服务器接受并能完整拼出回复
+    run(pooled_call, 10, 1)
+    completion_tokens = client.usage_metrics.snapshot()["completion_tokens"]
+    streamed = "".join(client.stream_chat_completion(messages))
+    assert streamed == "".join(STREAM_CHUNKS), f"流式回复不完整: {streamed!r}"
+    assert client.usage_metrics.snapshot()["completion_tokens"] == completion_tokens + 3, "流式调用未记录 usage"
+
+    for label, concurrency in (("sequential", 1), (f"concurrent x{args.concurrency}", args.concurrency)):
+        print(f"\n== {label} ({args.requests} requests) ==")
+        report("requests.post (no pool)", *run(bare_call, args.requests, concurrency))
+        report("LLMClient (pooled)", *run(pooled_call, args.requests, concurrency))
+        report("LLMClient (stream)", *run(stream_call, args.requests, concurrency))
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+记忆维护基准测试
+
+在临时目录中为单个用户生成 N 条记忆，对比一次维护 (衰减 + 清理) 的耗时：
+1. legacy: 整表读入 Python，逐行判断，每次 UPDATE 都 connect/commit/close（旧实现）
+2. batched: 整表读入 Python 判断，executemany 在一个事务内批量写回
+3. set-based: MemoryService 当前实现，一条 UPDATE + 一条 DELETE，在同一事务内完成
+
+每个场景都在同一份数据的独立副本上运行，保证输入一致。
+
+用法:
+    python scripts/bench_memory_maintenance.py --sizes 10000 100000
+"""
+
+import sys
+import time
+import shutil
+import random
+import sqlite3
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.core.memory.engine import SQLiteEngine
+from src.core.memory.policy import MemoryPolicy
+from src.core.memory.repository import MemoryRepository
+from src.core.memory.service import MemoryService
+
+USER_ID = 1
+
+
+def seed(data_dir: str, size: int):
+    """生成 size 条分布随机的记忆：重要性、创建时间、有效期、最后提及时间各不相同。"""
+    repo = MemoryRepository(USER_ID, data_dir)
+    now = datetime.utcnow()
+    rows = []
+    for i in range(size):
+        create_time = now - timedelta(days=random.uniform(0, 400))
+        last_mentioned = None
+        if random.random() < 0.5:
+            last_mentioned = (now - timedelta(days=random.uniform(0, 30))).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((
+            f"2024-01-01 事件{i}",
+            "关键词a,关键词b",
+            random.randint(5, 100),
+            create_time.strftime("%Y-%m-%d %H:%M:%S"),
+            random.choice([7, 30, 90, MemoryPolicy.PERMANENT_EXPIRY_DAYS]),
+            last_mentioned
+        ))
+    repo.engine.executemany(
+        "INSERT INTO memories (event, keywords, importance, create_time, expiry_days, last_mentioned) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    # 直接写入的种子数据不经过变更日志，补一份快照作为日志基线
+    repo.compact_backup()
+    SQLiteEngine.close_all()
+
+
+def legacy_maintenance(db_path: str):
+    """旧实现：整表读取 + 逐行 connect/UPDATE/commit/close。"""
+    def all_rows():
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT * FROM memories").fetchall()
+        conn.close()
+        return rows
+
+    for mem_id, _, _, imp, _, _, last_mentioned in all_rows():
+        new_imp = MemoryPolicy.calculate_decay(imp, last_mentioned)
+        if MemoryPolicy.should_persist_decay(imp, new_imp):
+            conn = sqlite3.connect(db_path)
+            conn.execute("UPDATE memories SET importance = ? WHERE id = ?", (new_imp, mem_id))
+            conn.commit()
+            conn.close()
+
+    to_delete = [
+        mem_id for mem_id, _, _, imp, create_time, expiry_days, last_mentioned in all_rows()
+        if MemoryPolicy.should_delete_memory(imp, create_time, expiry_days, last_mentioned)
+    ]
+    if to_delete:
+        conn = sqlite3.connect(db_path)
+        placeholders = ','.join('?' for _ in to_delete)
+        conn.execute(f"DELETE FROM memories WHERE id IN ({placeholders})", to_delete)
+        conn.commit()
+        conn.close()
+
+
+def batched_maintenance(repo: MemoryRepository):
+    """中间方案：Python 判断，executemany 批量写回，单事务。"""
+    with repo.transaction():
+        updates = []
+        for mem_id, _, _, imp, _, _, last_mentioned in repo.get_all_memories():
+            new_imp = MemoryPolicy.calculate_decay(imp, last_mentioned)
+            if MemoryPolicy.should_persist_decay(imp, new_imp):
+                updates.append((mem_id, new_imp))
+        repo.update_importance_batch(updates)
+
+        to_delete = [
+            mem_id for mem_id, _, _, imp, create_time, expiry_days, last_mentioned in repo.get_all_memories()
+            if MemoryPolicy.should_delete_memory(imp, create_time, expiry_days, last_mentioned)
+        ]
+        repo.delete_memories_batch(to_delete)
+
+
+def set_based_maintenance(service: MemoryService):
+    """当前实现：集合式 SQL，单事务。"""
+    with service.repo.transaction():
+        service._perform_maintenance()
+        service._cleanup_low_importance()
+
+
+def count_rows(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+    conn.close()
+    return count
+
+
+def bench(size: int, skip_legacy: bool):
+    template_dir = tempfile.mkdtemp(prefix="bench_mem_")
+    seed(template_dir, size)
+    print(f"\n== {size} memories ==")
+
+    def fresh_copy() -> str:
+        work_dir = tempfile.mkdtemp(prefix="bench_mem_")
+        shutil.copy(Path(template_dir) / f"user_{USER_ID}.db", work_dir)
+        shutil.copy(Path(template_dir) / f"user_{USER_ID}_changes.jsonl", work_dir)
+        return work_dir
+
+    results = {}
+    scenarios = ["batched", "set-based"] if skip_legacy else ["legacy", "batched", "set-based"]
+    for name in scenarios:
+        work_dir = fresh_copy()
+        db_path = str(Path(work_dir) / f"user_{USER_ID}.db")
+        start = time.perf_counter()
+        if name == "legacy":
+            legacy_maintenance(db_path)
+        elif name == "batched":
+            batched_maintenance(MemoryRepository(USER_ID, work_dir))
+        else:
+            set_based_maintenance(MemoryService(USER_ID, work_dir))
+        elapsed = time.perf_counter() - start
+        SQLiteEngine.close_all()
+
+        results[name] = elapsed
+        print(f"{name:<10} {elapsed * 1000:10.1f} ms | remaining rows: {count_rows(db_path)}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = results.get("legacy", results["batched"])
+    print(f"speedup (set-based vs {'legacy' if 'legacy' in results else 'batched'}): {baseline / results['set-based']:.1f}x")
+    shutil.rmtree(template_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="记忆衰减/清理维护基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="每个用户的记忆条数")
+    parser.add_argument("--skip-legacy", action="store_true", help="跳过逐行提交的旧实现（大数据量下非常慢）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logging.getLogger("MemoryService").setLevel(logging.WARNING)
+
+    for size in args.sizes:
+        bench(size, args.skip_legacy)
+
+
+if __name__ == "__main__":
+    main()
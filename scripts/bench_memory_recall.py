@@ -0,0 +1,104 @@
+"""
+记忆语义检索基准测试
+
+为单个用户生成 N 条合成记忆，计算文本向量后分别建立扁平 (flat) 与 IVF 索引，对比：
+1. 建索引耗时 (IVF 包含 k-means 训练)
+2. 单次 top-k 查询的 p50/p99 延迟
+3. IVF 相对扁平检索的召回率 (recall@k，扁平检索即精确结果)
+
+查询取自随机记忆的片段，模拟 "当前这句话与某条旧记忆相关" 的场景。
+
+用法:
+    python scripts/bench_memory_recall.py --sizes 1000 10000 100000
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import statistics
+from pathlib import Path
+
+# 添加项目根目录到 sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.core.memory import embedding
+from src.core.memory.vector_index import VectorIndex
+
+SUBJECTS = ["猫", "狗", "蛋糕", "咖啡", "火锅", "电影", "游戏", "跑步", "吉他", "考试", "面试", "旅行", "加班", "搬家", "生日", "感冒"]
+PLACES = ["上海", "北京", "杭州", "成都", "公司", "学校", "家里", "医院", "健身房", "机场"]
+VERBS = ["喜欢", "讨厌", "计划", "担心", "提到", "想要", "刚刚完成", "经常聊起"]
+DETAIL_CHARS = "的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长知民样现分将外但身些与高意进把法此实回二理美点月明其种声全工己话儿者向情部正名定女问力机给等几很业最间新什打便位因重被走电四第门相次东政海口使教西再平真听世气信北少关并内加化由却代军产入先山五太水万市眼体别处总才场师书比住员九笑性通目华报立马命张活难神数件安表原车白应路期叫死常提感金何更反合放做系计或司利受光王果亲界及今京务制解各任至清物台象记边共风战干接它许八特觉望直服毛林题建南度统色字请交爱让认算论百吃义科怎元社术结六功指思非流每青管夫连远资队跟带花快条院变联言权往展该领传近留红治决周保达办运武半候七必城父强步完革深区即求品士转量空甚众技轻程告江语英基派满式李息写呢识极令黄德收脸钱党倒未持取设始版双历越史商千片容研像找友孩站广改议形委早房音火际则首单据导影失拿网香似斯专石若兵弟谁校读志飞观争究包组造落视济喜离虽坏兴切米"
+
+
+def make_memory(i: int) -> str:
+    subject, place, verb = random.choice(SUBJECTS), random.choice(PLACES), random.choice(VERBS)
+    detail = "".join(random.choice(DETAIL_CHARS) for _ in range(random.randint(4, 10)))
+    return f"2024-01-01 用户{verb}在{place}的{subject}，{detail}"
+
+
+def make_query(text: str) -> str:
+    """截取记忆正文的一段作为查询。"""
+    body = text.split(" ", 1)[1]
+    start = random.randint(0, max(0, len(body) - 8))
+    return body[start:start + random.randint(4, 8)]
+
+
+def timed_searches(index: VectorIndex, queries, k: int):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([memory_id for memory_id, _ in index.search(query, k)])
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def bench(size: int, queries: int, k: int):
+    texts = [make_memory(i) for i in range(size)]
+    start = time.perf_counter()
+    vectors = embedding.embed_batch(texts)
+    embed_time = time.perf_counter() - start
+    query_vecs = [embedding.embed(make_query(random.choice(texts))) for _ in range(queries)]
+    print(f"\n== {size} memories | embed: {embed_time * 1000:.0f} ms ({embed_time / size * 1e6:.1f} us/条) ==")
+
+    exact = None
+    for name, ivf_min_size in (("flat", size + 1), ("ivf", 0)):
+        index = VectorIndex(ivf_min_size=ivf_min_size)
+        start = time.perf_counter()
+        index.upsert_many(enumerate(vectors))
+        build_time = time.perf_counter() - start
+        latencies, results = timed_searches(index, query_vecs, k)
+
+        line = (f"{name:<5} build: {build_time * 1000:8.1f} ms | "
+                f"p50: {statistics.median(latencies) * 1e6:8.1f} us | p99: {percentile(latencies, 0.99) * 1e6:8.1f} us")
+        if exact is None:
+            exact = results
+        else:
+            hits = sum(len(set(a) & set(b)) for a, b in zip(exact, results))
+            line += f" | recall@{k}: {hits / max(1, sum(len(a) for a in exact)):.3f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="记忆语义检索 (flat vs IVF) 基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="每个用户的记忆条数")
+    parser.add_argument("--queries", type=int, default=500, help="查询次数")
+    parser.add_argument("--k", type=int, default=8, help="每次查询返回的条数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logging.getLogger("VectorIndex").setLevel(logging.WARNING)
+
+    for size in args.sizes:
+        bench(size, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Telegram Webhook 接入负载测试
+
+向 Webhook 端点并发推送合成的 Telegram 更新 (message 类型，分布在多个会话上，并按比例
+重复推送以模拟 Telegram 重发)，每条更新的处理用 sleep 模拟一次 handler 调用。
+默认在进程内通过 ASGI 直接调用 create_webhook_app (不经过网络)；指定 --url 时改为
+向已启动的服务 (telegram.mode = webhook) 发送真实 HTTP 请求，此时只统计接收侧指标。
+
+对比不同的工作线程数 (--workers 1 相当于 polling 模式下的串行处理)，输出：
+接收吞吐 (请求/秒)、应答延迟 p50/p99、全部处理完成的耗时与处理吞吐、
+去重 / 拒绝计数，以及同一会话内处理顺序是否与推送顺序一致。
+
+用法:
+    python scripts/bench_webhook_ingress.py --updates 20000 --chats 500 --concurrency 64 --workers 1 8
+    python scripts/bench_webhook_ingress.py --url http://127.0.0.1:8443/telegram/webhook --secret xxx
+"""
+
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import threading
+import statistics
+from pathlib import Path
+
+# 添加项目根目录到 sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from src.core.config import TelegramWebhookConfig
+from src.bot.telegram.webhook import SECRET_HEADER, WebhookIngress, create_webhook_app
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def make_updates(count: int, chats: int, duplicate_ratio: float):
+    """生成 count 条不同的更新，并按比例插入重复推送。"""
+    updates = []
+    for update_id in range(1, count + 1):
+        chat_id = random.randrange(1, chats + 1)
+        updates.append({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "bench"},
+                "text": f"message {update_id}",
+            },
+        })
+    duplicates = [random.choice(updates) for _ in range(int(count * duplicate_ratio))]
+    for update in duplicates:
+        # 重发出现在原推送之后
+        updates.insert(random.randrange(updates.index(update) + 1, len(updates) + 1), update)
+    return updates
+
+
+class Recorder:
+    """模拟 handler：记录每个会话的处理顺序。"""
+
+    def __init__(self, work: float):
+        self.work = work
+        self.lock = threading.Lock()
+        self.order = {}
+        self.count = 0
+
+    def process(self, update):
+        time.sleep(self.work)
+        with self.lock:
+            self.order.setdefault(update["message"]["chat"]["id"], []).append(update["update_id"])
+            self.count += 1
+
+
+async def push(client: httpx.AsyncClient, url: str, updates, concurrency: int, secret: str):
+    """按推送顺序分配给 concurrency 个并发连接，返回 (耗时, 应答延迟列表, 状态码计数)。"""
+    headers = {SECRET_HEADER: secret} if secret else {}
+    latencies = []
+    statuses = {}
+    cursor = iter(updates)
+
+    async def connection():
+        for update in cursor:
+            t0 = time.perf_counter()
+            response = await client.post(url, json=update, headers=headers)
+            latencies.append(time.perf_counter() - t0)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def run_local(updates, workers: int, args):
+    unique = len({u["update_id"] for u in updates})
+    recorder = Recorder(args.work)
+    config = TelegramWebhookConfig(secret_token=args.secret, workers=workers,
+                                   queue_size=args.queue_size, dedupe_size=args.dedupe_size)
+    ingress = WebhookIngress(recorder.process, config)
+    ingress.start()
+    app = create_webhook_app(ingress)
+
+    async def go():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await push(client, config.path, updates, args.concurrency, args.secret)
+
+    start = time.perf_counter()
+    elapsed, latencies, statuses = asyncio.run(go())
+    # 等待全部入队的更新处理完毕
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and recorder.count < ingress.snapshot()["accepted"]:
+        time.sleep(0.01)
+    drained = time.perf_counter() - start
+    ingress.stop()
+
+    snapshot = ingress.snapshot()
+    out_of_order = sum(1 for ids in recorder.order.values() if ids != sorted(ids))
+    print(f"workers {workers:3d} | ingest: {len(updates) / elapsed:8.0f} req/s | ack p50: {statistics.median(latencies) * 1000:6.2f} ms | "
+          f"p99: {percentile(latencies, 0.99) * 1000:7.2f} ms | drained: {drained:6.2f}s ({recorder.count / drained:7.0f} upd/s) | "
+          f"processed: {recorder.count}/{unique} | duplicates: {snapshot['duplicates']} | 503: {snapshot['overloaded']} | "
+          f"out-of-order chats: {out_of_order}")
+
+
+def run_remote(updates, args):
+    async def go():
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            return await push(client, args.url, updates, args.concurrency, args.secret)
+
+    elapsed, latencies, statuses = asyncio.run(go())
+    print(f"remote | ingest: {len(updates) / elapsed:8.0f} req/s | ack p50: {statistics.median(latencies) * 1000:6.2f} ms | "
+          f"p99: {percentile(latencies, 0.99) * 1000:7.2f} ms | status: {dict(sorted(statuses.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telegram Webhook 接入负载测试")
+    parser.add_argument("--updates", type=int, default=20000, help="不同更新的数量")
+    parser.add_argument("--chats", type=int, default=500, help="更新分布的会话数")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05, help="重复推送占比")
+    parser.add_argument("--concurrency", type=int, default=64, help="并发推送连接数 (Telegram 的 max_connections)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="处理线程数，可给多个值对比")
+    parser.add_argument("--work", type=float, default=0.002, help="每条更新的模拟处理耗时 (秒)")
+    parser.add_argument("--queue-size", type=int, default=100000, help="待处理队列容量")
+    parser.add_argument("--dedupe-size", type=int, default=100000, help="去重窗口")
+    parser.add_argument("--secret", default="bench-secret", help="X-Telegram-Bot-Api-Secret-Token")
+    parser.add_argument("--url", help="向已启动的 Webhook 服务推送 (不指定时在进程内测试)")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logging.getLogger("TelegramWebhook").setLevel(logging.WARNING)
+
+    updates = make_updates(args.updates, args.chats, args.duplicate_ratio)
+    print(f"== {args.updates} updates (+{len(updates) - args.updates} duplicates) | {args.chats} chats | "
+          f"concurrency: {args.concurrency} | work: {args.work * 1000:.1f} ms ==")
+    if args.url:
+        run_remote(updates, args)
+        return
+    for workers in args.workers:
+        run_local(updates, workers, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+长期记忆存储运维工具
+
+子命令:
+    migrate   把 user_memories/ 下的 user_{id}.db 逐个导入 memories.db（按 user_id 分区）
+    maintain  对共享库中的所有用户执行一次衰减 + 清理（一个事务、一次扫描）
+    export    顺序扫描共享库，导出到 memories_backup.csv
+    restore   重放变更日志 (*_changes.jsonl)，重建数据库（需先停止 Bot）
+
+迁移完成后在 config/system.yaml 中设置:
+    memory:
+      storage_mode: "consolidated"
+
+用法:
+    python scripts/memory_store.py migrate [--data-dir user_memories] [--replace] [--dry-run]
+    python scripts/memory_store.py maintain
+    python scripts/memory_store.py export
+    python scripts/memory_store.py restore [--user-id 123] [--output restored.db] [--force]
+"""
+
+import os
+import re
+import sys
+import sqlite3
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到 sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.core.memory.policy import MemoryPolicy
+from src.core.memory.repository import (
+    ConsolidatedMemoryStore, MEMORY_COLUMNS, CONSOLIDATED_DB_NAME, CONSOLIDATED_CHANGELOG_NAME, restore_database
+)
+from src.core.memory.service import USER_MEMORIES_DIR
+
+USER_DB_PATTERN = re.compile(r"^user_(-?\d+)\.db$")
+
+
+def find_user_dbs(data_dir: Path):
+    for path in sorted(data_dir.iterdir()):
+        match = USER_DB_PATTERN.match(path.name)
+        if match:
+            yield int(match.group(1)), path
+
+
+def read_user_db(path: Path):
+    # 只读打开，不修改原文件
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute(f"SELECT {MEMORY_COLUMNS} FROM memories").fetchall()
+    finally:
+        conn.close()
+
+
+def cmd_migrate(args):
+    data_dir = Path(args.data_dir)
+    store = None if args.dry_run else ConsolidatedMemoryStore.for_dir(str(data_dir))
+
+    users = imported = skipped = 0
+    for user_id, path in find_user_dbs(data_dir):
+        try:
+            rows = read_user_db(path)
+        except sqlite3.Error as e:
+            print(f"[SKIP] {path.name}: {e}")
+            continue
+
+        users += 1
+        if store is not None and store.has_user(user_id) and not args.replace:
+            print(f"[SKIP] user {user_id}: 共享库中已存在 (使用 --replace 覆盖)")
+            skipped += 1
+            continue
+
+        if store is not None:
+            store.import_rows(user_id, rows, replace=args.replace)
+        imported += len(rows)
+        print(f"[OK]   user {user_id}: {len(rows)} memories")
+
+    action = "would import" if args.dry_run else "imported"
+    print(f"\n{users} user databases, {action} {imported} memories, skipped {skipped} users")
+    if not args.dry_run:
+        print(f"共享库: {store.db_path}")
+        print("原 user_*.db 文件未删除，确认无误后可手动清理。")
+
+
+def cmd_maintain(args):
+    store = ConsolidatedMemoryStore.for_dir(args.data_dir)
+    value_sql, value_params, decay_where, decay_params = MemoryPolicy.get_decay_sql()
+    cleanup_where, cleanup_params = MemoryPolicy.get_cleanup_sql()
+    decayed, deleted = store.run_maintenance(value_sql, value_params, decay_where, decay_params, cleanup_where, cleanup_params)
+    print(f"decayed: {decayed} | deleted: {deleted}")
+
+
+def cmd_export(args):
+    store = ConsolidatedMemoryStore.for_dir(args.data_dir)
+    count = store.export_csv()
+    print(f"exported {count} memories -> {store.csv_path}")
+
+
+def cmd_restore(args):
+    data_dir = Path(args.data_dir)
+    if args.user_id is None:
+        changelog_path = data_dir / CONSOLIDATED_CHANGELOG_NAME
+        default_output = data_dir / CONSOLIDATED_DB_NAME
+    else:
+        changelog_path = data_dir / f"user_{args.user_id}_changes.jsonl"
+        default_output = data_dir / f"user_{args.user_id}.db"
+    output = Path(args.output) if args.output else default_output
+
+    if not changelog_path.exists():
+        sys.exit(f"变更日志不存在: {changelog_path}")
+    if output.exists():
+        if not args.force:
+            sys.exit(f"目标数据库已存在: {output} (使用 --force 覆盖，或 --output 指定新路径)")
+        for suffix in ("", "-wal", "-shm"):
+            path = Path(str(output) + suffix)
+            if path.exists():
+                os.remove(path)
+
+    count = restore_database(str(changelog_path), str(output), consolidated=args.user_id is None)
+    print(f"restored {count} memories -> {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长期记忆存储运维工具")
+    parser.add_argument("--data-dir", default=USER_MEMORIES_DIR, help="记忆数据目录")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="导入每用户 .db 文件")
+    migrate.add_argument("--replace", action="store_true", help="覆盖共享库中已存在的用户数据")
+    migrate.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    migrate.set_defaults(func=cmd_migrate)
+
+    maintain = subparsers.add_parser("maintain", help="全库衰减 + 清理")
+    maintain.set_defaults(func=cmd_maintain)
+
+    export = subparsers.add_parser("export", help="全库导出到 CSV")
+    export.set_defaults(func=cmd_export)
+
+    restore = subparsers.add_parser("restore", help="重放变更日志重建数据库")
+    restore.add_argument("--user-id", type=int, default=None, help="恢复单用户库；不指定时恢复共享库")
+    restore.add_argument("--output", default=None, help="输出数据库路径 (默认覆盖原位置，需 --force)")
+    restore.add_argument("--force", action="store_true", help="允许覆盖已存在的数据库")
+    restore.set_defaults(func=cmd_restore)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 from dataclasses import dataclass, field
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Callable
 import random
 
 from src.agent.state import PersonaState
 from src.agent.empathy_planner import EmpathyPlanner, ExpressionPlan, TextStrategy, BodyAction
 from src.core.llm_client import LLMClient
+from src.core.async_llm_client import AsyncLLMClient
+from src.core.logger import get_logger
 from src.core.prompt.prompt_builder import PromptBuilder
+from src.core.streaming import FRAGMENT_DELIMITER, iter_fragments
+from src.security.input_guard import InputGuard
+from src.security.policy import SecurityPolicy
 
 # Text Skills
 from src.skills.text.short_reply import short_reply_strategy
@@ -19,6 +24,10 @@ from src.skills.body_language.shy import shy_action
 from src.skills.body_language.tilt_head import tilt_head_action
 from src.skills.body_language.wave import wave_action
 
+logger = get_logger("Orchestrator")
+
+FALLBACK_TEXT = "I'm sorry, I couldn't think of what to say."
+
 @dataclass
 class AgentResponse:
     """
@@ -30,6 +39,7 @@ class AgentResponse:
     mood: str
     delay_ms: int
     voice_params: Dict[str, Any] = field(default_factory=dict)
+    streamed: bool = False  # 文本是否已在生成过程中逐段发出
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -48,74 +58,173 @@ class ExpressionOrchestrator:
     1. 接收 Planner 的 ExpressionPlan
     2. 调用 Text Skills 获取生成策略
     3. 调用 Body Skills 获取动作指令
-    4. 调用 LLM 生成最终文本
+    4. 调用 LLM 生成最终文本 (InputGuard 的安全决策用于 LLM 后端路由)
     5. 组装成 AgentResponse
     """
     
-    def __init__(self, planner: EmpathyPlanner, llm_client: LLMClient, prompt_builder: PromptBuilder):
+    def __init__(self, planner: EmpathyPlanner, llm_client: LLMClient, prompt_builder: PromptBuilder,
+                 async_llm_client: Optional[AsyncLLMClient] = None, input_guard: Optional[InputGuard] = None,
+                 security_policy: Optional[SecurityPolicy] = None):
         self.planner = planner
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
         self.prompt_builder = prompt_builder
+        self.input_guard = input_guard
+        self.security_policy = security_policy or SecurityPolicy.default()
 
     def orchestrate_response(self, user_input: str, state: PersonaState, context_str: str = "", memory_str: str = "") -> Optional[AgentResponse]:
         """
         编排一次完整的响应
         """
+        prepared = self._prepare(user_input, state)
+        if prepared is None:
+            return None
+        plan, action_name, text_config = prepared
+
+        # 4. 生成文本
+        generated_text = self._generate_text(text_config, user_input, context_str, memory_str)
+
+        return self._assemble_response(plan, action_name, generated_text)
+
+    async def orchestrate_response_async(self, user_input: str, state: PersonaState, context_str: str = "", memory_str: str = "") -> Optional[AgentResponse]:
+        """
+        orchestrate_response 的异步版本，LLM 调用通过 AsyncLLMClient 完成，不阻塞事件循环。
+        """
+        prepared = self._prepare(user_input, state)
+        if prepared is None:
+            return None
+        plan, action_name, text_config = prepared
+
+        # 4. 生成文本
+        generated_text = await self._generate_text_async(text_config, user_input, context_str, memory_str)
+
+        return self._assemble_response(plan, action_name, generated_text)
+
+    def orchestrate_response_stream(self, user_input: str, state: PersonaState, on_fragment: Callable[[str], None],
+                                    context_str: str = "", memory_str: str = "",
+                                    on_action: Optional[Callable[[str], None]] = None) -> Optional[AgentResponse]:
+        """
+        流式编排：模型边生成边按 '$' 切分，每完成一个片段就交给 on_fragment 发送。
+        返回的 AgentResponse.text 为完整回复（片段以 '$' 重新拼接），streamed=True。
+        传入 on_action 时，动作在生成文本之前回调，与非流式模式 "先动作后文本" 的顺序一致。
+        """
+        prepared = self._prepare(user_input, state)
+        if prepared is None:
+            return None
+        plan, action_name, text_config = prepared
+
+        if on_action is not None and action_name:
+            on_action(action_name)
+
+        # 4. 流式生成文本
+        fragments = self._generate_text_stream(text_config, user_input, context_str, memory_str, on_fragment)
+
+        response = self._assemble_response(plan, action_name, FRAGMENT_DELIMITER.join(fragments))
+        response.streamed = True
+        return response
+
+    def _prepare(self, user_input: str, state: PersonaState) -> Optional[Tuple[ExpressionPlan, str, Dict[str, Any]]]:
+        """规划阶段（不涉及 LLM）：返回 (计划, 动作, 文本配置)，沉默时返回 None"""
         # 1. 获取决策计划
         plan = self.planner.plan_response(user_input, state)
-        
+
         # 如果策略是保持沉默，则不返回响应
         if not plan.should_reply or plan.text_strategy == TextStrategy.SILENCE:
             return None
-            
+
         # 2. 执行 Body Language Skill
         action_name = self._execute_body_skill(plan.body_action)
-        
+
         # 3. 执行 Text Skill (获取生成策略)
         text_config = self._execute_text_skill(plan.text_strategy, user_input)
-        
-        # 4. 生成文本
-        generated_text = self._generate_text(text_config, user_input, context_str, memory_str)
-        
-        # 5. 组装最终响应
-        response = AgentResponse(
+
+        # 安全决策只影响 LLM 后端选择 (REQUIRE_FALLBACK / ROUTE_TO_SKILL)
+        if self.input_guard is not None:
+            text_config["safety_decision"] = self.input_guard.check_input(user_input, self.security_policy).decision
+
+        return plan, action_name, text_config
+
+    def _assemble_response(self, plan: ExpressionPlan, action_name: str, generated_text: str) -> AgentResponse:
+        """5. 组装最终响应"""
+        return AgentResponse(
             text=generated_text,
             action=action_name,
             mood=plan.mood.value,
             delay_ms=plan.delay_ms,
             voice_params={"tone": plan.mood.value} # 简单示例
         )
-        
-        return response
 
-    def _generate_text(self, text_config: Dict[str, Any], user_input: str, context_str: str, memory_str: str) -> str:
-        """调用 LLM 生成文本"""
-        
+    def _build_messages(self, text_config: Dict[str, Any], user_input: str, context_str: str, memory_str: str) -> List[Dict[str, str]]:
+        """构建发送给 LLM 的消息列表"""
+
         # 获取风格指令
         style_instruction = text_config.get("style_instruction", "")
-        
-        # 使用 PromptBuilder 构建 Prompt
-        # 这将自动包含 System Rules, Persona, Memory, Context
-        final_prompt = self.prompt_builder.build(
+
+        # 使用 PromptBuilder 构建消息
+        # 这将自动包含 System Rules, Persona, Memory, Context；System Rules + Persona 可作为固定的 system 消息
+        return self.prompt_builder.build_messages(
             user_input=user_input,
             context_str=context_str,
             memory_str=memory_str,
             instruction=style_instruction
         )
-        
-        messages = [
-            {"role": "user", "content": final_prompt}
-        ]
-        
+
+    def _generate_text(self, text_config: Dict[str, Any], user_input: str, context_str: str, memory_str: str) -> str:
+        """调用 LLM 生成文本"""
+        messages = self._build_messages(text_config, user_input, context_str, memory_str)
+
         try:
             return self.llm_client.chat_completion(
                 messages=messages,
                 temperature=text_config.get("temperature", 0.7),
-                max_tokens=text_config.get("max_tokens", 150)
+                max_tokens=text_config.get("max_tokens", 150),
+                safety_decision=text_config.get("safety_decision")
+            )
+        except Exception as e:
+            # Fallback
+            return FALLBACK_TEXT
+
+    def _generate_text_stream(self, text_config: Dict[str, Any], user_input: str, context_str: str, memory_str: str,
+                              on_fragment: Callable[[str], None]) -> List[str]:
+        """流式调用 LLM，逐段回调，返回已发出的片段列表"""
+        messages = self._build_messages(text_config, user_input, context_str, memory_str)
+
+        fragments: List[str] = []
+        try:
+            deltas = self.llm_client.stream_chat_completion(
+                messages=messages,
+                temperature=text_config.get("temperature", 0.7),
+                max_tokens=text_config.get("max_tokens", 150),
+                safety_decision=text_config.get("safety_decision")
+            )
+            for fragment in iter_fragments(deltas):
+                fragments.append(fragment)
+                on_fragment(fragment)
+        except Exception as e:
+            logger.error(f"[ORCHESTRATOR] STREAM_FAILED | fragments_sent: {len(fragments)} | error: {e}", exc_info=True)
+            # 已发出的片段无法撤回；一个都没发出时与非流式一致，使用 Fallback
+            if not fragments:
+                fragments.append(FALLBACK_TEXT)
+                on_fragment(FALLBACK_TEXT)
+        return fragments
+
+    async def _generate_text_async(self, text_config: Dict[str, Any], user_input: str, context_str: str, memory_str: str) -> str:
+        """调用异步 LLM 客户端生成文本"""
+        if self.async_llm_client is None:
+            raise RuntimeError("ExpressionOrchestrator 未配置 AsyncLLMClient")
+
+        messages = self._build_messages(text_config, user_input, context_str, memory_str)
+
+        try:
+            return await self.async_llm_client.chat_completion(
+                messages=messages,
+                temperature=text_config.get("temperature", 0.7),
+                max_tokens=text_config.get("max_tokens", 150),
+                safety_decision=text_config.get("safety_decision")
             )
         except Exception as e:
             # Fallback
-            return "I'm sorry, I couldn't think of what to say."
+            return FALLBACK_TEXT
 
     def _execute_body_skill(self, action_type: BodyAction) -> str:
         """根据动作类型调用对应的 Skill 函数"""
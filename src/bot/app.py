@@ -3,7 +3,6 @@ from src.core.session_controller import SessionController
 from src.core.chat_service import ChatService
 from src.core.interaction import InteractionManager
 from src.bot.proactive_messaging import ProactiveScheduler
-from src.llm_system.local_api_caller import call_local_llm
 
 logger = get_logger("BotApplication")
 
@@ -22,6 +21,10 @@ class BotApplication:
         self.interaction_manager = interaction_manager
         self.proactive_scheduler = proactive_scheduler
 
+    def shutdown(self):
+        """进程退出前调用：保存待触发的主动消息任务。"""
+        self.proactive_scheduler.shutdown()
+
     def get_help_text(self) -> str:
         return (
             "📖 可用命令：\n"
@@ -53,17 +56,7 @@ class BotApplication:
         if not user_input:
             return "⚠️ 消息内容不能为空，请重新输入！"
 
-        # 检查是否开启本地 API 模式
-        llm_config = self.chat_service.system_config.llm
-        if llm_config.use_local_api:
-            logger.info(f"[APP] Local API Mode | user_id: {user_id}")
-            return call_local_llm(
-                message=user_input,
-                api_url=llm_config.local_api_url,
-                model="local-model", # 或者使用 llm_config.model
-                temperature=llm_config.temperature,
-                max_tokens=llm_config.max_tokens
-            )
+        # 本地 API 不再单独旁路：开启 use_local_api 后它作为 LLMRouter 的一个后端参与路由
 
         # 重置主动消息计时器
         self.proactive_scheduler.on_user_activity(user_id)
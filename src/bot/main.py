@@ -5,6 +5,7 @@ from src.core.logger import get_logger
 from src.bot.wiring import create_bot_context
 from src.bot.telegram.handlers import register_handlers
 from src.bot.telegram.polling import start_polling_thread
+from src.bot.telegram.webhook import start_webhook_server
 
 logger = get_logger("Main")
 
@@ -18,11 +19,17 @@ def main():
     
     # 2. 注册 Telegram handlers
     logger.info("2️⃣ 注册 Telegram Handlers")
-    register_handlers(context.bot, context.app)
+    register_handlers(context.bot, context.app, context.send_queue)
     
-    # 3. 启动轮询线程
-    logger.info("3️⃣ 启动 Telegram Polling")
-    start_polling_thread(context.bot)
+    # 3. 启动更新接收 (轮询线程或 Webhook 服务)
+    telegram_config = context.config.system_config.telegram
+    webhook_server = None
+    if telegram_config.mode == "webhook":
+        logger.info("3️⃣ 启动 Telegram Webhook")
+        webhook_server = start_webhook_server(context.bot, telegram_config.webhook)
+    else:
+        logger.info("3️⃣ 启动 Telegram Polling")
+        start_polling_thread(context.bot)
     
     logger.info("✅ 机器人已启动！(按 Ctrl+C 停止)")
     
@@ -32,6 +39,10 @@ def main():
             time.sleep(1)
     except KeyboardInterrupt:
         logger.info("🛑 正在停止机器人...")
+        if webhook_server is not None:
+            webhook_server.stop(timeout=5)
+        context.app.shutdown()
+        context.send_queue.stop()
     except Exception as e:
         logger.error(f"❌ 运行时发生错误: {e}")
         raise
@@ -1,14 +1,18 @@
-import threading
-import time
+import os
 import random
-from typing import Callable, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from src.core.proactive_service import ProactiveService
 from src.core.chat_service import ChatService
+from src.core.deadline_scheduler import DeadlineScheduler
 from src.core.logger import get_logger
 from src.core.config_loader import ConfigLoader
 
 logger = get_logger("ProactiveScheduler")
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+KIND_CHECK = "proactive_check"
+KIND_SEND = "proactive_send"
+
 class ProactiveScheduler:
     """
     主动消息调度器。
@@ -18,19 +22,19 @@ class ProactiveScheduler:
     3. 执行 (通过 I/O 回调发送消息)。
     
     将“内容决策”委托给 ProactiveService。
+
+    检查与发送的计时都挂在一个持久化的 DeadlineScheduler 上 (单个分发线程 + 线程池)，
+    不再为每个用户保留 threading.Timer 线程；重启后未到期的检查与发送会被恢复。
+    会话状态只在内存中，重启后恢复的任务若对应的会话未重新开启，触发时直接丢弃，不再续排。
     """
     def __init__(self, 
                  proactive_service: ProactiveService, 
                  chat_service: ChatService,
-                 sender: Callable[[int, str], None]):
+                 sender: Callable[[int, str], bool]):
         self.proactive_service = proactive_service
         self.chat_service = chat_service
         self.sender = sender
         
-        self.check_timers: Dict[int, threading.Timer] = {}
-        self.send_timers: Dict[int, threading.Timer] = {}
-        self.lock = threading.Lock()
-        
         # 配置加载
         self.config_loader = ConfigLoader()
         self.system_config = self.config_loader.system_config
@@ -41,6 +45,25 @@ class ProactiveScheduler:
         self.send_delay_min = self.system_config.proactive.send_delay_min
         self.send_delay_max = self.system_config.proactive.send_delay_max
 
+        # 截止时间调度器：检查 / 发送两类任务，以 user_id 区分
+        proactive_config = self.system_config.proactive
+        state_path = proactive_config.state_path
+        if state_path and not os.path.isabs(state_path):
+            state_path = os.path.join(PROJECT_ROOT, state_path)
+        self.deadlines = DeadlineScheduler(
+            state_path=state_path or None,
+            workers=proactive_config.workers,
+            persist_interval=proactive_config.persist_interval,
+            name="ProactiveScheduler"
+        )
+        self.deadlines.register(KIND_CHECK, lambda user_id, _: self._check_callback(user_id))
+        self.deadlines.register(KIND_SEND, self._execute_send)
+        self.deadlines.start()
+
+    def shutdown(self):
+        """停止分发线程并保存待触发任务 (进程退出前调用)。"""
+        self.deadlines.stop()
+
     def start(self, user_id: int):
         """为用户启动调度器。"""
         logger.info(f"[SCHEDULER] START | user_id: {user_id}")
@@ -48,13 +71,8 @@ class ProactiveScheduler:
 
     def stop(self, user_id: int):
         """停止用户的调度器。"""
-        with self.lock:
-            if user_id in self.check_timers:
-                self.check_timers[user_id].cancel()
-                del self.check_timers[user_id]
-            if user_id in self.send_timers:
-                self.send_timers[user_id].cancel()
-                del self.send_timers[user_id]
+        self.deadlines.cancel(KIND_CHECK, user_id)
+        self.deadlines.cancel(KIND_SEND, user_id)
         logger.info(f"[SCHEDULER] STOP | user_id: {user_id}")
 
     def on_user_activity(self, user_id: int):
@@ -62,32 +80,31 @@ class ProactiveScheduler:
         当用户活跃时调用。
         重置检查计时器并取消任何挂起的主动发送。
         """
-        with self.lock:
-            # 取消挂起的发送 (不要打断用户)
-            if user_id in self.send_timers:
-                logger.info(f"[SCHEDULER] CANCEL_SEND | user_id: {user_id} | reason: user_active")
-                self.send_timers[user_id].cancel()
-                del self.send_timers[user_id]
-            
-            # 取消现有的检查计时器
-            if user_id in self.check_timers:
-                self.check_timers[user_id].cancel()
-            
-            # 调度下一次检查
-            delay = random.uniform(self.check_interval_min, self.check_interval_max)
-            timer = threading.Timer(delay, self._check_callback, args=[user_id])
-            timer.daemon = True
-            timer.start()
-            self.check_timers[user_id] = timer
-            logger.info(f"[SCHEDULER] RESET | user_id: {user_id} | next_check_in: {delay:.1f}s")
+        # 取消挂起的发送 (不要打断用户)
+        if self.deadlines.cancel(KIND_SEND, user_id):
+            logger.info(f"[SCHEDULER] CANCEL_SEND | user_id: {user_id} | reason: user_active")
+
+        # 调度下一次检查 (替换现有的检查)
+        delay = random.uniform(self.check_interval_min, self.check_interval_max)
+        self.deadlines.schedule(KIND_CHECK, user_id, delay)
+        logger.info(f"[SCHEDULER] RESET | user_id: {user_id} | next_check_in: {delay:.1f}s")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回调度 / 取消 / 触发 / 恢复计数与待触发任务数。"""
+        return self.deadlines.snapshot()
+
+    def _session_active(self, user_id: int, kind: str) -> bool:
+        """会话已结束 (例如重启后恢复的任务) 时丢弃该任务。"""
+        if self.chat_service.session_controller.is_session_active(user_id):
+            return True
+        logger.info(f"[SCHEDULER] DROP | user_id: {user_id} | kind: {kind} | reason: inactive_session")
+        return False
 
     def _check_callback(self, user_id: int):
         """检查计时器的回调。"""
-        with self.lock:
-            if user_id in self.check_timers:
-                del self.check_timers[user_id]
-
         logger.debug(f"[SCHEDULER] TRIGGER_CHECK | user_id: {user_id}")
+        if not self._session_active(user_id, KIND_CHECK):
+            return
 
         # 1. 询问 Core: 我们应该触发吗？
         if not self.proactive_service.should_trigger(user_id):
@@ -104,28 +121,22 @@ class ProactiveScheduler:
         delay = random.uniform(self.send_delay_min, self.send_delay_max)
         logger.info(f"[SCHEDULER] SCHEDULE_SEND | user_id: {user_id} | delay: {delay:.1f}s | content_len: {len(content)}")
         
-        timer = threading.Timer(delay, self._execute_send, args=[user_id, content])
-        timer.daemon = True
-        timer.start()
-        
-        with self.lock:
-            self.send_timers[user_id] = timer
+        self.deadlines.schedule(KIND_SEND, user_id, delay, content)
 
     def _execute_send(self, user_id: int, content: str):
         """Execute the actual send."""
-        with self.lock:
-            if user_id in self.send_timers:
-                del self.send_timers[user_id]
-        
+        if not self._session_active(user_id, KIND_SEND):
+            return
         try:
             logger.info(f"[SCHEDULER] SEND | user_id: {user_id} | content_len: {len(content)}")
             
-            # Use the injected sender (e.g., Telegram sender)
+            # Use the injected sender (e.g., Telegram sender); it returns False if delivery failed
             if self.sender:
-                self.sender(user_id, content)
-                
-                # Update Context (Core State)
-                self.chat_service.add_assistant_message_to_context(user_id, content)
+                if self.sender(user_id, content):
+                    # Update Context (Core State) only for delivered messages
+                    self.chat_service.add_assistant_message_to_context(user_id, content)
+                else:
+                    logger.warning(f"[SCHEDULER] SEND_UNDELIVERED | user_id: {user_id} | context: skipped")
             else:
                 logger.error("[SCHEDULER] SEND_FAIL | user_id: {user_id} | error: No sender configured")
                 
@@ -0,0 +1,317 @@
+"""
+文件职责：Telegram 发送队列 (TelegramSendQueue)
+所有发往 Telegram 的请求 (回复、动作、主动消息、命令回复) 统一经过本队列，避免突发流量触发 429：
+- 令牌桶限流：全局 (默认 30 条/秒) + 每个会话 (默认 1 条/秒，允许少量突发)。
+- 优先级通道：回复 (REPLY) > 动作 (ACTION) > 主动消息 (PROACTIVE)。优先级作用于会话之间，
+  同一会话内严格按入队顺序发送，且同一时刻最多一个请求在途；会话按其待发请求中的最高优先级排队
+  (排在回复前面的动作、主动消息随之提前)，已在低优先级通道的会话有更高优先级的请求入队时会移到对应通道。
+- 429：按响应中的 retry_after 暂停该会话并把请求放回队首重试 (最多 max_retries 次)。
+- 其他错误直接失败，结果通过 Future 返回，调用方可选择等待或忽略。
+- 空闲会话 (无待发、无在途、未被暂停且令牌桶已满) 的状态会被回收，_chats 不随会话数无限增长。
+- stop() 后尚未发出的请求以异常结束，等待其 Future 的调用方不会一直挂起。
+
+单个调度线程挑选下一条可发送的请求，实际的 HTTP 调用在有界线程池中执行。
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from src.core.config import TelegramSendQueueConfig
+from src.core.logger import get_logger
+
+logger = get_logger("TelegramSendQueue")
+
+WAIT_WINDOW = 1000
+IDLE_WAIT = 1.0
+EVICT_INTERVAL = 1.0   # 复查空闲会话能否回收的间隔 (秒)
+
+class Priority(IntEnum):
+    REPLY = 0
+    ACTION = 1
+    PROACTIVE = 2
+
+class TokenBucket:
+    """令牌桶：rate 个/秒补充，最多积累 burst 个。调用方负责加锁。"""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距离有 1 个令牌还需等待的秒数。"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1.0
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    """从 Telegram API 异常 (telebot.apihelper.ApiTelegramException) 中取出 429 的 retry_after。"""
+    if getattr(error, "error_code", None) != 429:
+        return None
+    result = getattr(error, "result_json", None) or {}
+    return float((result.get("parameters") or {}).get("retry_after", 1))
+
+class _Outgoing:
+    __slots__ = ("priority", "fn", "args", "kwargs", "future", "enqueued_at", "attempts")
+
+    def __init__(self, priority: Priority, fn: Callable[..., Any], args: tuple, kwargs: dict):
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+class _ChatState:
+    __slots__ = ("pending", "bucket", "blocked_until", "in_flight", "lane")
+
+    def __init__(self, bucket: TokenBucket):
+        self.pending: Deque[_Outgoing] = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.in_flight = False
+        self.lane: Optional[Priority] = None   # 所在的优先级通道，未在通道中等待调度时为 None
+
+    def idle(self, now: float) -> bool:
+        """无待发、无在途、未被暂停且令牌桶已满：状态可以丢弃，之后重建的新状态与之等价。"""
+        return not self.pending and not self.in_flight and self.blocked_until <= now and self.bucket.is_full(now)
+
+class TelegramSendQueue:
+    def __init__(self, bot, config: Optional[TelegramSendQueueConfig] = None):
+        self.bot = bot
+        self.config = config or TelegramSendQueueConfig()
+
+        self._cond = threading.Condition()
+        self._chats: Dict[Any, _ChatState] = {}
+        self._lanes: List[Deque[Any]] = [deque() for _ in Priority]   # 各优先级下等待发送的会话
+        self._idle: Set[Any] = set()     # 已无请求、等待令牌桶回满后回收的会话
+        self._next_evict = 0.0
+        self._global = TokenBucket(self.config.global_rate, self.config.global_burst)
+        self._depth = 0
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self._counters: Dict[str, int] = {
+            "enqueued": 0, "sent": 0, "failed": 0, "dropped": 0, "rate_limited": 0, "retries": 0, "evicted": 0
+        }
+        self._waits: Dict[Priority, Deque[float]] = {p: deque(maxlen=WAIT_WINDOW) for p in Priority}
+
+    # ================== 生命周期 ==================
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=self.config.workers, thread_name_prefix="TelegramSend")
+        self._thread = threading.Thread(target=self._run, name="TelegramSendQueue", daemon=True)
+        self._thread.start()
+        logger.info(f"[SEND_QUEUE] START | global_rate: {self.config.global_rate}/s | per_chat_rate: {self.config.per_chat_rate}/s")
+
+    def stop(self, wait: bool = True):
+        """停止调度：尚未发出的请求以异常结束其 Future；在途请求由线程池执行完 (wait=True 时等待)。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cond:
+            abandoned = [item for chat in self._chats.values() for item in chat.pending]
+            for chat in self._chats.values():
+                chat.pending.clear()
+                chat.lane = None
+            for lane in self._lanes:
+                lane.clear()
+            self._depth = 0
+            self._counters["dropped"] += len(abandoned)
+        for item in abandoned:
+            item.future.set_exception(RuntimeError("Telegram 发送队列已停止"))
+        if abandoned:
+            logger.warning(f"[SEND_QUEUE] STOP_DROP | pending: {len(abandoned)}")
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    # ================== 入队 ==================
+
+    def submit(self, chat_id: Any, priority: Priority, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """排队执行 fn(*args, **kwargs) (一次 Telegram API 调用)。队列已满时返回已失败的 Future。"""
+        item = _Outgoing(priority, fn, args, kwargs)
+        with self._cond:
+            if self._stopping:
+                item.future.set_exception(RuntimeError("Telegram 发送队列已停止"))
+                return item.future
+            if self._depth >= self.config.max_queue:
+                self._counters["dropped"] += 1
+                logger.warning(f"[SEND_QUEUE] DROP | chat_id: {chat_id} | depth: {self._depth}")
+                item.future.set_exception(RuntimeError("Telegram 发送队列已满"))
+                return item.future
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _ChatState(TokenBucket(self.config.per_chat_rate, self.config.per_chat_burst))
+            self._idle.discard(chat_id)
+            if chat.lane is not None and priority < chat.lane:
+                # 已在低优先级通道中排队：整个会话提到新请求的通道 (会话内仍按入队顺序发送)
+                self._lanes[chat.lane].remove(chat_id)
+                chat.lane = None
+            chat.pending.append(item)
+            self._depth += 1
+            self._counters["enqueued"] += 1
+            self._lane(chat_id, chat)
+        return item.future
+
+    def send_message(self, chat_id: Any, text: str, priority: Priority = Priority.REPLY, **kwargs) -> Future:
+        return self.submit(chat_id, priority, self.bot.send_message, chat_id, text, **kwargs)
+
+    def reply_to(self, message, text: str, priority: Priority = Priority.REPLY, **kwargs) -> Future:
+        return self.submit(message.chat.id, priority, self.bot.reply_to, message, text, **kwargs)
+
+    def send_chat_action(self, chat_id: Any, action: str, priority: Priority = Priority.ACTION) -> Future:
+        return self.submit(chat_id, priority, self.bot.send_chat_action, chat_id, action)
+
+    def send_voice(self, chat_id: Any, voice, priority: Priority = Priority.REPLY, **kwargs) -> Future:
+        return self.submit(chat_id, priority, self.bot.send_voice, chat_id, voice, **kwargs)
+
+    def _lane(self, chat_id: Any, chat: _ChatState):
+        """会话有待发请求且没有在途请求时，按待发请求中的最高优先级进入通道。调用方持有 _cond。"""
+        if chat.pending and not chat.in_flight and chat.lane is None:
+            chat.lane = min(item.priority for item in chat.pending)
+            self._lanes[chat.lane].append(chat_id)
+            self._cond.notify()
+
+    # ================== 调度 ==================
+
+    def _pick(self, now: float):
+        """
+        按优先级挑选一个会话的队首请求。返回 (chat_id, item, wait)：
+        有可发送的请求时 wait 为 0；否则 item 为 None，wait 为最早可发送前需要等待的秒数。
+        """
+        global_wait = self._global.wait_time(now)
+        if global_wait > 0:
+            return None, None, global_wait
+        wait = IDLE_WAIT
+        for lane in self._lanes:
+            for _ in range(len(lane)):
+                chat_id = lane.popleft()
+                chat = self._chats[chat_id]
+                chat_wait = max(chat.blocked_until - now, chat.bucket.wait_time(now))
+                if chat_wait <= 0:
+                    chat.lane = None
+                    return chat_id, chat.pending.popleft(), 0.0
+                lane.append(chat_id)   # 该会话暂时不可发，轮转到通道末尾
+                wait = min(wait, chat_wait)
+        return None, None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    now = time.monotonic()
+                    if now >= self._next_evict:
+                        self._evict_idle(now)
+                    chat_id, item, wait = self._pick(now)
+                    if item is not None:
+                        break
+                    self._cond.wait(wait)
+                chat = self._chats[chat_id]
+                self._global.take(now)
+                chat.bucket.take(now)
+                chat.in_flight = True
+                self._depth -= 1
+                if item.attempts == 0:
+                    self._waits[item.priority].append(now - item.enqueued_at)
+            self._executor.submit(self._send, chat_id, item)
+
+    def _send(self, chat_id: Any, item: _Outgoing):
+        item.attempts += 1
+        try:
+            result = item.fn(*item.args, **item.kwargs)
+        except Exception as e:
+            self._on_error(chat_id, item, e)
+            return
+        with self._cond:
+            self._counters["sent"] += 1
+            self._release(chat_id)
+        item.future.set_result(result)
+
+    def _on_error(self, chat_id: Any, item: _Outgoing, error: BaseException):
+        retry_after = retry_after_of(error)
+        with self._cond:
+            chat = self._chats[chat_id]
+            if retry_after is not None:
+                self._counters["rate_limited"] += 1
+                if item.attempts <= self.config.max_retries and not self._stopping:
+                    # 放回队首，暂停该会话直到 retry_after 之后
+                    self._counters["retries"] += 1
+                    chat.blocked_until = time.monotonic() + retry_after
+                    chat.pending.appendleft(item)
+                    self._depth += 1
+                    self._release(chat_id)
+                    logger.warning(f"[SEND_QUEUE] RATE_LIMITED | chat_id: {chat_id} | retry_after: {retry_after}s | attempt: {item.attempts}")
+                    return
+            self._counters["failed"] += 1
+            self._release(chat_id)
+        logger.error(f"[SEND_QUEUE] SEND_FAIL | chat_id: {chat_id} | attempts: {item.attempts} | error: {error}")
+        item.future.set_exception(error)
+
+    def _release(self, chat_id: Any):
+        """
+        在途请求结束：会话还有待发请求则重新入通道；否则已空闲时立即回收，
+        令牌桶尚未回满 (或仍在 429 暂停中) 时记入 _idle，由调度线程稍后复查。调用方持有 _cond。
+        """
+        chat = self._chats[chat_id]
+        chat.in_flight = False
+        if chat.pending:
+            self._lane(chat_id, chat)
+        elif chat.idle(time.monotonic()):
+            self._evict(chat_id)
+        else:
+            self._idle.add(chat_id)
+
+    def _evict(self, chat_id: Any):
+        del self._chats[chat_id]
+        self._idle.discard(chat_id)
+        self._counters["evicted"] += 1
+
+    def _evict_idle(self, now: float):
+        """回收 _idle 中已经空闲的会话，每 EVICT_INTERVAL 秒最多执行一次。调用方持有 _cond。"""
+        self._next_evict = now + EVICT_INTERVAL
+        for chat_id in [c for c in self._idle if self._chats[c].idle(now)]:
+            self._evict(chat_id)
+
+    # ================== 指标 ==================
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回各项计数、队列深度 (总数与各通道等待的会话数) 以及各优先级排队时间的 p50/p99。"""
+        with self._cond:
+            data: Dict[str, Any] = dict(self._counters)
+            data["depth"] = self._depth
+            data["chats"] = len(self._chats)
+            data["in_flight"] = sum(1 for chat in self._chats.values() if chat.in_flight)
+            for priority in Priority:
+                name = priority.name.lower()
+                data[f"lane_{name}_chats"] = len(self._lanes[priority])
+                ordered = sorted(self._waits[priority])
+                if ordered:
+                    data[f"wait_{name}_p50"] = ordered[int(0.50 * (len(ordered) - 1))]
+                    data[f"wait_{name}_p99"] = ordered[int(0.99 * (len(ordered) - 1))]
+        return data
@@ -0,0 +1,247 @@
+"""
+文件职责：Telegram Webhook 接入 (WebhookIngress)
+polling 模式下单线程逐轮 getUpdates，接收与处理都是串行的；webhook 模式由 Telegram 主动推送更新：
+- ASGI 端点 (FastAPI，与 src/llm_system/server 相同的技术栈) 校验 X-Telegram-Bot-Api-Secret-Token，
+  按 update_id 去重 (Telegram 在非 2xx 或超时时会重发)，入队后立即返回 200。
+- 更新按会话 (chat_id) 分片到固定数量的工作线程，同一会话的消息保持顺序，不同会话并行处理。
+- 分片队列已满时返回 503，Telegram 稍后重发，形成背压；未入队的更新不记入去重表。
+
+WebhookIngress 的 process 回调负责实际处理一条更新；start_webhook_server 将其接到 telebot 的 process_new_updates。
+"""
+
+import hmac
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from src.core.config import TelegramWebhookConfig
+from src.core.logger import get_logger
+
+logger = get_logger("TelegramWebhook")
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+LATENCY_WINDOW = 1000
+STOP_POLL = 0.5   # 工作线程空闲时检查停止标志的间隔 (秒)
+
+UpdateProcessor = Callable[[Dict[str, Any]], None]
+
+def update_chat_key(update: Dict[str, Any]) -> int:
+    """取出更新所属的会话 ID 用于分片；找不到时退回 update_id。"""
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return int(chat["id"])
+        sender = value.get("from")
+        if sender and "id" in sender:
+            return int(sender["id"])
+    return int(update.get("update_id", 0))
+
+class UpdateDeduper:
+    """最近 size 个 update_id 的有界集合。"""
+    def __init__(self, size: int):
+        self.size = size
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_add(self, update_id: int) -> bool:
+        """检查并记录在同一把锁内完成；已见过时返回 False。"""
+        with self._lock:
+            if update_id in self._seen:
+                return False
+            self._seen[update_id] = None
+            if len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+            return True
+
+    def discard(self, update_id: int):
+        """撤销 try_add (更新未能入队，需要允许 Telegram 重发)。"""
+        with self._lock:
+            self._seen.pop(update_id, None)
+
+class WebhookIngress:
+    def __init__(self, process: UpdateProcessor, config: Optional[TelegramWebhookConfig] = None):
+        self.process = process
+        self.config = config or TelegramWebhookConfig()
+        self.deduper = UpdateDeduper(self.config.dedupe_size)
+
+        per_worker = max(1, self.config.queue_size // self.config.workers)
+        self._queues: List["queue.Queue[Optional[tuple]]"] = [queue.Queue(per_worker) for _ in range(self.config.workers)]
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "received": 0, "accepted": 0, "duplicates": 0, "unauthorized": 0,
+            "invalid": 0, "overloaded": 0, "processed": 0, "failed": 0
+        }
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)   # 接收到处理完成
+
+    # ================== 生命周期 ==================
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i, shard in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(shard,), name=f"TelegramWebhook-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"[WEBHOOK] START | workers: {self.config.workers} | queue_size: {self.config.queue_size}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        停止接收并等待工作线程处理完已入队的更新。
+        不阻塞在已满的分片上：放不进结束标记的分片由工作线程排空后通过停止标志退出。
+        """
+        self._stopping.set()
+        for shard in self._queues:
+            try:
+                shard.put_nowait(None)
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ================== 接收 ==================
+
+    def authorized(self, token: Optional[str]) -> bool:
+        """未配置 secret_token 时不校验。"""
+        if not self.config.secret_token:
+            return True
+        return token is not None and hmac.compare_digest(token, self.config.secret_token)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def accept(self, update: Any, token: Optional[str] = None) -> int:
+        """
+        接收一条推送的更新，返回应答的 HTTP 状态码：
+        200 已入队或重复；401 密钥不符；400 格式错误；503 队列已满或正在停止 (Telegram 会重发)。
+        """
+        self._count("received")
+        if self._stopping.is_set():
+            self._count("overloaded")
+            return 503
+        if not self.authorized(token):
+            self._count("unauthorized")
+            return 401
+        if not isinstance(update, dict) or not isinstance(update.get("update_id"), int):
+            self._count("invalid")
+            return 400
+        update_id = update["update_id"]
+        if not self.deduper.try_add(update_id):
+            self._count("duplicates")
+            return 200
+        shard = self._queues[update_chat_key(update) % len(self._queues)]
+        try:
+            shard.put_nowait((update, time.monotonic()))
+        except queue.Full:
+            self.deduper.discard(update_id)
+            self._count("overloaded")
+            logger.warning(f"[WEBHOOK] OVERLOADED | update_id: {update_id}")
+            return 503
+        self._count("accepted")
+        return 200
+
+    # ================== 处理 ==================
+
+    def _run(self, shard: "queue.Queue[Optional[tuple]]"):
+        while True:
+            try:
+                job = shard.get(timeout=STOP_POLL)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            if job is None:
+                return
+            update, received_at = job
+            try:
+                self.process(update)
+                failed = False
+            except Exception as e:
+                failed = True
+                logger.error(f"[WEBHOOK] PROCESS_FAIL | update_id: {update.get('update_id')} | error: {e}", exc_info=True)
+            with self._lock:
+                self._counters["failed" if failed else "processed"] += 1
+                self._latencies.append(time.monotonic() - received_at)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回接收 / 去重 / 拒绝 / 处理计数、队列深度与接收到处理完成的 p50/p99。"""
+        with self._lock:
+            data: Dict[str, Any] = dict(self._counters)
+            ordered = sorted(self._latencies)
+        data["depth"] = sum(shard.qsize() for shard in self._queues)
+        if ordered:
+            data["latency_p50"] = ordered[int(0.50 * (len(ordered) - 1))]
+            data["latency_p99"] = ordered[int(0.99 * (len(ordered) - 1))]
+        return data
+
+def create_webhook_app(ingress: WebhookIngress):
+    """创建接收 Telegram 推送的 FastAPI 应用。"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI(title="Telegram Webhook", version="1.0.0")
+
+    @app.post(ingress.config.path)
+    async def receive_update(request: Request):
+        token = request.headers.get(SECRET_HEADER)
+        if not ingress.authorized(token):
+            ingress.accept(None, token)    # 计入 unauthorized，不解析请求体
+            return JSONResponse({"ok": False}, status_code=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            update = None
+        status = ingress.accept(update, token)
+        return JSONResponse({"ok": status == 200}, status_code=status)
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "ok", "ingress": ingress.snapshot()}
+
+    return app
+
+class WebhookServer:
+    """运行中的 Webhook 服务句柄，stop() 先停止接收 HTTP 请求，再等待已入队的更新处理完毕。"""
+    def __init__(self, ingress: WebhookIngress, server, thread: threading.Thread):
+        self.ingress = ingress
+        self.server = server
+        self.thread = thread
+
+    def stop(self, timeout: Optional[float] = None):
+        self.server.should_exit = True
+        self.thread.join(timeout)
+        self.ingress.stop(timeout)
+        logger.info("[WEBHOOK] STOP")
+
+def start_webhook_server(bot, config: TelegramWebhookConfig) -> WebhookServer:
+    """
+    注册 Webhook 并在后台线程中启动 uvicorn。
+    bot 应以 threaded=False 创建，处理函数直接在分片工作线程中执行，保持会话内顺序。
+    """
+    import uvicorn
+    from telebot.types import Update
+
+    def process(update: Dict[str, Any]):
+        bot.process_new_updates([Update.de_json(update)])
+
+    ingress = WebhookIngress(process, config)
+    ingress.start()
+    app = create_webhook_app(ingress)
+
+    url = config.public_url.rstrip("/") + config.path
+    bot.remove_webhook()
+    bot.set_webhook(url=url, secret_token=config.secret_token or None, max_connections=config.max_connections)
+    logger.info(f"[WEBHOOK] REGISTERED | url: {url} | listen: {config.host}:{config.port}")
+
+    server = uvicorn.Server(uvicorn.Config(app, host=config.host, port=config.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="TelegramWebhookServer", daemon=True)
+    thread.start()
+    return WebhookServer(ingress, server, thread)
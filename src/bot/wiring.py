@@ -9,9 +9,12 @@ from src.core.chat_service import ChatService
 from src.core.interaction import InteractionManager
 from src.core.proactive_service import ProactiveService
 from src.core.llm_client import LLMClient
+from src.core.async_llm_client import AsyncLLMClient
 from src.bot.proactive_messaging import ProactiveScheduler
 from src.core.logger import get_logger
 from src.bot.app import BotApplication
+from src.bot.telegram.send_queue import Priority, TelegramSendQueue
+from src.security.input_guard import InputGuard
 
 # Agent Components
 from src.agent.empathy_planner import EmpathyPlanner
@@ -24,6 +27,7 @@ class BotContext:
     bot: telebot.TeleBot
     app: BotApplication
     config: ConfigLoader
+    send_queue: TelegramSendQueue
 
 def create_bot_context() -> BotContext:
     """
@@ -36,16 +40,34 @@ def create_bot_context() -> BotContext:
     system_config = config_loader.system_config
     
     # 2. 初始化 Telegram Bot 客户端
-    # 注意：这里我们不再依赖 client.py 中的全局变量，而是每次创建新的
-    bot = telebot.TeleBot(system_config.telegram.bot_token)
+    # 整个进程只有这一个 Bot 与发送队列，其他需要发送的组件 (如 TelegramAdapter) 从 BotContext 注入
+    # webhook 模式下更新由分片工作线程处理，handler 直接在该线程执行 (不再经过 telebot 自带线程池)
+    bot = telebot.TeleBot(system_config.telegram.bot_token, threaded=system_config.telegram.mode == "polling")
     
+    # 所有发送经过令牌桶队列 (全局 + 每会话限流，优先级：回复 > 动作 > 主动消息)
+    send_queue = TelegramSendQueue(bot, system_config.telegram.send_queue)
+    send_queue.start()
+
     # 定义发送函数适配器
+    def report_failure(uid, kind):
+        def callback(future):
+            error = future.exception()
+            if error is not None:
+                logger.error(f"[SEND] FAIL | user_id: {uid} | kind: {kind} | error: {error}")
+        return callback
+
+    # 回复：入队即返回 (分段节奏由 PacedDispatcher 控制)，失败 (队列已满 / API 错误) 在完成回调中记录
     def telegram_sender(uid, txt):
+        send_queue.send_message(uid, txt, Priority.REPLY).add_done_callback(report_failure(uid, "reply"))
+        return True
+
+    # 主动消息：在调度器的工作线程中等待送达结果，只有送达的消息才写入上下文
+    def proactive_sender(uid, txt):
         try:
-            bot.send_message(uid, txt)
+            send_queue.send_message(uid, txt, Priority.PROACTIVE).result(system_config.proactive.send_timeout)
             return True
         except Exception as e:
-            logger.error(f"发送消息失败: {e}")
+            logger.error(f"[SEND] FAIL | user_id: {uid} | kind: proactive | error: {e!r}")
             return False
 
     # 3. 初始化核心服务
@@ -56,9 +78,14 @@ def create_bot_context() -> BotContext:
     
     # Agent 组件初始化
     llm_client = LLMClient(system_config)
+    async_llm_client = AsyncLLMClient(system_config)
     empathy_planner = EmpathyPlanner()
     prompt_builder = PromptBuilder(config_loader)
-    orchestrator = ExpressionOrchestrator(empathy_planner, llm_client, prompt_builder)
+    orchestrator = ExpressionOrchestrator(
+        empathy_planner, llm_client, prompt_builder,
+        async_llm_client=async_llm_client,
+        input_guard=InputGuard()
+    )
     
     chat_service = ChatService(session_controller, orchestrator)
     proactive_service = ProactiveService(session_controller, chat_service)
@@ -71,17 +98,16 @@ def create_bot_context() -> BotContext:
     def telegram_action_player(uid, action):
         # 简单实现：将动作转换为斜体文字发送
         # 实际项目中可能需要更复杂的表现（如表情包、贴纸等）
-        try:
-            bot.send_message(uid, f"_{action}_", parse_mode="Markdown")
-        except Exception as e:
-            logger.warning(f"动作播放失败: {e}")
+        send_queue.send_message(uid, f"_{action}_", Priority.ACTION, parse_mode="Markdown").add_done_callback(
+            report_failure(uid, "action")
+        )
 
     interaction_manager.set_action_player(telegram_action_player)
     
     proactive_scheduler = ProactiveScheduler(
         proactive_service=proactive_service,
         chat_service=chat_service,
-        sender=telegram_sender
+        sender=proactive_sender
     )
     
     # 5. 初始化应用外观
@@ -97,5 +123,6 @@ def create_bot_context() -> BotContext:
     return BotContext(
         bot=bot,
         app=bot_app,
-        config=config_loader
+        config=config_loader,
+        send_queue=send_queue
     )
@@ -1,4 +1,6 @@
+import asyncio
 import telebot
+from src.bot.telegram.send_queue import Priority, TelegramSendQueue
 from src.client.base import BaseClient
 from src.core.logger import get_logger
 
@@ -8,15 +10,17 @@ class TelegramAdapter(BaseClient):
     """
     Telegram 平台适配器
     实现具体的发送逻辑
+    所有调用经进程内唯一的 TelegramSendQueue (BotContext.send_queue) 限流。
     """
     
-    def __init__(self, bot: telebot.TeleBot):
+    def __init__(self, bot: telebot.TeleBot, send_queue: TelegramSendQueue):
         self.bot = bot
+        self.send_queue = send_queue
 
     async def send_text(self, target_id: str, text: str):
         try:
             # 这里的 target_id 通常是 chat_id
-            self.bot.send_message(target_id, text)
+            await asyncio.wrap_future(self.send_queue.send_message(target_id, text, Priority.REPLY))
             logger.info(f"[Telegram] 发送文本到 {target_id}: {text[:20]}...")
         except Exception as e:
             logger.error(f"[Telegram] 发送文本失败: {e}")
@@ -29,13 +33,13 @@ class TelegramAdapter(BaseClient):
         try:
             # 示例：发送 typing 状态来模拟"正在做动作"
             # 实际项目中可能映射到具体的 Sticker ID
-            self.bot.send_chat_action(target_id, 'typing')
+            await asyncio.wrap_future(self.send_queue.send_chat_action(target_id, 'typing', Priority.ACTION))
             logger.info(f"[Telegram] 执行动作 {action_name} 到 {target_id}")
         except Exception as e:
             logger.error(f"[Telegram] 执行动作失败: {e}")
 
     async def play_voice(self, target_id: str, audio_data: bytes):
         try:
-            self.bot.send_voice(target_id, audio_data)
+            await asyncio.wrap_future(self.send_queue.send_voice(target_id, audio_data, Priority.REPLY))
         except Exception as e:
             logger.error(f"[Telegram] 播放语音失败: {e}")
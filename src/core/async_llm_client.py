@@ -0,0 +1,156 @@
+"""
+文件职责：异步 LLM 客户端
+基于 httpx.AsyncClient 的 OpenAI 兼容客户端，API 与 LLMClient 保持一致
+(chat_completion / extract_keywords / generate_user_summary / extract_new_memories)，
+但所有方法均为协程。等待网络时不占用线程，单个事件循环即可同时服务大量等待中的用户。
+"""
+
+import time
+from typing import List, Dict, Optional, Any, Tuple
+
+import httpx
+
+from src.core.config import SystemConfig
+from src.core.llm_client import BaseLLMClient, DEFAULT_USER_SUMMARY
+from src.core.llm_resilience import ResiliencePolicy, http_error_classifier
+from src.core.llm_router import LLMBackend
+from src.core.logger import get_logger
+from src.security.decisions import SafetyDecision
+
+logger = get_logger("AsyncLLMClient")
+
+try:
+    import h2  # noqa: F401  # httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class AsyncLLMClient(BaseLLMClient):
+    def __init__(self, system_config: SystemConfig):
+        super().__init__(system_config)
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # 重试 / 熔断 / 对冲：覆盖本客户端的所有调用
+        retry_config = system_config.llm.retry
+        self.policy = ResiliencePolicy(
+            retry_config,
+            http_error_classifier(retry_config.retry_on_status, (httpx.TransportError,))
+        )
+
+        # 多后端路由：按延迟 / 错误率 / 安全决策选择后端并故障转移
+        self.router = self._create_router(self.policy)
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """创建带有限连接池的 AsyncClient，安装了 h2 时启用 HTTP/2。"""
+        llm_config = self.config.llm
+        limits = httpx.Limits(
+            max_connections=llm_config.pool_maxsize,
+            max_keepalive_connections=llm_config.pool_maxsize
+        )
+        return httpx.AsyncClient(
+            headers=self._get_headers(),
+            limits=limits,
+            timeout=self.timeout,
+            http2=HTTP2_AVAILABLE
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        惰性创建 AsyncClient，保证其绑定在实际运行的事件循环上。
+        检查与赋值之间没有 await，单个事件循环内无需加锁。
+        """
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回调用指标快照（成功/失败/重试/熔断/对冲次数与延迟分位数，各后端路由状态，以及用量与缓存命中）。"""
+        metrics = self.policy.metrics.snapshot()
+        metrics["backends"] = self.router.snapshot()
+        metrics["usage"] = self.usage_metrics.snapshot()
+        return metrics
+
+    async def aclose(self):
+        """关闭连接池，释放保活连接。"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def chat_completion(self, messages: List[Dict[str, str]], temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                              safety_decision: Optional[SafetyDecision] = None) -> str:
+        """
+        调用 LLM 对话补全 API（异步）。
+        safety_decision 用于影响后端选择 (例如 REQUIRE_FALLBACK 优先云端)。
+        """
+        data = self._build_payload(messages, temperature, max_tokens)
+
+        async def _post(backend: LLMBackend) -> str:
+            started = time.time()
+            response = await self._get_client().post(
+                backend.api_url,
+                json=dict(data, model=backend.model),
+                headers=backend.headers()
+            )
+            response.raise_for_status()
+            result = response.json()
+            self.usage_metrics.record(result.get("usage"), time.time() - started)
+            return self._parse_completion(result)
+
+        async def _call(backend: LLMBackend, max_attempts: Optional[int]) -> Tuple[str, LLMBackend]:
+            return await self.policy.call_async(backend.api_url, lambda: _post(backend), max_attempts=max_attempts), backend
+
+        start_time = time.time()
+        try:
+            content, backend = await self.router.execute_async(_call, safety_decision)
+
+            duration = time.time() - start_time
+            logger.info(f"[LLM] SUCCESS | backend: {backend.name} | model: {backend.model} | duration: {duration:.2f}s | response_len: {len(content)}")
+
+            return content
+        except Exception as e:
+            duration = time.time() - start_time
+            logger.error(f"[LLM] FAILED | model: {self.model} | duration: {duration:.2f}s | error: {str(e)}", exc_info=True)
+            raise
+
+    async def extract_keywords(self, text: str) -> List[str]:
+        """
+        使用 LLM 从文本中提取关键词。
+        """
+        try:
+            content = await self.chat_completion(self._keywords_messages(text), temperature=0.3, max_tokens=100)
+            keywords = self._parse_keywords(content)
+            logger.debug(f"[LLM] EXTRACT_KEYWORDS | count: {len(keywords)} | keywords: {keywords}")
+            return keywords
+        except Exception as e:
+            logger.warning(f"[LLM] EXTRACT_KEYWORDS_FAIL | error: {str(e)}")
+            return text.split()[:5]
+
+    async def generate_user_summary(self, memories: List[str]) -> str:
+        """
+        根据记忆生成用户摘要。
+        """
+        if not memories:
+            return DEFAULT_USER_SUMMARY
+
+        try:
+            summary = await self.chat_completion(self._summary_messages(memories), temperature=0.5, max_tokens=500)
+            logger.info(f"[LLM] GENERATE_SUMMARY | length: {len(summary)}")
+            return summary
+        except Exception as e:
+            logger.error(f"[LLM] GENERATE_SUMMARY_FAIL | error: {str(e)}")
+            return DEFAULT_USER_SUMMARY
+
+    async def extract_new_memories(self, conversation_text: str) -> List[tuple]:
+        """
+        从对话文本中提取新记忆。
+        返回列表：(事件, 关键词, 重要度, 有效期)。
+        """
+        try:
+            content = await self.chat_completion(self._memories_messages(conversation_text), temperature=0.3, max_tokens=1000)
+            memories = self._parse_memories(content)
+
+            logger.info(f"[LLM] EXTRACT_MEMORIES | count: {len(memories)}")
+            return memories
+        except Exception as e:
+            logger.error(f"[LLM] EXTRACT_MEMORIES_FAIL | error: {str(e)}")
+            return []
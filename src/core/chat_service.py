@@ -6,12 +6,19 @@
 
 import threading
 import time
-from typing import Dict, Tuple, Set, Optional, List, Any
+from datetime import datetime
+from typing import Dict, Tuple, Set, Optional, List, Any, Callable
 
 from src.core.config_loader import ConfigLoader
 from src.core.context import ConversationContext
+from src.core.tokenizer import get_tokenizer
 from src.core.llm_client import LLMClient
 from src.core.memory.service import MemoryService
+from src.core.memory.summary_cache import MemorySummaryCache
+from src.core.memory_extraction import MemoryExtractionWorker
+from src.core.memory_ingest import MemoryIngestService, MemoryPayload, MemorySource
+from src.core.memory.keywords import split_keywords
+from src.core.rolling_summary import RollingSummaryService
 from src.core.session_controller import SessionController
 from src.core.logger import get_logger
 
@@ -19,6 +26,8 @@ from src.core.logger import get_logger
 from src.agent.orchestrator import ExpressionOrchestrator, AgentResponse
 from src.agent.state import PersonaState, RelationshipStage
 
+SUMMARY_CACHE_KEY = "importance"   # 与输入无关的重要性摘要在缓存中的子键
+
 logger = get_logger("ChatService")
 
 class ChatService:
@@ -29,7 +38,8 @@ class ChatService:
         self.config_loader = ConfigLoader()
         self.system_config = self.config_loader.system_config
         
-        self.llm_client = LLMClient(self.system_config)
+        # 复用 Orchestrator 的 LLMClient，共享同一个连接池
+        self.llm_client: LLMClient = orchestrator.llm_client
         self.session_controller = session_controller
         self.orchestrator = orchestrator
         
@@ -37,7 +47,14 @@ class ChatService:
         self.chat_contexts: Dict[int, ConversationContext] = {}
         self.user_memories: Dict[int, MemoryService] = {}
         self.user_states: Dict[int, PersonaState] = {} # 新增: 用户人格状态
-        self.user_prompt_cache: Dict[int, Tuple[str, float]] = {}
+        self.user_prompt_cache = MemorySummaryCache(
+            max_entries=self.system_config.memory.summary_cache_size,
+            ttl_seconds=self.system_config.memory.summary_cache_ttl
+        )
+        self.user_recall_cache = MemorySummaryCache(
+            max_entries=self.system_config.memory.recall_cache_size,
+            ttl_seconds=self.system_config.memory.summary_cache_ttl
+        )
         self.user_message_counts: Dict[int, int] = {}
         
         # 锁
@@ -45,6 +62,22 @@ class ChatService:
         self.memory_lock = threading.Lock()   # 用于 user_memories
         self.state_lock = threading.Lock()    # 用于其他状态 (counts, cache)
 
+        # 记忆写入统一经过注入服务 (校验 + 去重 + 组提交)
+        self.memory_ingest = MemoryIngestService(self.get_user_memory, self.system_config.memory.ingest)
+        self.memory_ingest.start()
+
+        # 后台记忆提取：回复链路只负责入队
+        self.memory_worker = MemoryExtractionWorker(
+            self.llm_client, self._write_extracted_memories, self.system_config.memory.extraction
+        )
+        self.memory_worker.start()
+
+        # 滚动摘要：滑出窗口的对话在后台并入【前情提要】
+        self.summarizer = RollingSummaryService(
+            self.llm_client, self._find_context, self._active_context_users, self.system_config.context.summary
+        )
+        self.summarizer.start()
+
     def start_chat(self, user_id: int):
         """开启聊天会话，初始化资源。"""
         self.get_context(user_id)
@@ -61,8 +94,8 @@ class ChatService:
         with self.state_lock:
             if user_id in self.user_message_counts:
                 del self.user_message_counts[user_id]
-            if user_id in self.user_prompt_cache:
-                del self.user_prompt_cache[user_id]
+            self.user_prompt_cache.invalidate_user(user_id)
+            self.user_recall_cache.invalidate_user(user_id)
             if user_id in self.user_states:
                 del self.user_states[user_id]
         
@@ -76,9 +109,24 @@ class ChatService:
         """获取或创建用户的对话上下文。"""
         with self.context_lock:
             if user_id not in self.chat_contexts:
-                self.chat_contexts[user_id] = ConversationContext()
+                context_config = self.system_config.context
+                self.chat_contexts[user_id] = ConversationContext(
+                    max_history=context_config.max_history,
+                    max_tokens=context_config.max_tokens,
+                    max_message_tokens=context_config.max_message_tokens,
+                    tokenizer=get_tokenizer(context_config.tokenizer)
+                )
             return self.chat_contexts[user_id]
 
+    def _find_context(self, user_id: int) -> Optional[ConversationContext]:
+        """获取已有的上下文，不存在时不创建 (会话已结束)。"""
+        with self.context_lock:
+            return self.chat_contexts.get(user_id)
+
+    def _active_context_users(self) -> List[int]:
+        with self.context_lock:
+            return list(self.chat_contexts)
+
     def get_user_state(self, user_id: int) -> PersonaState:
         """获取或创建用户的 PersonaState"""
         with self.state_lock:
@@ -94,22 +142,28 @@ class ChatService:
         """获取或创建用户的长期记忆实例。"""
         with self.memory_lock:
             if user_id not in self.user_memories:
-                self.user_memories[user_id] = MemoryService(user_id)
+                self.user_memories[user_id] = MemoryService(
+                    user_id, storage_mode=self.system_config.memory.storage_mode
+                )
             return self.user_memories[user_id]
 
     def add_user_message_to_context(self, user_id: int, message: str):
         """将用户消息添加到上下文，但不触发回复。"""
         ctx = self.get_context(user_id)
         ctx.add_message("user", message)
+        self.summarizer.on_message(user_id)
         logger.debug(f"[CONTEXT] ADD_USER | user_id: {user_id} | len: {len(message)}")
 
     def add_assistant_message_to_context(self, user_id: int, message: str):
         """将助手消息添加到上下文。"""
         ctx = self.get_context(user_id)
         ctx.add_message("assistant", message)
+        self.summarizer.on_message(user_id)
         logger.debug(f"[CONTEXT] ADD_BOT | user_id: {user_id} | len: {len(message)}")
 
-    def process_user_input(self, user_id: int, user_input: str) -> Any:
+    def process_user_input(self, user_id: int, user_input: str,
+                           on_fragment: Optional[Callable[[str], None]] = None,
+                           on_action: Optional[Callable[[str], None]] = None) -> Any:
         """
         处理用户输入：
         1. 添加到上下文
@@ -118,92 +172,184 @@ class ChatService:
         4. 添加回复到上下文
         5. 触发记忆提取
         6. 返回响应对象 (AgentResponse)
+
+        传入 on_fragment 时使用流式生成：每个完整片段生成后立即回调，
+        返回的 AgentResponse.streamed 为 True，调用方无需再次发送文本；
+        on_action 在生成文本之前回调动作，保证动作先于第一个片段发出。
         """
-        # 1. 添加到上下文
-        self.add_user_message_to_context(user_id, user_input)
-        
-        # 2. 准备上下文和记忆
-        ctx = self.get_context(user_id)
-        conversation_str = ctx.format(exclude_last_n=1)
-        user_summary = self._get_user_prompt_summary(user_id)
-        
-        # 获取用户状态
-        state = self.get_user_state(user_id)
-        
-        # 记录上下文状态
-        logger.info(f"[CHAT] PROCESS | user_id: {user_id} | context_turns: {len(ctx.history)} | state: {state.relationship_stage.name}")
-        
+        conversation_str, user_summary, state = self._prepare_turn(user_id, user_input)
+
         # 3. 调用 Orchestrator
         try:
             start_time = time.time()
-            
+
             # 使用新架构进行编排
-            response = self.orchestrator.orchestrate_response(
+            if on_fragment is not None:
+                response = self.orchestrator.orchestrate_response_stream(
+                    user_input=user_input,
+                    state=state,
+                    on_fragment=on_fragment,
+                    context_str=conversation_str,
+                    memory_str=user_summary,
+                    on_action=on_action
+                )
+            else:
+                response = self.orchestrator.orchestrate_response(
+                    user_input=user_input,
+                    state=state,
+                    context_str=conversation_str,
+                    memory_str=user_summary
+                )
+
+            return self._finish_turn(user_id, user_input, response, time.time() - start_time)
+
+        except Exception as e:
+            logger.error(f"[ORCHESTRATOR] FAILED | user_id: {user_id} | error: {e}", exc_info=True)
+            raise e
+
+    async def process_user_input_async(self, user_id: int, user_input: str) -> Any:
+        """
+        process_user_input 的异步版本，LLM 调用在事件循环中等待，不占用线程。
+        """
+        conversation_str, user_summary, state = self._prepare_turn(user_id, user_input)
+
+        try:
+            start_time = time.time()
+
+            response = await self.orchestrator.orchestrate_response_async(
                 user_input=user_input,
                 state=state,
                 context_str=conversation_str,
                 memory_str=user_summary
             )
-            
-            duration = time.time() - start_time
-            
-            if response:
-                logger.info(f"[ORCHESTRATOR] SUCCESS | user_id: {user_id} | duration: {duration:.2f}s | action: {response.action}")
-                # 4. 添加回复到上下文
-                self.add_assistant_message_to_context(user_id, response.text)
-                
-                # 5. 更新记忆
-                self._update_memories(user_id, user_input, response.text)
-                
-                return response
-            else:
-                logger.info(f"[ORCHESTRATOR] SILENCE | user_id: {user_id}")
-                return None
-                
+
+            return self._finish_turn(user_id, user_input, response, time.time() - start_time)
+
         except Exception as e:
             logger.error(f"[ORCHESTRATOR] FAILED | user_id: {user_id} | error: {e}", exc_info=True)
             raise e
 
-    def _get_user_prompt_summary(self, user_id: int) -> str:
+    def _prepare_turn(self, user_id: int, user_input: str) -> Tuple[str, str, PersonaState]:
+        """步骤 1-2：写入上下文，准备上下文字符串、记忆摘要和用户状态。"""
+        # 1. 添加到上下文
+        self.add_user_message_to_context(user_id, user_input)
+
+        # 2. 准备上下文和记忆
+        ctx = self.get_context(user_id)
+        conversation_str = ctx.format(exclude_last_n=1)
+        user_summary = self._get_user_prompt_summary(user_id, user_input)
+
+        # 获取用户状态
+        state = self.get_user_state(user_id)
+
+        # 记录上下文状态
+        logger.info(f"[CHAT] PROCESS | user_id: {user_id} | context_turns: {len(ctx.history)} | context_tokens: {ctx.total_tokens} | state: {state.relationship_stage.name}")
+        return conversation_str, user_summary, state
+
+    def _finish_turn(self, user_id: int, user_input: str, response: Optional[AgentResponse], duration: float) -> Optional[AgentResponse]:
+        """步骤 4-6：记录回复并触发记忆更新。"""
+        if response:
+            logger.info(f"[ORCHESTRATOR] SUCCESS | user_id: {user_id} | duration: {duration:.2f}s | action: {response.action}")
+            # 4. 添加回复到上下文
+            self.add_assistant_message_to_context(user_id, response.text)
+
+            # 5. 更新记忆
+            self._update_memories(user_id, user_input, response.text)
+
+            return response
+        else:
+            logger.info(f"[ORCHESTRATOR] SILENCE | user_id: {user_id}")
+            return None
+
+    def _get_user_prompt_summary(self, user_id: int, query: str = "") -> str:
         """
         获取用于 Prompt 的记忆摘要。
-        如果缓存有效则使用缓存。
+        按当前输入做语义检索，只带入最相关的 memory.prompt_top_k 条记忆；
+        没有输入或没有相关记忆时退回按重要性取前 prompt_top_k 条。
+        重要性摘要与输入无关，按 (用户, 记忆版本) 缓存；检索结果单独放在容量较小的 user_recall_cache，
+        一次性的输入不会挤掉可复用的摘要。版本号变化或超过 TTL 后重新生成。
         """
-        with self.state_lock:
-            cache = self.user_prompt_cache.get(user_id)
-            if cache:
-                content, timestamp = cache
-                # TODO: 实现更智能的缓存失效逻辑（例如基于时间或更新事件）
-                # 目前只是简单返回
-                pass 
-
-        # 加载记忆
         memory_service = self.get_user_memory(user_id)
+        query = query.strip()
+        version = memory_service.version
+        if query:
+            cached = self.user_recall_cache.get(user_id, query, version)
+            if cached is not None:
+                return cached
+            recalled = memory_service.recall(query, k=self.system_config.memory.prompt_top_k)
+            if recalled:
+                mem_text = self._format_prompt_memories(user_id, recalled)
+                self.user_recall_cache.put(user_id, query, version, mem_text)
+                return mem_text
+
+        cached = self.user_prompt_cache.get(user_id, SUMMARY_CACHE_KEY, version)
+        if cached is not None:
+            return cached
         valid_memories = memory_service.get_relevant_memories()
-        
-        if not valid_memories:
-            return "暂无特殊记忆"
-            
         # 按重要性排序 (索引 3)
-        sorted_memories = sorted(valid_memories, key=lambda x: x[3], reverse=True)
-        top_memories = sorted_memories[:20] # 限制前 20 条
-        
-        mem_text = "\n".join([f"- {m[1]} (关键词:{m[2]})" for m in top_memories])
+        top_memories = sorted(valid_memories, key=lambda x: x[3], reverse=True)[:self.system_config.memory.prompt_top_k]
+        mem_text = self._format_prompt_memories(user_id, top_memories)
+        self.user_prompt_cache.put(user_id, SUMMARY_CACHE_KEY, version, mem_text)
         return mem_text
 
+    @staticmethod
+    def _format_prompt_memories(user_id: int, memories: List[Tuple]) -> str:
+        logger.debug(f"[MEMORY] PROMPT_MEMORIES | user_id: {user_id} | count: {len(memories)}")
+        if not memories:
+            return "暂无特殊记忆"
+        return "\n".join([f"- {m[1]} (关键词:{m[2]})" for m in memories])
+
+    def get_cache_metrics(self) -> Dict[str, Any]:
+        """返回记忆摘要缓存的命中/未命中等计数；recall 为按输入检索结果缓存的计数。"""
+        stats: Dict[str, Any] = self.user_prompt_cache.snapshot()
+        stats["recall"] = self.user_recall_cache.snapshot()
+        return stats
+
+    def get_extraction_metrics(self) -> Dict[str, int]:
+        """返回后台记忆提取的提交 / 合并 / 丢弃 / 处理计数与队列深度。"""
+        return self.memory_worker.snapshot()
+
+    def get_summary_metrics(self) -> Dict[str, int]:
+        """返回滚动摘要的触发 / 成功 / 失败次数与已并入的消息数。"""
+        return self.summarizer.snapshot()
+
+    def get_ingest_metrics(self) -> Dict[str, Any]:
+        """返回记忆注入的吞吐量、延迟分位数与各项计数。"""
+        return self.memory_ingest.snapshot()
+
+    def get_prompt_cache_metrics(self) -> Dict[str, Any]:
+        """返回 LLM 调用的 token 用量与服务端前缀缓存命中情况。"""
+        return self.llm_client.usage_metrics.snapshot()
+
     def _update_memories(self, user_id: int, user_input: str, response: str):
         """
         基于交互更新长期记忆。
-        简单逻辑：计数消息，每 N 条触发一次提取。
+        计数消息，每 N 条把最近的对话窗口提交给后台提取线程，不在回复链路上调用 LLM。
         """
+        extraction = self.system_config.memory.extraction
         with self.state_lock:
             count = self.user_message_counts.get(user_id, 0) + 1
             self.user_message_counts[user_id] = count
-            
-        # 每 5 条消息提取一次
-        if count % 5 == 0:
-            logger.info(f"[MEMORY] TRIGGER_EXTRACT | user_id: {user_id} | msg_count: {count}")
-            # TODO: 实现真正的记忆提取逻辑
-            # 这里应该调用 LLM 来提取事实，并使用 MemoryManager 存储
-            # 建议使用异步任务来避免阻塞聊天
-            pass
+
+        if count % extraction.every_n_messages == 0:
+            window = self.get_context(user_id).format_recent(extraction.window_messages)
+            queued = self.memory_worker.submit(user_id, window)
+            logger.info(f"[MEMORY] TRIGGER_EXTRACT | user_id: {user_id} | msg_count: {count} | queued: {queued}")
+
+    def _write_extracted_memories(self, user_id: int, memories: List[tuple]):
+        """后台提取线程的写入回调：转换为 MemoryPayload 交给注入服务，等待组提交完成。"""
+        now = datetime.now()
+        payloads = [
+            MemoryPayload(
+                summary_text=event,
+                keywords=split_keywords(keywords),
+                importance_score=importance / 100,
+                related_context_ids=[],
+                source_platform=MemorySource.TELEGRAM,
+                timestamp=now,
+                expiry_days=expiry_days
+            )
+            for event, keywords, importance, expiry_days in memories
+        ]
+        if not self.memory_ingest.ingest_many(user_id, payloads):
+            logger.warning(f"[MEMORY] INGEST_INCOMPLETE | user_id: {user_id} | count: {len(payloads)}")
@@ -5,13 +5,59 @@
 """
 
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Literal, Optional
 
 # ================== 系统配置模型 (system.yaml) ==================
 
+class TelegramSendQueueConfig(BaseModel):
+    global_rate: float = Field(default=30.0, description="全局发送速率上限 (条/秒)")
+    global_burst: float = Field(default=10.0, description="全局令牌桶容量 (短时突发上限)")
+    per_chat_rate: float = Field(default=1.0, description="单个会话的发送速率上限 (条/秒)")
+    per_chat_burst: float = Field(default=3.0, description="单个会话允许的突发条数")
+    workers: int = Field(default=8, description="执行 Telegram API 调用的线程数")
+    max_queue: int = Field(default=10000, description="排队请求上限，超出时直接失败")
+    max_retries: int = Field(default=3, description="收到 429 后的最大重试次数")
+
+class TelegramWebhookConfig(BaseModel):
+    public_url: str = Field(default="", description="Telegram 推送的公网地址 (https://域名[:端口])，不含 path")
+    path: str = Field(default="/telegram/webhook", description="接收推送的路径")
+    host: str = Field(default="0.0.0.0", description="本地监听地址")
+    port: int = Field(default=8443, description="本地监听端口")
+    secret_token: str = Field(default="", description="X-Telegram-Bot-Api-Secret-Token 校验值 (为空时不校验)")
+    max_connections: int = Field(default=40, description="Telegram 向本服务并发推送的最大连接数 (1-100)")
+    workers: int = Field(default=8, description="处理更新的工作线程数 (按会话分片，同一会话保持顺序)")
+    queue_size: int = Field(default=1000, description="待处理更新的队列容量，超出时返回 503 由 Telegram 重发")
+    dedupe_size: int = Field(default=10000, description="按 update_id 去重时保留的最近更新数")
+
 class TelegramConfig(BaseModel):
     bot_token: str = Field(..., description="Telegram 机器人的 Token")
     owner_id: int = Field(default=0, description="拥有绝对控制权的 Owner ID")
+    send_queue: TelegramSendQueueConfig = Field(default_factory=TelegramSendQueueConfig, description="发送队列限流")
+    mode: Literal["polling", "webhook"] = Field(default="polling", description="接收更新的方式：polling 轮询 / webhook 推送")
+    webhook: TelegramWebhookConfig = Field(default_factory=TelegramWebhookConfig, description="Webhook 接入")
+
+class LLMRetryConfig(BaseModel):
+    max_attempts: int = Field(default=3, description="单次调用的最大尝试次数 (含首次)")
+    base_delay: float = Field(default=0.5, description="指数退避的基础延迟 (秒)")
+    max_delay: float = Field(default=8.0, description="单次退避的最大延迟 (秒)")
+    respect_retry_after: bool = Field(default=True, description="是否遵守服务端返回的 Retry-After")
+    max_retry_after: float = Field(default=30.0, description="Retry-After 的最大等待时间 (秒)")
+    retry_on_status: List[int] = Field(default_factory=lambda: [429, 500, 502, 503, 504], description="可重试的 HTTP 状态码")
+    breaker_failure_threshold: int = Field(default=5, description="熔断前允许的连续失败次数")
+    breaker_reset_timeout: float = Field(default=30.0, description="熔断后进入半开探测的冷却时间 (秒)")
+    hedge_after: Optional[float] = Field(default=None, description="超过该延迟仍未返回时发起对冲请求 (秒)，为空则关闭")
+    hedge_pool_size: int = Field(default=8, description="对冲请求线程池大小")
+    retry_budget_ratio: float = Field(default=0.2, description="重试预算：重试量占请求量的最大比例")
+    retry_budget_min: float = Field(default=10.0, description="重试预算的最低保留令牌数")
+
+class LLMBackendConfig(BaseModel):
+    name: str = Field(..., description="后端名称 (唯一)")
+    api_url: str = Field(..., description="OpenAI 兼容的对话补全地址")
+    model: str = Field(..., description="模型名称")
+    api_key: str = Field(default="", description="API Key (本地服务可留空)")
+    kind: str = Field(default="cloud", description="后端类型 (cloud / local)")
+    tags: List[str] = Field(default_factory=list, description="路由标签，例如 expert")
+    enabled: bool = Field(default=True, description="是否启用")
 
 class LLMConfig(BaseModel):
     api_key: str = Field(..., description="OpenAI 兼容的 API Key")
@@ -19,8 +65,17 @@ class LLMConfig(BaseModel):
     model: str = Field(default="deepseek-chat", description="模型名称")
     temperature: float = Field(default=0.7, description="采样温度")
     max_tokens: int = Field(default=1024, description="回复最大 Token 数")
-    use_local_api: bool = Field(default=False, description="是否使用本地 API")
+    use_local_api: bool = Field(default=False, description="是否将本地 API 加入路由 (同等延迟下优先)")
+    stream: bool = Field(default=False, description="是否流式生成并逐段发送回复")
+    stream_include_usage: bool = Field(default=True, description="流式请求附带 stream_options.include_usage，用于统计用量与缓存命中")
     local_api_url: str = Field(default="http://localhost:8000/v1/chat/completions", description="本地 API 地址")
+    request_timeout: float = Field(default=60.0, description="单次请求超时 (秒)")
+    pool_connections: int = Field(default=4, description="连接池缓存的 Host 数量")
+    pool_maxsize: int = Field(default=32, description="每个 Host 的最大保活连接数")
+    retry: LLMRetryConfig = Field(default_factory=LLMRetryConfig, description="重试 / 熔断 / 对冲策略")
+    backends: List[LLMBackendConfig] = Field(default_factory=list, description="额外的候选后端 (参与延迟感知路由)")
+    router_window: int = Field(default=50, description="路由统计的滚动窗口 (调用次数)")
+    router_max_error_rate: float = Field(default=0.5, description="窗口内错误率超过该值的后端视为不健康")
 
 class BotConfig(BaseModel):
     private_mode_default: bool = Field(default=True, description="默认私有模式状态")
@@ -28,6 +83,8 @@ class BotConfig(BaseModel):
 class MessageBufferConfig(BaseModel):
     collect_min_time: int = Field(default=15, description="最小收集时间 (秒)")
     collect_max_time: int = Field(default=20, description="最大收集时间 (秒)")
+    timer_tick: float = Field(default=0.05, description="防抖时间轮的 tick 精度 (秒)")
+    workers: int = Field(default=8, description="处理到期缓冲的线程池大小")
 
 class LLMServerConfig(BaseModel):
     host: str = Field(default="0.0.0.0", description="Server Host")
@@ -40,6 +97,57 @@ class ProactiveConfig(BaseModel):
     check_interval_max: int = Field(default=7200, description="检查间隔最大值 (秒)")
     send_delay_min: int = Field(default=60, description="发送延迟最小值 (秒)")
     send_delay_max: int = Field(default=600, description="发送延迟最大值 (秒)")
+    state_path: str = Field(default="data/proactive_schedule.json", description="待触发的检查 / 发送任务的持久化文件 (相对项目根目录)，为空则不持久化")
+    persist_interval: float = Field(default=5.0, description="任务变更后写盘的最小间隔 (秒)")
+    workers: int = Field(default=4, description="执行检查 / 发送的线程池大小")
+    send_timeout: float = Field(default=60.0, description="主动消息等待发送队列送达的超时 (秒)，未确认送达时不写入上下文")
+
+class RollingSummaryConfig(BaseModel):
+    enabled: bool = Field(default=True, description="是否把滑出窗口的对话并入滚动摘要")
+    min_evicted_turns: int = Field(default=6, description="CONTEXT_LIMIT：滑出的消息累计达到该数量时触发")
+    periodic_turns: int = Field(default=0, description="PERIODIC：每 N 条消息例行触发一次 (0 为关闭)")
+    idle_seconds: float = Field(default=600.0, description="USER_IDLE：用户闲置超过该秒数时触发")
+    idle_min_depth: int = Field(default=4, description="USER_IDLE：对话少于该消息数时不总结")
+    keep_recent: int = Field(default=6, description="闲置 / 会话结束时窗口中保留的最近消息数，其余并入摘要")
+    max_chars: int = Field(default=300, description="摘要的最大字数")
+    check_interval: float = Field(default=60.0, description="闲置检查间隔 (秒)")
+
+class ContextConfig(BaseModel):
+    max_history: int = Field(default=60, description="短期上下文保留的消息条数上限 (主要按 token 预算裁剪)")
+    max_tokens: int = Field(default=3000, description="短期上下文 (摘要 + 近期消息) 的 token 预算")
+    max_message_tokens: int = Field(default=800, description="单条消息在窗口中的 token 上限，超出截断")
+    tokenizer: str = Field(default="bytes", description="token 计数器：bytes 为按字节估算，或填 HuggingFace 分词器名称/路径")
+    summary: RollingSummaryConfig = Field(default_factory=RollingSummaryConfig, description="滚动摘要")
+
+class MemoryExtractionConfig(BaseModel):
+    every_n_messages: int = Field(default=5, description="每个用户每 N 条消息提交一次记忆提取")
+    window_messages: int = Field(default=10, description="每次提交的最近对话条数")
+    queue_size: int = Field(default=256, description="待提取的最大用户数，超出时丢弃新任务")
+    batch_size: int = Field(default=4, description="一次 LLM 调用合并的用户数")
+    batch_wait: float = Field(default=2.0, description="凑批的最长等待时间 (秒)")
+    workers: int = Field(default=1, description="后台提取线程数")
+
+class MemoryIngestConfig(BaseModel):
+    queue_size: int = Field(default=1024, description="待提交记忆的队列上限")
+    max_batch: int = Field(default=64, description="一次组提交的最大记忆条数")
+    max_delay: float = Field(default=0.05, description="凑批的最长等待时间 (秒)")
+    submit_timeout: float = Field(default=1.0, description="队列满时提交方的最长等待时间 (秒)，超时丢弃")
+    result_timeout: float = Field(default=10.0, description="同步注入等待提交结果的超时 (秒)")
+
+class MemoryConfig(BaseModel):
+    storage_mode: str = Field(default="per_user", description="长期记忆存储模式 (per_user: 每用户一个 .db / consolidated: 所有用户共用 memories.db)")
+    prompt_top_k: int = Field(default=8, description="每轮对话按语义相关度带入 Prompt 的记忆条数")
+    summary_cache_size: int = Field(default=1024, description="记忆摘要缓存的最大条目数 (每个用户一条，所有用户共享，LRU 淘汰)")
+    summary_cache_ttl: float = Field(default=300.0, description="记忆摘要缓存的有效期 (秒)")
+    recall_cache_size: int = Field(default=128, description="按输入检索结果缓存的最大条目数 (与摘要缓存分开，避免挤占)")
+    extraction: MemoryExtractionConfig = Field(default_factory=MemoryExtractionConfig, description="后台记忆提取")
+    ingest: MemoryIngestConfig = Field(default_factory=MemoryIngestConfig, description="记忆注入组提交")
+
+class PromptConfig(BaseModel):
+    split_system_message: bool = Field(
+        default=True,
+        description="系统规则 + 人设作为固定的 system 消息发送，动态内容放在其后的 user 消息中，以命中服务端前缀缓存"
+    )
 
 class SystemConfig(BaseModel):
     telegram: TelegramConfig
@@ -48,6 +156,9 @@ class SystemConfig(BaseModel):
     bot: BotConfig = Field(default_factory=BotConfig)
     message_buffer: MessageBufferConfig = Field(default_factory=MessageBufferConfig)
     proactive: ProactiveConfig = Field(default_factory=ProactiveConfig)
+    memory: MemoryConfig = Field(default_factory=MemoryConfig)
+    context: ContextConfig = Field(default_factory=ContextConfig)
+    prompt: PromptConfig = Field(default_factory=PromptConfig)
 
 # ================== AI 规则模型 (ai_rules.yaml) ==================
 
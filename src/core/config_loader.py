@@ -2,11 +2,13 @@
 文件职责：配置加载器
 实现单例模式，负责从 config/ 目录加载所有 YAML 配置文件。
 提供统一的配置访问入口，并初始化 PromptManager。
+每次 reload() 递增 version，依赖配置内容的缓存 (如 PromptBuilder 的静态块) 以此判断是否失效。
 """
 
 import os
 import yaml
 import logging
+from typing import Optional
 from src.core.config import SystemConfig, AIRulesConfig, PersonaConfig, GlobalAPIConfig
 
 class ConfigLoader:
@@ -15,6 +17,8 @@ class ConfigLoader:
     _ai_rules_config: AIRulesConfig = None
     _persona_config: PersonaConfig = None
     _api_config: GlobalAPIConfig = None
+    _prompt_template: Optional[str] = None
+    _version: int = 0
     
     def __new__(cls):
         if cls._instance is None:
@@ -51,6 +55,15 @@ class ConfigLoader:
             logging.error(f"加载 API 配置失败: {e}")
             self._api_config = GlobalAPIConfig()
 
+        # 5. 加载 Prompt 模板 (缺失时 PromptBuilder 使用内置模板)
+        template_path = os.path.join(config_dir, "prompt_template.txt")
+        self._prompt_template = None
+        if os.path.exists(template_path):
+            with open(template_path, 'r', encoding='utf-8') as f:
+                self._prompt_template = f.read()
+
+        self._version += 1
+
     def _load_yaml(self, path: str, model_class):
         if not os.path.exists(path):
             raise FileNotFoundError(f"配置文件丢失: {path}")
@@ -77,6 +90,14 @@ class ConfigLoader:
     @property
     def api_config(self) -> GlobalAPIConfig:
         return self._api_config
+
+    @property
+    def prompt_template(self) -> Optional[str]:
+        return self._prompt_template
+
+    @property
+    def version(self) -> int:
+        return self._version
     
     # 向后兼容 API 注册表
     def get_config(self, key=None):
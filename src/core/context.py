@@ -4,9 +4,50 @@
 - 摘要 (Summary)：上一段对话的精简摘要。
 - 近期消息 (Recent Messages)：最近 N 条对话的逐字记录。
 负责格式化这些数据以供 Prompt 使用。
+
+窗口按 token 预算裁剪 (见 src/core/tokenizer.py)：每条消息入窗时计数一次并缓存，
+维护窗口总量，超出 max_tokens (含摘要) 或 max_history 条时从最旧一端弹出，单次裁剪均摊 O(1)。
+单条超过 max_message_tokens 的消息 (如大段粘贴) 在窗口中截断保存，不会独占整个 Prompt。
+
+消息以 __slots__ 记录 (Message) 存放在 deque 中，渲染后的行在入窗时生成一次；
+近期对话部分的文本 (_rendered) 随入窗 / 滑出增量更新，format() 每轮只做一次切片与拼接。
+
+滑出窗口的消息不会直接丢弃，而是暂存在 evicted 中，由滚动摘要任务 (src/core/rolling_summary.py)
+取出并并入摘要：Prompt 大小保持有界，长对话的早期内容以摘要形式保留。
 """
 
-from typing import List, Dict, Optional
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from src.core.context_snapshot import (
+    ContextSnapshot, InteractionState, SessionInfo, ShortTermMessage, SnapshotMeta
+)
+from src.core.tokenizer import Tokenizer, get_tokenizer
+
+DEFAULT_SUMMARY = "暂无前情提要"
+MAX_EVICTED = 80    # 待并入摘要的消息上限，摘要任务长期失败时丢弃最旧的
+MESSAGE_OVERHEAD_TOKENS = 4     # 每条消息的角色前缀与换行
+CLIPPED_MARK = "…（内容过长已截断）"
+EMPTY_HISTORY = "（暂无近期对话）"
+
+class Message:
+    """窗口中的一条消息。只保存渲染后的 Prompt 行 (line)，content 由其切出；tokens 为入窗时的计数。"""
+    __slots__ = ("role", "timestamp", "tokens", "line")
+
+    def __init__(self, role: str, content: str, timestamp: float, tokens: int = 0):
+        self.role = role
+        self.timestamp = timestamp
+        self.tokens = tokens
+        self.line = f"{_role_prefix(role)}{content}"
+
+    @property
+    def content(self) -> str:
+        return self.line[len(_role_prefix(self.role)):]
+
+def _role_prefix(role: str) -> str:
+    return "User: " if role == "user" else "AI: "
 
 class ConversationContext:
     """
@@ -14,45 +55,161 @@ class ConversationContext:
     - 摘要 (Summary)
     - 近期消息 (Recent Messages)
     """
-    def __init__(self, max_history: int = 20):
-        self.history: List[Dict[str, str]] = []
-        self.summary: str = "暂无前情提要"
+    def __init__(self, max_history: int = 20, max_evicted: int = MAX_EVICTED,
+                 max_tokens: int = 3000, max_message_tokens: int = 800,
+                 tokenizer: Optional[Tokenizer] = None):
+        self.history: Deque[Message] = deque()
+        self._rendered = ""                         # 窗口内全部消息行，以换行连接
+        self.summary: str = DEFAULT_SUMMARY
         self.max_history = max_history
+        self.max_evicted = max_evicted
+        self.max_tokens = max_tokens
+        self.max_message_tokens = max_message_tokens
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.history_tokens = 0                     # 窗口内消息的 token 总量
+        self.summary_tokens = self.tokenizer.count(self.summary)
+        self.evicted: List[Message] = []            # 滑出窗口、尚未并入摘要的消息
+        self.dropped_evicted = 0
+        self.turns = 0                              # 累计消息数 (交互深度)
+        self.last_active = time.time()
+        self.lock = threading.RLock()
 
     def add_message(self, role: str, content: str):
-        """添加一条消息到历史记录。"""
-        self.history.append({"role": role, "content": content})
-        # 维持固定窗口大小
-        if len(self.history) > self.max_history:
-            self.history = self.history[-self.max_history:]
+        """添加一条消息到历史记录。token 数在此计算一次，之后裁剪只做加减。"""
+        with self.lock:
+            content, tokens = self._clip(content)
+            msg = Message(role, content, time.time(), tokens)
+            self.history.append(msg)
+            self.history_tokens += tokens
+            self._rendered = f"{self._rendered}\n{msg.line}" if self._rendered else msg.line
+            self.turns += 1
+            self.last_active = time.time()
+            self._trim()
+
+    def _clip(self, content: str) -> Tuple[str, int]:
+        """计数并截断超长消息，返回 (内容, token 数)。"""
+        tokens = self.tokenizer.count(content) + MESSAGE_OVERHEAD_TOKENS
+        limit = self.max_message_tokens
+        if tokens <= limit:
+            return content, tokens
+        # 按比例估算保留长度，再逐步收缩直到不超限 (通常一两次即可)
+        keep = int(len(content) * (limit - MESSAGE_OVERHEAD_TOKENS) / tokens)
+        while keep > 0:
+            clipped = content[:keep] + CLIPPED_MARK
+            tokens = self.tokenizer.count(clipped) + MESSAGE_OVERHEAD_TOKENS
+            if tokens <= limit:
+                return clipped, tokens
+            keep = int(keep * 0.9)
+        return CLIPPED_MARK, self.tokenizer.count(CLIPPED_MARK) + MESSAGE_OVERHEAD_TOKENS
+
+    def _trim(self):
+        """超出条数或 token 预算时从最旧一端弹出，滑出的消息留待摘要。至少保留最新一条。"""
+        budget = self.max_tokens - self.summary_tokens
+        trimmed = False
+        while len(self.history) > 1 and (len(self.history) > self.max_history or self.history_tokens > budget):
+            self.evicted.append(self._pop_oldest())
+            trimmed = True
+        if trimmed:
+            self._trim_evicted()
+
+    def _pop_oldest(self) -> Message:
+        msg = self.history.popleft()
+        self.history_tokens -= msg.tokens
+        self._rendered = self._rendered[len(msg.line) + 1:] if self.history else ""
+        return msg
+
+    @property
+    def total_tokens(self) -> int:
+        """摘要与窗口消息合计的 token 数。"""
+        return self.summary_tokens + self.history_tokens
+
+    def _trim_evicted(self):
+        overflow = len(self.evicted) - self.max_evicted
+        if overflow > 0:
+            self.evicted = self.evicted[overflow:]
+            self.dropped_evicted += overflow
 
     def update_summary(self, new_summary: str):
         """更新对话摘要。"""
         if new_summary:
-            self.summary = new_summary
+            with self.lock:
+                self.summary = new_summary
+                self.summary_tokens = self.tokenizer.count(new_summary)
+                self._trim()
+
+    # ================== 滚动摘要 ==================
+
+    def foldable_count(self, keep_recent: Optional[int] = None) -> int:
+        """可并入摘要的消息数。keep_recent 不为空时，窗口中除最近 keep_recent 条以外的消息也计入。"""
+        with self.lock:
+            extra = max(0, len(self.history) - keep_recent) if keep_recent is not None else 0
+            return len(self.evicted) + extra
+
+    def take_for_summary(self, keep_recent: Optional[int] = None) -> Tuple[str, List[Message]]:
+        """
+        取出待并入摘要的消息及当前摘要。
+        keep_recent 不为空时 (例如用户闲置)，窗口中只保留最近 keep_recent 条，其余一并取出。
+        """
+        with self.lock:
+            messages, self.evicted = self.evicted, []
+            if keep_recent is not None:
+                while len(self.history) > keep_recent:
+                    messages.append(self._pop_oldest())
+            return self.summary, messages
+
+    def restore_for_summary(self, messages: List[Message]):
+        """摘要失败时把取出的消息放回，下次再试。"""
+        with self.lock:
+            self.evicted = messages + self.evicted
+            self._trim_evicted()
+
+    # ================== 格式化 ==================
+
+    @staticmethod
+    def format_messages(messages: List[Message]) -> str:
+        return "\n".join(msg.line for msg in messages)
 
     def format(self, exclude_last_n: int = 0) -> str:
         """将上下文格式化为 Prompt 字符串。"""
-        lines = []
-        
-        # 1. 摘要部分
-        lines.append("【前情提要】")
-        lines.append(self.summary)
-        lines.append("") # 空行
-        
-        # 2. 近期对话部分
-        lines.append("【近期对话】")
-        
-        msgs_to_show = self.history[:-exclude_last_n] if exclude_last_n > 0 else self.history
-        
-        if not msgs_to_show:
-            lines.append("（暂无近期对话）")
-        else:
-            for msg in msgs_to_show:
-                role_name = "User" if msg["role"] == "user" else "AI"
-                lines.append(f"{role_name}: {msg['content']}")
-        
-        return "\n".join(lines)
-
-    def get_raw_history(self) -> List[Dict[str, str]]:
-        return self.history
+        with self.lock:
+            summary, recent = self.summary, self._rendered
+            if exclude_last_n > 0:
+                # 从缓存文本末尾去掉最近 n 行，不重新渲染
+                excluded = self._tail_length(exclude_last_n)
+                recent = recent[:max(0, len(recent) - excluded)]
+
+        return f"【前情提要】\n{summary}\n\n【近期对话】\n{recent or EMPTY_HISTORY}"
+
+    def _tail_length(self, n: int) -> int:
+        """最近 n 行 (含各自前面的换行) 在 _rendered 中所占的长度。"""
+        if n >= len(self.history):
+            return len(self._rendered)
+        return sum(len(self.history[-i].line) + 1 for i in range(1, n + 1))
+
+    def format_recent(self, n: int) -> str:
+        """只格式化最近 n 条消息（不含摘要），用于记忆提取。"""
+        with self.lock:
+            if n <= 0:
+                return ""
+            if n >= len(self.history):
+                return self._rendered
+            return self._rendered[len(self._rendered) - self._tail_length(n) + 1:]
+
+    def get_raw_history(self) -> List[Message]:
+        with self.lock:
+            return list(self.history)
+
+    def to_snapshot(self, user_id: int, session_id: str = "", is_private_mode: bool = False) -> ContextSnapshot:
+        """生成当前上下文的只读快照 (供总结触发策略等使用)。"""
+        with self.lock:
+            messages = [
+                ShortTermMessage(role=msg.role, content=msg.content, timestamp=msg.timestamp)
+                for msg in self.history
+            ]
+            turns = self.turns
+        return ContextSnapshot(
+            meta=SnapshotMeta(),
+            session=SessionInfo(user_id=user_id, active_session_id=session_id, is_private_mode=is_private_mode),
+            state=InteractionState(interaction_depth=turns),
+            short_term_context=messages
+        )
@@ -0,0 +1,234 @@
+"""
+文件职责：持久化截止时间调度器 (DeadlineScheduler)
+为大量用户的长周期定时任务 (如主动消息的检查 / 发送，间隔数十分钟到数小时) 提供统一调度，
+替代每用户若干个常驻的 threading.Timer 线程：
+- 最小堆按触发时间 (墙钟时间) 排序，单个分发线程等待堆顶到期，到期任务交给有界线程池执行。
+- schedule / cancel 为 O(log n) / O(1)：重置时压入新条目，旧条目按序号失效 (惰性删除)，
+  失效条目过多时重建堆。
+- 待触发任务定期 (persist_interval) 与停止时原子写入 JSON 文件，重启后恢复；
+  停机期间已过期的任务在恢复后立即触发。
+
+任务以 (kind, user_id) 标识，同一标识最多一个待触发任务；payload 需可 JSON 序列化。
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.logger import get_logger
+
+logger = get_logger("DeadlineScheduler")
+
+STATE_VERSION = 1
+COMPACT_RATIO = 2       # 堆大小超过有效任务数的该倍数时重建
+
+# handler(user_id, payload)
+DeadlineHandler = Callable[[int, Any], None]
+TaskKey = Tuple[str, int]
+
+class _Deadline:
+    __slots__ = ("kind", "user_id", "fire_at", "payload", "seq")
+
+    def __init__(self, kind: str, user_id: int, fire_at: float, payload: Any, seq: int):
+        self.kind = kind
+        self.user_id = user_id
+        self.fire_at = fire_at
+        self.payload = payload
+        self.seq = seq
+
+class DeadlineScheduler:
+    def __init__(self, state_path: Optional[str] = None, workers: int = 4,
+                 persist_interval: float = 5.0, name: str = "DeadlineScheduler"):
+        self.state_path = state_path
+        self.workers = workers
+        self.persist_interval = persist_interval
+        self.name = name
+
+        self._handlers: Dict[str, DeadlineHandler] = {}
+        self._heap: List[Tuple[float, int, TaskKey]] = []
+        self._entries: Dict[TaskKey, _Deadline] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._dirty = False
+        self._last_persist = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._counters: Dict[str, int] = {"scheduled": 0, "cancelled": 0, "fired": 0, "failed": 0, "restored": 0, "persisted": 0}
+
+    def register(self, kind: str, handler: DeadlineHandler):
+        """注册某类任务的处理函数。需在 start() 前完成，以便恢复的任务能找到处理函数。"""
+        self._handlers[kind] = handler
+
+    # ================== 生命周期 ==================
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._restore()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-worker")
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"[DEADLINE] START | name: {self.name} | pending: {len(self._entries)} | workers: {self.workers}")
+
+    def stop(self, wait: bool = True):
+        """停止分发并把待触发任务写入磁盘。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        self._persist(force=True)
+
+    # ================== 调度 ==================
+
+    def schedule(self, kind: str, user_id: int, delay: float, payload: Any = None) -> float:
+        """delay 秒后触发；同一 (kind, user_id) 的待触发任务被替换。返回触发时间 (墙钟)。"""
+        fire_at = time.time() + max(0.0, delay)
+        with self._cond:
+            self._push(_Deadline(kind, user_id, fire_at, payload, next(self._seq)))
+            self._counters["scheduled"] += 1
+            self._dirty = True
+            # 新任务早于当前堆顶时唤醒分发线程重新计算等待时间
+            if self._heap[0][2] == (kind, user_id):
+                self._cond.notify()
+        return fire_at
+
+    def cancel(self, kind: str, user_id: int) -> bool:
+        with self._cond:
+            entry = self._entries.pop((kind, user_id), None)
+            if entry is None:
+                return False
+            self._counters["cancelled"] += 1
+            self._dirty = True
+            return True
+
+    def pending(self, kind: str, user_id: int) -> Optional[float]:
+        """返回待触发任务的触发时间，没有时返回 None。"""
+        with self._cond:
+            entry = self._entries.get((kind, user_id))
+            return entry.fire_at if entry else None
+
+    def _push(self, entry: _Deadline):
+        key = (entry.kind, entry.user_id)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (entry.fire_at, entry.seq, key))
+        if len(self._heap) > COMPACT_RATIO * max(64, len(self._entries)):
+            self._heap = [(e.fire_at, e.seq, k) for k, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _is_live(self, seq: int, key: TaskKey) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry.seq == seq
+
+    # ================== 分发 ==================
+
+    def _run(self):
+        while True:
+            due: List[_Deadline] = []
+            with self._cond:
+                while not self._stopping:
+                    # 丢弃已被替换 / 取消的堆顶
+                    while self._heap and not self._is_live(self._heap[0][1], self._heap[0][2]):
+                        heapq.heappop(self._heap)
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    if self._dirty and self.state_path and self.persist_interval > 0:
+                        remaining = self._last_persist + self.persist_interval - now
+                        if remaining <= 0:
+                            break
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    _, seq, key = heapq.heappop(self._heap)
+                    if self._is_live(seq, key):
+                        due.append(self._entries.pop(key))
+                        self._dirty = True
+            for entry in due:
+                self._executor.submit(self._fire, entry)
+            self._persist()
+
+    def _fire(self, entry: _Deadline):
+        handler = self._handlers.get(entry.kind)
+        try:
+            if handler is None:
+                raise KeyError(f"未注册的任务类型: {entry.kind}")
+            handler(entry.user_id, entry.payload)
+            failed = False
+        except Exception as e:
+            failed = True
+            logger.error(f"[DEADLINE] HANDLER_FAIL | kind: {entry.kind} | user_id: {entry.user_id} | error: {e}", exc_info=True)
+        with self._cond:
+            self._counters["failed" if failed else "fired"] += 1
+
+    # ================== 持久化 ==================
+
+    def _persist(self, force: bool = False):
+        if not self.state_path:
+            return
+        with self._cond:
+            now = time.time()
+            if not self._dirty or (not force and now - self._last_persist < self.persist_interval):
+                return
+            tasks = [
+                {"kind": e.kind, "user_id": e.user_id, "fire_at": e.fire_at, "payload": e.payload}
+                for e in self._entries.values()
+            ]
+            self._dirty = False
+            self._last_persist = now
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": STATE_VERSION, "saved_at": now, "tasks": tasks}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+            with self._cond:
+                self._counters["persisted"] += 1
+        except Exception as e:
+            with self._cond:
+                self._dirty = True
+            logger.error(f"[DEADLINE] PERSIST_FAIL | path: {self.state_path} | error: {e}")
+
+    def _restore(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception as e:
+            logger.error(f"[DEADLINE] RESTORE_FAIL | path: {self.state_path} | error: {e}")
+            return
+        restored = 0
+        with self._cond:
+            for task in state.get("tasks", []):
+                if task["kind"] not in self._handlers:
+                    continue
+                self._push(_Deadline(task["kind"], int(task["user_id"]), float(task["fire_at"]), task.get("payload"), next(self._seq)))
+                restored += 1
+            self._counters["restored"] += restored
+        logger.info(f"[DEADLINE] RESTORE | path: {self.state_path} | tasks: {restored}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回调度 / 取消 / 触发 / 恢复计数，待触发任务数与堆大小 (含失效条目)。"""
+        with self._cond:
+            data: Dict[str, Any] = dict(self._counters)
+            data["pending"] = len(self._entries)
+            data["heap_size"] = len(self._heap)
+        return data
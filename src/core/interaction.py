@@ -2,14 +2,21 @@
 文件职责：交互管理器
 处理与用户的直接交互逻辑，包括消息缓冲、输入节奏控制（防刷屏）、
 错误消息反馈以及最终的消息发送调度。
+
+消息缓冲的防抖计时由一个共享的时间轮 (src/core/timer_wheel.py) 管理：
+每条新消息只在时间轮上重置该用户的截止时间 (O(1))，不再为每条消息创建 threading.Timer 线程；
+到期后由有界线程池执行 _process_buffer。多段回复交给 PacedDispatcher (src/core/outbound.py) 按打字节奏发送，
+处理线程不再 sleep 等待。
 """
 
 import threading
-import time
 import random
-from typing import Callable, List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional
 from src.core.config_loader import ConfigLoader
 from src.core.chat_service import ChatService
+from src.core.streaming import split_fragments
+from src.core.outbound import PacedDispatcher
+from src.core.timer_wheel import TimerWheel
 from src.core.logger import get_logger
 
 logger = get_logger("InteractionManager")
@@ -28,8 +35,12 @@ class InteractionManager:
         
         # 缓冲状态
         self.user_message_buffer: Dict[int, List[str]] = {}
-        self.user_timers: Dict[int, threading.Timer] = {}
         self.buffer_lock = threading.Lock()
+
+        # 防抖计时：单线程时间轮 + 有界线程池，key 为 ("debounce", user_id)
+        buffer_config = self.system_config.message_buffer
+        self.timer_wheel = TimerWheel(tick=buffer_config.timer_tick, workers=buffer_config.workers, name="InteractionTimer")
+        self.timer_wheel.start()
         
         # 发送消息的回调函数 (user_id, text) -> None
         self.sender: Optional[Callable[[int, str], None]] = None
@@ -37,12 +48,17 @@ class InteractionManager:
         # 播放动作的回调函数 (user_id, action_name) -> None
         self.action_player: Optional[Callable[[int, str], None]] = None
 
+        # 多段回复的节奏发送：片段按打字间隔排队发出，不占用处理线程
+        self.dispatcher = PacedDispatcher(tick=buffer_config.timer_tick)
+        self.dispatcher.start()
+
     def set_sender(self, sender_func: Callable[[int, str], None]):
         """
         设置发送消息的回调函数。
         sender_func 应该处理实际的 I/O (例如 Telegram send)。
         """
         self.sender = sender_func
+        self.dispatcher.sender = sender_func
 
     def set_action_player(self, player_func: Callable[[int, str], None]):
         """设置播放动作的回调函数"""
@@ -76,11 +92,6 @@ class InteractionManager:
             current_size = len(self.user_message_buffer[user_id])
             logger.info(f"[BUFFER] ADD | user_id: {user_id} | current_size: {current_size}")
             
-            # 重置计时器
-            if user_id in self.user_timers:
-                self.user_timers[user_id].cancel()
-                logger.debug(f"[TIMER] RESET | user_id: {user_id}")
-            
             # 从配置获取延迟
             try:
                 min_time = self.system_config.message_buffer.collect_min_time
@@ -92,10 +103,8 @@ class InteractionManager:
                 
             collect_time = random.uniform(min_time, max_time)
             
-            timer = threading.Timer(collect_time, self._process_buffer, args=[user_id])
-            timer.daemon = True
-            timer.start()
-            self.user_timers[user_id] = timer
+            # 已有未触发的计时时直接替换 (重置)
+            self.timer_wheel.schedule(("debounce", user_id), collect_time, self._process_buffer, user_id)
             logger.info(f"[TIMER] SCHEDULE | user_id: {user_id} | delay: {collect_time:.1f}s")
 
     def clear_user_state(self, user_id: int):
@@ -105,21 +114,16 @@ class InteractionManager:
         with self.buffer_lock:
             if user_id in self.user_message_buffer:
                 del self.user_message_buffer[user_id]
-            if user_id in self.user_timers:
-                self.user_timers[user_id].cancel()
-                del self.user_timers[user_id]
-            logger.info(f"[INTERACTION] CLEARED | user_id: {user_id}")
+            self.timer_wheel.cancel(("debounce", user_id))
+        self.dispatcher.cancel(user_id)
+        logger.info(f"[INTERACTION] CLEARED | user_id: {user_id}")
 
     def _process_buffer(self, user_id: int):
         """
         处理用户缓冲区中的消息。
         """
         with self.buffer_lock:
-            # 从字典中移除计时器，因为它已经触发
-            if user_id in self.user_timers:
-                del self.user_timers[user_id]
-            
-            # 获取并清除消息
+            # 获取并清除消息 (时间轮在触发时已移除该计时)
             messages = self.user_message_buffer.get(user_id, [])
             if not messages:
                 return
@@ -130,24 +134,29 @@ class InteractionManager:
         logger.info(f"[BUFFER] FLUSH | user_id: {user_id} | total_len: {len(full_text)}")
         
         try:
+            # 流式模式：片段一生成完就发送，不等待整段回复
+            # 动作在生成文本前由编排器回调，与非流式一样先于文本发出
+            on_fragment = None
+            on_action = None
+            if self.system_config.llm.stream and self.sender:
+                on_fragment = self._make_fragment_sender(user_id)
+                on_action = lambda action: self._play_action(user_id, action)
+
             # 调用 ChatService
             # 注意：response 可能是 str 或 AgentResponse 对象
-            response = self.chat_service.process_user_input(user_id, full_text)
+            response = self.chat_service.process_user_input(user_id, full_text, on_fragment=on_fragment, on_action=on_action)
             
             # 处理复杂响应对象 (AgentResponse)
             text_to_send = response
             if hasattr(response, 'text'):
                 text_to_send = response.text
                 
-                # 如果有动作且设置了播放器，则执行动作
-                if hasattr(response, 'action') and response.action and self.action_player:
-                    try:
-                        self.action_player(user_id, response.action)
-                    except Exception as ae:
-                        logger.error(f"[INTERACTION] ACTION_FAIL | user_id: {user_id} | action: {response.action} | error: {ae}")
-
-            # 分割并发送文本
-            if text_to_send:
+                # 如果有动作且设置了播放器，则执行动作 (流式模式下已在生成前执行)
+                if hasattr(response, 'action') and response.action and not getattr(response, 'streamed', False):
+                    self._play_action(user_id, response.action)
+
+            # 分割并发送文本（流式模式下文本已逐段发出）
+            if text_to_send and not getattr(response, 'streamed', False):
                 self._send_response_chunks(user_id, text_to_send)
             
         except Exception as e:
@@ -156,39 +165,40 @@ class InteractionManager:
                 # 友好的错误提示，不暴露内部异常
                 self.sender(user_id, "⚠️ 抱歉，我现在有点晕，请稍后再试。")
 
+    def _play_action(self, user_id: int, action: str):
+        if not self.action_player:
+            return
+        try:
+            self.action_player(user_id, action)
+        except Exception as ae:
+            logger.error(f"[INTERACTION] ACTION_FAIL | user_id: {user_id} | action: {action} | error: {ae}")
+
+    def get_timer_metrics(self) -> Dict[str, Any]:
+        """返回防抖时间轮的调度 / 重置 / 触发计数与触发延迟分位数。"""
+        return self.timer_wheel.snapshot()
+
+    def get_dispatch_metrics(self) -> Dict[str, Any]:
+        """返回节奏发送队列的入队 / 发送 / 丢弃计数。"""
+        return self.dispatcher.snapshot()
+
+    def _make_fragment_sender(self, user_id: int) -> Callable[[str], None]:
+        """
+        为流式生成创建片段发送回调。
+        片段直接进入节奏发送队列：与 _send_response_chunks 相同的间隔，
+        若模型生成本身已经耗时超过该间隔，则立即发送。生成线程不等待。
+        """
+        def on_fragment(fragment: str):
+            self.dispatcher.enqueue(user_id, [fragment])
+
+        return on_fragment
+
     def _send_response_chunks(self, user_id: int, text: str):
         """
-        通过 '$' 或换行符分割回复，并带延迟发送。
+        通过 '$' 或换行符分割回复，交给节奏发送队列按打字间隔逐段发送，立即返回。
         """
         if not text:
             return
 
         # 分割逻辑：优先使用 '$'，然后是换行符
         # Prompt 通常指示使用 '$' 进行分割
-        chunks = []
-        if '$' in text:
-            parts = text.split('$')
-            for p in parts:
-                if p.strip():
-                    chunks.append(p.strip())
-        else:
-            # 如果没有 '$'，则回退到换行符分割
-            lines = text.split('\n')
-            for line in lines:
-                if line.strip():
-                    chunks.append(line.strip())
-        
-        if not chunks:
-            chunks = [text]
-
-        # 发送循环
-        for i, chunk in enumerate(chunks):
-            if self.sender:
-                self.sender(user_id, chunk)
-            
-            # 块之间的延迟
-            if i < len(chunks) - 1:
-                # 简单的阅读时间计算：0.5s + 每个字符 0.05s，最长 3s
-                # TODO: 优化节奏控制算法，使其更自然
-                delay = min(3.0, 0.5 + len(chunk) * 0.05)
-                time.sleep(delay)
+        self.dispatcher.enqueue(user_id, split_fragments(text))
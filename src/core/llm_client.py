@@ -2,17 +2,39 @@
 文件职责：LLM 客户端
 负责与 OpenAI 兼容的 API 进行通信（如 DeepSeek, ChatGPT）。
 提供基础的对话补全功能，以及专门的工具函数（关键词提取、总结生成）。
+所有请求复用同一个 requests.Session（带连接池与 Keep-Alive），避免每轮对话重复握手。
+
+Prompt 构造与结果解析放在 BaseLLMClient 中，由同步的 LLMClient 与
+异步的 AsyncLLMClient (src/core/async_llm_client.py) 共用。
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import json
+import re
+import threading
 import time
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Tuple
 from src.core.config import SystemConfig
+from src.core.llm_resilience import ResiliencePolicy, http_error_classifier
+from src.core.llm_router import LLMBackend, LLMRouter, build_backends
+from src.core.llm_usage import PromptCacheMetrics
 from src.core.logger import get_logger
+from src.security.decisions import SafetyDecision
 
 logger = get_logger("LLMClient")
 
-class LLMClient:
+DEFAULT_USER_SUMMARY = "用户信息加载中..."
+STREAM_DONE = "[DONE]"
+BATCH_SECTION_MARK = "### 对话"
+BATCH_SECTION_PATTERN = re.compile(r"^#+\s*对话\s*(\d+)")
+BATCH_MAX_TOKENS = 4000
+
+class BaseLLMClient:
+    """
+    同步 / 异步客户端共享的部分：配置、请求体构造、工具函数的 Prompt 与解析。
+    不包含任何网络 I/O。
+    """
     def __init__(self, system_config: SystemConfig):
         self.config = system_config
         self.api_key = system_config.llm.api_key
@@ -20,51 +42,315 @@ class LLMClient:
         self.model = system_config.llm.model
         self.temperature = system_config.llm.temperature
         self.max_tokens = system_config.llm.max_tokens
+        self.timeout = system_config.llm.request_timeout
+        # 响应 usage 中的 token 用量与前缀缓存命中 (见 llm_usage.py)
+        self.usage_metrics = PromptCacheMetrics()
 
     def _get_headers(self) -> Dict[str, str]:
+        """公共请求头。Authorization 按后端在每次请求时附加 (见 LLMBackend.headers)。"""
         return {
-            "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
-    def chat_completion(self, messages: List[Dict[str, str]], temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
-        """
-        调用 LLM 对话补全 API。
-        """
-        data = {
+    def _create_router(self, policy: ResiliencePolicy) -> LLMRouter:
+        """按配置创建多后端路由，健康判断复用 policy 中按 endpoint 维护的熔断器。"""
+        llm_config = self.config.llm
+        return LLMRouter(
+            build_backends(llm_config),
+            breaker_lookup=policy.breaker,
+            window=llm_config.router_window,
+            max_error_rate=llm_config.router_max_error_rate,
+            classifier=policy.classifier
+        )
+
+    def _build_payload(self, messages: List[Dict[str, str]], temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """构造请求体。model 字段在发往具体后端时会被替换为该后端的模型名。"""
+        return {
             "model": self.model,
             "messages": messages,
             "temperature": temperature if temperature is not None else self.temperature,
             "max_tokens": max_tokens if max_tokens is not None else self.max_tokens
         }
 
+    @staticmethod
+    def _parse_completion(result: Dict[str, Any]) -> str:
+        return result["choices"][0]["message"]["content"].strip()
+
+    @staticmethod
+    def _sse_data(line: str) -> Optional[str]:
+        """提取一行 SSE 的 data 负载，非数据行 (注释、空行、event:) 返回 None。"""
+        if not line or not line.startswith("data:"):
+            return None
+        return line[5:].strip()
+
+    @staticmethod
+    def _parse_stream_chunk(payload: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """解析一个流式 chunk，返回 (增量文本, usage)。usage 只在开启 include_usage 时的最后一个 chunk 中出现。"""
+        chunk = json.loads(payload)
+        choices = chunk.get("choices") or []
+        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+        return delta, chunk.get("usage")
+
+    def _build_stream_payload(self, messages: List[Dict[str, str]], temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """流式请求体：在普通请求体基础上开启 stream，按配置要求最后一个 chunk 返回 usage。"""
+        data = self._build_payload(messages, temperature, max_tokens)
+        data["stream"] = True
+        if self.config.llm.stream_include_usage:
+            data["stream_options"] = {"include_usage": True}
+        return data
+
+    # ================== 工具函数：Prompt 与解析 ==================
+
+    @staticmethod
+    def _keywords_messages(text: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": "提取输入文本的核心关键词，用逗号分隔，不超过5个词。"},
+            {"role": "user", "content": text}
+        ]
+
+    @staticmethod
+    def _parse_keywords(content: str) -> List[str]:
+        return [k.strip() for k in content.split(',') if k.strip()]
+
+    @staticmethod
+    def _summary_messages(memories: List[str]) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": "根据以下用户记忆，生成≤200字的USER_PROMPT，分核心层（永久属性）和动态层（临时事件）。核心层必加，动态层仅在相关时提及。"},
+            {"role": "user", "content": "\n".join(memories)}
+        ]
+
+    @staticmethod
+    def _rolling_summary_messages(previous_summary: str, conversation_text: str, max_chars: int) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": f"把【新对话】中的要点并入【已有摘要】，输出更新后的前情提要（≤{max_chars}字）。"
+                                          "保留人物、事实、约定与情绪变化，省略寒暄，只输出摘要正文。"},
+            {"role": "user", "content": f"【已有摘要】\n{previous_summary}\n\n【新对话】\n{conversation_text}"}
+        ]
+
+    @staticmethod
+    def _memories_messages(conversation_text: str) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system", "content":
+                    """从对话中提取用户的重要信息，按格式返回：
+                        事件（YYYY-MM-DD + 具体事件）,关键词（逗号分隔）,重要度(0-100),有效期（天，365=永久）
+                        仅保留重要信息，普通闲聊忽略。
+                    """},
+            {"role": "user", "content": conversation_text}
+        ]
+
+    @staticmethod
+    def _parse_memories(content: str) -> List[tuple]:
+        memories = []
+        for line in content.split('\n'):
+            if line.strip():
+                parts = line.split(',')
+                if len(parts) >= 4:
+                    # 关键词本身以逗号分隔：首段为事件，末两段为重要度与有效期，中间部分都是关键词
+                    try:
+                        keywords = ','.join(p.strip() for p in parts[1:-2])
+                        memories.append((parts[0].strip(), keywords, int(parts[-2].strip()), int(parts[-1].strip())))
+                    except ValueError:
+                        logger.debug(f"[LLM] SKIP_MEMORY_LINE | line: {line.strip()}")
+        return memories
+
+    @staticmethod
+    def _batch_memories_messages(conversations: List[str]) -> List[Dict[str, str]]:
+        """多段对话合并为一次提取请求，每段对话以 "### 对话 N" 标记，要求输出按同样的标记分段。"""
+        # 对话内容中形如编号行的文本去掉前导 "#"，避免一个用户的内容被解析到其他用户名下
+        sections = "\n\n".join(
+            f"{BATCH_SECTION_MARK} {i + 1}\n" + "\n".join(
+                line.lstrip().lstrip('#') if BATCH_SECTION_PATTERN.match(line.strip()) else line
+                for line in text.split('\n')
+            )
+            for i, text in enumerate(conversations)
+        )
+        return [
+            {
+                "role": "system", "content":
+                    f"""以下有多段互不相关的对话，分别从每段对话中提取用户的重要信息。
+                        输出时先单独一行写 "{BATCH_SECTION_MARK} N"（与输入编号一致），其后每行一条，按格式返回：
+                        事件（YYYY-MM-DD + 具体事件）,关键词（逗号分隔）,重要度(0-100),有效期（天，365=永久）
+                        仅保留重要信息，普通闲聊忽略；没有可提取信息的对话只写编号行。
+                    """},
+            {"role": "user", "content": sections}
+        ]
+
+    @staticmethod
+    def _parse_batch_memories(content: str, count: int) -> Optional[List[List[tuple]]]:
+        """按 "### 对话 N" 分段解析批量提取结果。一个编号行都没有时返回 None (由调用方逐段重试)。"""
+        sections: Dict[int, List[str]] = {}
+        current = None
+        for line in content.split('\n'):
+            match = BATCH_SECTION_PATTERN.match(line.strip())
+            if match:
+                current = int(match.group(1)) - 1
+                sections.setdefault(current, [])
+            elif current is not None and 0 <= current < count:
+                sections[current].append(line)
+        if not sections:
+            return None
+        return [BaseLLMClient._parse_memories('\n'.join(sections.get(i, []))) for i in range(count)]
+
+
+class LLMClient(BaseLLMClient):
+    def __init__(self, system_config: SystemConfig):
+        super().__init__(system_config)
+
+        # 共享连接池：同一 LLMClient 的所有调用（回复、关键词、摘要）复用 TCP/TLS 连接
+        self._session_lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+
+        # 重试 / 熔断 / 对冲：覆盖本客户端的所有调用
+        retry_config = system_config.llm.retry
+        self.policy = ResiliencePolicy(
+            retry_config,
+            http_error_classifier(retry_config.retry_on_status, (requests.ConnectionError, requests.Timeout))
+        )
+
+        # 多后端路由：按延迟 / 错误率 / 安全决策选择后端并故障转移
+        self.router = self._create_router(self.policy)
+
+    def _create_session(self) -> requests.Session:
+        """创建带有限连接池的 Session。pool_block=True 保证并发超出上限时排队而不是新建连接。"""
+        llm_config = self.config.llm
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=llm_config.pool_connections,
+            pool_maxsize=llm_config.pool_maxsize,
+            pool_block=True
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self._get_headers())
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """惰性创建共享 Session（线程安全）。"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回调用指标快照（成功/失败/重试/熔断/对冲次数与延迟分位数，各后端路由状态，以及用量与缓存命中）。"""
+        metrics = self.policy.metrics.snapshot()
+        metrics["backends"] = self.router.snapshot()
+        metrics["usage"] = self.usage_metrics.snapshot()
+        return metrics
+
+    def close(self):
+        """关闭连接池，释放保活连接。"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def chat_completion(self, messages: List[Dict[str, str]], temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                        safety_decision: Optional[SafetyDecision] = None) -> str:
+        """
+        调用 LLM 对话补全 API。
+        safety_decision 用于影响后端选择 (例如 REQUIRE_FALLBACK 优先云端)。
+        """
+        data = self._build_payload(messages, temperature, max_tokens)
+
+        def _post(backend: LLMBackend) -> str:
+            started = time.time()
+            response = self.session.post(
+                backend.api_url,
+                json=dict(data, model=backend.model),
+                headers=backend.headers(),
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            result = response.json()
+            self.usage_metrics.record(result.get("usage"), time.time() - started)
+            return self._parse_completion(result)
+
+        def _call(backend: LLMBackend, max_attempts: Optional[int]) -> Tuple[str, LLMBackend]:
+            return self.policy.call(backend.api_url, lambda: _post(backend), max_attempts=max_attempts), backend
+
         start_time = time.time()
         try:
-            # TODO: 添加重试机制和流式输出支持
-            response = requests.post(self.api_url, headers=self._get_headers(), json=data, timeout=60)
-            response.raise_for_status()
-            content = response.json()["choices"][0]["message"]["content"].strip()
-            
+            content, backend = self.router.execute(_call, safety_decision)
+
             duration = time.time() - start_time
-            logger.info(f"[LLM] SUCCESS | model: {self.model} | duration: {duration:.2f}s | response_len: {len(content)}")
-            
+            logger.info(f"[LLM] SUCCESS | backend: {backend.name} | model: {backend.model} | duration: {duration:.2f}s | response_len: {len(content)}")
+
             return content
         except Exception as e:
             duration = time.time() - start_time
             logger.error(f"[LLM] FAILED | model: {self.model} | duration: {duration:.2f}s | error: {str(e)}", exc_info=True)
             raise
 
+    def stream_chat_completion(self, messages: List[Dict[str, str]], temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                               safety_decision: Optional[SafetyDecision] = None) -> Iterator[str]:
+        """
+        以流式 (SSE) 调用 LLM 对话补全 API，逐个产出增量文本。
+        """
+        data = self._build_stream_payload(messages, temperature, max_tokens)
+
+        def _open_stream(backend: LLMBackend) -> requests.Response:
+            response = self.session.post(
+                backend.api_url,
+                json=dict(data, model=backend.model),
+                headers=backend.headers(),
+                timeout=self.timeout,
+                stream=True
+            )
+            try:
+                response.raise_for_status()
+            except Exception:
+                response.close()
+                raise
+            return response
+
+        def _call(backend: LLMBackend, max_attempts: Optional[int]) -> Tuple[requests.Response, LLMBackend]:
+            return self.policy.call(backend.api_url, lambda: _open_stream(backend), hedge=False, max_attempts=max_attempts), backend
+
+        start_time = time.time()
+        first_token_time = None
+        total_len = 0
+        usage = None
+        try:
+            # 只对建立连接阶段重试和故障转移；开始产出 delta 后无法透明重放，不做对冲
+            response, backend = self.router.execute(_call, safety_decision)
+            with response:
+                response.encoding = "utf-8"
+                for line in response.iter_lines(decode_unicode=True):
+                    payload = self._sse_data(line)
+                    if payload is None:
+                        continue
+                    if payload == STREAM_DONE:
+                        break
+                    delta, chunk_usage = self._parse_stream_chunk(payload)
+                    if chunk_usage:
+                        usage = chunk_usage
+                    if not delta:
+                        continue
+                    if first_token_time is None:
+                        first_token_time = time.time() - start_time
+                    total_len += len(delta)
+                    yield delta
+
+            duration = time.time() - start_time
+            ttft = first_token_time if first_token_time is not None else duration
+            self.usage_metrics.record(usage, duration, ttft)
+            logger.info(f"[LLM] STREAM_SUCCESS | backend: {backend.name} | model: {backend.model} | ttft: {ttft:.2f}s | duration: {duration:.2f}s | response_len: {total_len}")
+        except Exception as e:
+            duration = time.time() - start_time
+            logger.error(f"[LLM] STREAM_FAILED | model: {self.model} | duration: {duration:.2f}s | error: {str(e)}", exc_info=True)
+            raise
+
     def extract_keywords(self, text: str) -> List[str]:
         """
         使用 LLM 从文本中提取关键词。
         """
-        messages = [
-            {"role": "system", "content": "提取输入文本的核心关键词，用逗号分隔，不超过5个词。"},
-            {"role": "user", "content": text}
-        ]
         try:
-            content = self.chat_completion(messages, temperature=0.3, max_tokens=100)
-            keywords = [k.strip() for k in content.split(',') if k.strip()]
+            content = self.chat_completion(self._keywords_messages(text), temperature=0.3, max_tokens=100)
+            keywords = self._parse_keywords(content)
             logger.debug(f"[LLM] EXTRACT_KEYWORDS | count: {len(keywords)} | keywords: {keywords}")
             return keywords
         except Exception as e:
@@ -76,47 +362,66 @@ class LLMClient:
         根据记忆生成用户摘要。
         """
         if not memories:
-            return "用户信息加载中..."
-            
-        messages = [
-            {"role": "system", "content": "根据以下用户记忆，生成≤200字的USER_PROMPT，分核心层（永久属性）和动态层（临时事件）。核心层必加，动态层仅在相关时提及。"},
-            {"role": "user", "content": "\n".join(memories)}
-        ]
+            return DEFAULT_USER_SUMMARY
+
         try:
-            summary = self.chat_completion(messages, temperature=0.5, max_tokens=500)
+            summary = self.chat_completion(self._summary_messages(memories), temperature=0.5, max_tokens=500)
             logger.info(f"[LLM] GENERATE_SUMMARY | length: {len(summary)}")
             return summary
         except Exception as e:
             logger.error(f"[LLM] GENERATE_SUMMARY_FAIL | error: {str(e)}")
-            return "用户信息加载中..."
+            return DEFAULT_USER_SUMMARY
+
+    def summarize_conversation(self, previous_summary: str, conversation_text: str, max_chars: int = 300) -> Optional[str]:
+        """
+        把一段对话并入已有摘要，返回新的摘要。失败时返回 None，由调用方保留原始消息稍后重试。
+        """
+        try:
+            summary = self.chat_completion(
+                self._rolling_summary_messages(previous_summary, conversation_text, max_chars),
+                temperature=0.3, max_tokens=max_chars * 2
+            ).strip()
+            logger.info(f"[LLM] ROLLING_SUMMARY | length: {len(summary)}")
+            return summary or None
+        except Exception as e:
+            logger.error(f"[LLM] ROLLING_SUMMARY_FAIL | error: {str(e)}")
+            return None
 
     def extract_new_memories(self, conversation_text: str) -> List[tuple]:
         """
         从对话文本中提取新记忆。
         返回列表：(事件, 关键词, 重要度, 有效期)。
         """
-        messages = [
-            {
-                "role": "system", "content": 
-                    """从对话中提取用户的重要信息，按格式返回：
-                        事件（YYYY-MM-DD + 具体事件）,关键词（逗号分隔）,重要度(0-100),有效期（天，365=永久）
-                        仅保留重要信息，普通闲聊忽略。
-                    """},
-            {"role": "user", "content": conversation_text}
-        ]
-        
         try:
-            content = self.chat_completion(messages, temperature=0.3, max_tokens=1000)
-            memories = []
-            for line in content.split('\n'):
-                if line.strip():
-                    parts = line.split(',')
-                    if len(parts) >= 4:
-                        # 简单的清理和验证
-                        memories.append((parts[0].strip(), parts[1].strip(), int(parts[2].strip()), int(parts[3].strip())))
-            
+            content = self.chat_completion(self._memories_messages(conversation_text), temperature=0.3, max_tokens=1000)
+            memories = self._parse_memories(content)
+
             logger.info(f"[LLM] EXTRACT_MEMORIES | count: {len(memories)}")
             return memories
         except Exception as e:
             logger.error(f"[LLM] EXTRACT_MEMORIES_FAIL | error: {str(e)}")
             return []
+
+    def extract_new_memories_batch(self, conversations: List[str]) -> List[List[tuple]]:
+        """
+        一次请求从多段对话 (通常来自不同用户) 中提取记忆，结果与输入一一对应。
+        模型未按编号分段输出时退回逐段调用 extract_new_memories。
+        """
+        if len(conversations) <= 1:
+            return [self.extract_new_memories(text) for text in conversations]
+
+        try:
+            content = self.chat_completion(
+                self._batch_memories_messages(conversations), temperature=0.3,
+                max_tokens=min(BATCH_MAX_TOKENS, 1000 * len(conversations))
+            )
+            results = self._parse_batch_memories(content, len(conversations))
+            if results is not None:
+                logger.info(f"[LLM] EXTRACT_MEMORIES_BATCH | conversations: {len(conversations)} | count: {sum(len(r) for r in results)}")
+                return results
+            logger.warning(f"[LLM] EXTRACT_MEMORIES_BATCH_UNPARSED | conversations: {len(conversations)}")
+        except Exception as e:
+            logger.error(f"[LLM] EXTRACT_MEMORIES_BATCH_FAIL | error: {str(e)}")
+            return [[] for _ in conversations]
+
+        return [self.extract_new_memories(text) for text in conversations]
@@ -0,0 +1,401 @@
+"""
+文件职责：LLM 调用的容错策略层
+为 LLMClient / AsyncLLMClient 的每一次 HTTP 调用提供：
+- 带抖动的指数退避重试（遵守 Retry-After）
+- 按 Endpoint 划分的熔断器 (Circuit Breaker)
+- 对冲请求 (Hedged Request)：超过延迟阈值仍未返回时并行发出第二个请求，取先返回者
+- 重试预算 (Retry Budget)：限制重试占总请求的比例，避免大量用户同时重试造成重试风暴
+- 调用指标：成功/失败/重试/熔断/对冲次数及延迟分位数
+
+本模块不关心具体的 HTTP 库，异常的分类由调用方传入的 classifier 完成。
+"""
+
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from enum import Enum
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from src.core.config import LLMRetryConfig
+from src.core.logger import get_logger
+
+logger = get_logger("LLMResilience")
+
+# classifier(exc) -> (是否可重试, 服务端建议的等待秒数)
+ErrorClassifier = Callable[[BaseException], Tuple[bool, Optional[float]]]
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，请求被直接拒绝。"""
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"circuit open for {endpoint}, retry in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头，支持秒数和 HTTP 日期两种格式。"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def http_error_classifier(retry_statuses, transient_errors: Tuple[type, ...]) -> ErrorClassifier:
+    """
+    构造 HTTP 异常分类器。
+    - 带 response 的状态码异常 (requests.HTTPError / httpx.HTTPStatusError)：状态码在 retry_statuses 中则可重试，
+      并读取 Retry-After。
+    - transient_errors 中的网络异常（连接失败、超时）：可重试。
+    - 其他（参数错误、解析失败等）：不可重试。
+    """
+    retry_statuses = frozenset(retry_statuses)
+
+    def classify(exc: BaseException) -> Tuple[bool, Optional[float]]:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+        if status is not None:
+            if status in retry_statuses:
+                return True, parse_retry_after(response.headers.get("Retry-After"))
+            return False, None
+        if isinstance(exc, transient_errors):
+            return True, None
+        return False, None
+
+    return classify
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    单个 Endpoint 的熔断器。
+    - CLOSED: 正常放行，连续失败达到阈值后转为 OPEN。
+    - OPEN: 直接拒绝，冷却时间结束后转为 HALF_OPEN。
+    - HALF_OPEN: 只放行一个探测请求，成功则 CLOSED，失败则重新 OPEN。
+    """
+    def __init__(self, endpoint: str, failure_threshold: int, reset_timeout: float):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """请求前调用，熔断时抛出 CircuitOpenError。"""
+        with self.lock:
+            if self.state == BreakerState.OPEN:
+                elapsed = time.time() - self.opened_at
+                if elapsed < self.reset_timeout:
+                    raise CircuitOpenError(self.endpoint, self.reset_timeout - elapsed)
+                self.state = BreakerState.HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"[BREAKER] HALF_OPEN | endpoint: {self.endpoint}")
+
+            if self.state == BreakerState.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError(self.endpoint, self.reset_timeout)
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            if self.state != BreakerState.CLOSED:
+                logger.info(f"[BREAKER] CLOSED | endpoint: {self.endpoint}")
+            self.state = BreakerState.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            should_open = (
+                self.state == BreakerState.HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+            )
+            if should_open and self.state != BreakerState.OPEN:
+                logger.warning(f"[BREAKER] OPEN | endpoint: {self.endpoint} | consecutive_failures: {self.consecutive_failures}")
+            if should_open:
+                self.state = BreakerState.OPEN
+                self.opened_at = time.time()
+
+    @property
+    def is_available(self) -> bool:
+        """不改变状态的可用性查询（供路由等模块做健康判断）。"""
+        with self.lock:
+            if self.state == BreakerState.OPEN:
+                return time.time() - self.opened_at >= self.reset_timeout
+            return True
+
+class RetryBudget:
+    """
+    重试预算：每个请求存入 ratio 个令牌，每次重试消耗 1 个。
+    故障期间重试量被限制在请求量的 ratio 比例以内，min_tokens 保证低流量时也能重试。
+    """
+    def __init__(self, ratio: float, min_tokens: float):
+        self.ratio = ratio
+        self.min_tokens = min_tokens
+        self.max_tokens = max(min_tokens, 100.0)
+        self.balance = min_tokens
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.balance = min(self.max_tokens, self.balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self.lock:
+            if self.balance >= 1.0:
+                self.balance -= 1.0
+                return True
+            return False
+
+class LLMCallMetrics:
+    """线程安全的调用指标。"""
+    LATENCY_WINDOW = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "retry_budget_exhausted": 0,
+            "breaker_rejections": 0,
+            "hedges_launched": 0,
+            "hedges_won": 0,
+        }
+        self.latencies: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+
+    def incr(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_latency(self, seconds: float):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            data: Dict[str, Any] = dict(self.counters)
+            ordered = sorted(self.latencies)
+        if ordered:
+            data["latency_p50"] = ordered[int(0.50 * (len(ordered) - 1))]
+            data["latency_p99"] = ordered[int(0.99 * (len(ordered) - 1))]
+        return data
+
+class ResiliencePolicy:
+    """
+    LLM 调用的容错策略引擎。
+    同一个 Policy 可被多个客户端共享，熔断器按 endpoint 维护。
+    """
+    def __init__(self, config: LLMRetryConfig, classifier: ErrorClassifier):
+        self.config = config
+        self.classifier = classifier
+        self.metrics = LLMCallMetrics()
+        self.retry_budget = RetryBudget(config.retry_budget_ratio, config.retry_budget_min)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+
+    # ================== 公共组件 ==================
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._breakers_lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(
+                    endpoint,
+                    failure_threshold=self.config.breaker_failure_threshold,
+                    reset_timeout=self.config.breaker_reset_timeout
+                )
+            return self._breakers[endpoint]
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        第 attempt 次重试前的等待时间 (attempt 从 1 开始)。
+        Full Jitter: uniform(0, min(max_delay, base * 2^(attempt-1)))，
+        服务端给出 Retry-After 时以其为下限（上限 max_retry_after）。
+        """
+        ceiling = min(self.config.max_delay, self.config.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None and self.config.respect_retry_after:
+            delay = max(delay, min(retry_after, self.config.max_retry_after))
+        return delay
+
+    def _should_retry(self, attempt: int, retryable: bool, max_attempts: Optional[int] = None) -> bool:
+        if max_attempts is None:
+            max_attempts = self.config.max_attempts
+        if not retryable or attempt >= max_attempts:
+            return False
+        if not self.retry_budget.try_withdraw():
+            self.metrics.incr("retry_budget_exhausted")
+            return False
+        return True
+
+    def _on_failure(self, endpoint: str, breaker: CircuitBreaker, exc: BaseException, attempt: int) -> Tuple[bool, Optional[float]]:
+        retryable, retry_after = self.classifier(exc)
+        # 只有服务端/网络类故障才计入熔断，4xx 参数错误不代表 Endpoint 不健康
+        if retryable:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        logger.warning(f"[RETRY] ATTEMPT_FAIL | endpoint: {endpoint} | attempt: {attempt} | retryable: {retryable} | error: {exc}")
+        return retryable, retry_after
+
+    # ================== 同步调用 ==================
+
+    def call(self, endpoint: str, fn: Callable[[], Any], hedge: bool = True, max_attempts: Optional[int] = None) -> Any:
+        """
+        在策略保护下执行 fn()。
+        hedge=False 用于不可并行重放的请求（例如已经开始消费的流）。
+        max_attempts 覆盖配置的尝试次数（例如路由还有后备后端时只尝试一次，尽快故障转移）。
+        """
+        breaker = self.breaker(endpoint)
+        self.metrics.incr("calls")
+        self.retry_budget.deposit()
+        start_time = time.time()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                self.metrics.incr("breaker_rejections")
+                self.metrics.incr("failures")
+                raise
+
+            try:
+                if hedge and self.config.hedge_after:
+                    result = self._call_hedged(fn)
+                else:
+                    result = fn()
+            except Exception as e:
+                retryable, retry_after = self._on_failure(endpoint, breaker, e, attempt)
+                if not self._should_retry(attempt, retryable, max_attempts):
+                    self.metrics.incr("failures")
+                    raise
+                self.metrics.incr("retries")
+                delay = self.backoff_delay(attempt, retry_after)
+                logger.info(f"[RETRY] BACKOFF | endpoint: {endpoint} | next_attempt: {attempt + 1} | delay: {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            breaker.record_success()
+            self.metrics.incr("successes")
+            self.metrics.observe_latency(time.time() - start_time)
+            return result
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        if self._hedge_pool is None:
+            with self._breakers_lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(
+                        max_workers=self.config.hedge_pool_size,
+                        thread_name_prefix="llm-hedge"
+                    )
+        return self._hedge_pool
+
+    def _call_hedged(self, fn: Callable[[], Any]) -> Any:
+        """
+        发出主请求；hedge_after 秒后仍未完成则再发一个对冲请求，返回先成功的结果。
+        落后的请求无法中断，会在后台完成后把连接归还连接池。
+        """
+        pool = self._get_hedge_pool()
+        primary = pool.submit(fn)
+        done, _ = wait([primary], timeout=self.config.hedge_after)
+        if done:
+            return primary.result()
+
+        self.metrics.incr("hedges_launched")
+        hedge = pool.submit(fn)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.metrics.incr("hedges_won")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    # ================== 异步调用 ==================
+
+    async def call_async(self, endpoint: str, fn: Callable[[], Awaitable[Any]], hedge: bool = True, max_attempts: Optional[int] = None) -> Any:
+        """call() 的异步版本，fn 为返回协程的工厂函数。"""
+        breaker = self.breaker(endpoint)
+        self.metrics.incr("calls")
+        self.retry_budget.deposit()
+        start_time = time.time()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                self.metrics.incr("breaker_rejections")
+                self.metrics.incr("failures")
+                raise
+
+            try:
+                if hedge and self.config.hedge_after:
+                    result = await self._call_hedged_async(fn)
+                else:
+                    result = await fn()
+            except Exception as e:
+                retryable, retry_after = self._on_failure(endpoint, breaker, e, attempt)
+                if not self._should_retry(attempt, retryable, max_attempts):
+                    self.metrics.incr("failures")
+                    raise
+                self.metrics.incr("retries")
+                delay = self.backoff_delay(attempt, retry_after)
+                logger.info(f"[RETRY] BACKOFF | endpoint: {endpoint} | next_attempt: {attempt + 1} | delay: {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            self.metrics.incr("successes")
+            self.metrics.observe_latency(time.time() - start_time)
+            return result
+
+    async def _call_hedged_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """异步对冲：先返回的成功结果胜出，另一个请求被取消。"""
+        primary = asyncio.ensure_future(fn())
+        done, _ = await asyncio.wait({primary}, timeout=self.config.hedge_after)
+        if done:
+            return primary.result()
+
+        self.metrics.incr("hedges_launched")
+        hedge = asyncio.ensure_future(fn())
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.metrics.incr("hedges_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,238 @@
+"""
+文件职责：多后端 LLM 路由
+维护多个 OpenAI 兼容后端（配置的云端 api_url、本地 src/llm_system/server、以及 llm.backends 中的其他后端），
+按滚动窗口统计每个后端的延迟与错误率，把请求发往当前最快的健康后端，并在同一轮对话内自动故障转移。
+
+路由会参考 src/security 给出的 SafetyDecision：
+- REQUIRE_FALLBACK: 优先云端（更强的模型），本地后端排到最后。
+- ROUTE_TO_SKILL: 优先带 "expert" 标签的后端，其次云端，最后本地。
+- 其他: 所有健康后端按延迟排序。
+
+不可重试的 4xx (400/401/422 等，请求本身有误) 不做故障转移，直接抛出，也不计入后端错误率：
+换一个后端也会得到同样的结果，计入反而会把健康的后端挤出路由。
+"""
+
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from src.core.config import LLMConfig
+from src.core.llm_resilience import CircuitBreaker, CircuitOpenError, ErrorClassifier
+from src.core.logger import get_logger
+from src.security.decisions import SafetyDecision
+
+logger = get_logger("LLMRouter")
+
+T = TypeVar("T")
+
+BACKEND_KIND_CLOUD = "cloud"
+BACKEND_KIND_LOCAL = "local"
+EXPERT_TAG = "expert"
+LOCAL_MODEL_NAME = "local-model"
+
+@dataclass
+class LLMBackend:
+    """一个 OpenAI 兼容的对话补全后端。"""
+    name: str
+    api_url: str
+    model: str
+    api_key: str = ""
+    kind: str = BACKEND_KIND_CLOUD
+    tags: List[str] = field(default_factory=list)
+
+    def headers(self) -> Dict[str, str]:
+        if not self.api_key:
+            return {}
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+class BackendStats:
+    """单个后端的滚动统计：最近 window 次调用的成败，以及成功调用延迟的 EWMA。"""
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, window: int):
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.latency_ewma: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def record(self, ok: bool, latency: float):
+        with self.lock:
+            self.outcomes.append(ok)
+            if ok:
+                if self.latency_ewma is None:
+                    self.latency_ewma = latency
+                else:
+                    self.latency_ewma = self.EWMA_ALPHA * latency + (1 - self.EWMA_ALPHA) * self.latency_ewma
+
+    @property
+    def error_rate(self) -> float:
+        with self.lock:
+            if not self.outcomes:
+                return 0.0
+            return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    @property
+    def sample_count(self) -> int:
+        with self.lock:
+            return len(self.outcomes)
+
+def build_backends(llm_config: LLMConfig) -> List[LLMBackend]:
+    """
+    由配置构建后端列表，列表顺序即延迟相同时的优先级：
+    1. 开启 use_local_api 时的本地服务
+    2. 主配置 api_url (云端)
+    3. llm.backends 中的其他后端
+    """
+    backends: List[LLMBackend] = []
+    if llm_config.use_local_api:
+        backends.append(LLMBackend(
+            name="local",
+            api_url=llm_config.local_api_url,
+            model=LOCAL_MODEL_NAME,
+            kind=BACKEND_KIND_LOCAL
+        ))
+    backends.append(LLMBackend(
+        name="primary",
+        api_url=llm_config.api_url,
+        model=llm_config.model,
+        api_key=llm_config.api_key,
+        kind=BACKEND_KIND_CLOUD
+    ))
+    for backend in llm_config.backends:
+        if backend.enabled:
+            backends.append(LLMBackend(
+                name=backend.name,
+                api_url=backend.api_url,
+                model=backend.model,
+                api_key=backend.api_key,
+                kind=backend.kind,
+                tags=list(backend.tags)
+            ))
+    return backends
+
+class LLMRouter:
+    def __init__(self, backends: List[LLMBackend], breaker_lookup: Callable[[str], CircuitBreaker],
+                 window: int = 50, max_error_rate: float = 0.5, min_samples: int = 5,
+                 classifier: Optional[ErrorClassifier] = None):
+        if not backends:
+            raise ValueError("LLMRouter 至少需要一个后端")
+        self.backends = backends
+        self.breaker_lookup = breaker_lookup
+        self.classifier = classifier
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.stats: Dict[str, BackendStats] = {b.name: BackendStats(window) for b in backends}
+
+    def is_healthy(self, backend: LLMBackend) -> bool:
+        if not self.breaker_lookup(backend.api_url).is_available:
+            return False
+        stats = self.stats[backend.name]
+        if stats.sample_count < self.min_samples:
+            return True
+        return stats.error_rate <= self.max_error_rate
+
+    @staticmethod
+    def _tier(backend: LLMBackend, decision: Optional[SafetyDecision]) -> int:
+        """安全决策对应的优先层级，数值越小越优先。"""
+        if decision == SafetyDecision.REQUIRE_FALLBACK:
+            return 1 if backend.kind == BACKEND_KIND_LOCAL else 0
+        if decision == SafetyDecision.ROUTE_TO_SKILL:
+            if EXPERT_TAG in backend.tags:
+                return 0
+            return 2 if backend.kind == BACKEND_KIND_LOCAL else 1
+        return 0
+
+    def rank(self, decision: Optional[SafetyDecision] = None) -> List[LLMBackend]:
+        """
+        按 (是否健康, 安全层级, 延迟 EWMA, 配置顺序) 排序后端。
+        尚无延迟样本的后端视为 0，以便新后端能被尽快探测到。
+        不健康的后端排在最后，仅作为最终兜底。
+        """
+        def key(item: Tuple[int, LLMBackend]):
+            order, backend = item
+            latency = self.stats[backend.name].latency_ewma or 0.0
+            return (0 if self.is_healthy(backend) else 1, self._tier(backend, decision), latency, order)
+
+        return [backend for _, backend in sorted(enumerate(self.backends), key=key)]
+
+    def _is_client_error(self, exc: BaseException) -> bool:
+        """分类器判定为不可重试且状态码为 4xx 的异常 (请求本身有误)。"""
+        if self.classifier is None:
+            return False
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+        if status is None or not 400 <= status < 500:
+            return False
+        retryable, _ = self.classifier(exc)
+        return not retryable
+
+    def record(self, backend: LLMBackend, ok: bool, latency: float):
+        self.stats[backend.name].record(ok, latency)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """每个后端的健康与延迟状态（供日志和监控使用）。"""
+        return {
+            b.name: {
+                "healthy": self.is_healthy(b),
+                "latency_ewma": self.stats[b.name].latency_ewma,
+                "error_rate": self.stats[b.name].error_rate,
+            }
+            for b in self.backends
+        }
+
+    # ================== 执行与故障转移 ==================
+
+    def execute(self, fn: Callable[[LLMBackend, Optional[int]], T], decision: Optional[SafetyDecision] = None) -> T:
+        """
+        依次在排好序的后端上执行 fn(backend, max_attempts)，返回第一个成功的结果。
+        还有后备后端时 max_attempts=1 以便尽快故障转移；最后一个后端使用完整重试策略 (None)。
+        """
+        candidates = self.rank(decision)
+        last_error: Optional[BaseException] = None
+        for index, backend in enumerate(candidates):
+            max_attempts = None if index == len(candidates) - 1 else 1
+            start_time = time.time()
+            try:
+                result = fn(backend, max_attempts)
+            except CircuitOpenError as e:
+                last_error = e
+                continue
+            except Exception as e:
+                if self._is_client_error(e):
+                    logger.warning(f"[ROUTER] CLIENT_ERROR | backend: {backend.name} | error: {e}")
+                    raise
+                self.record(backend, False, time.time() - start_time)
+                last_error = e
+                logger.warning(f"[ROUTER] FAILOVER | backend: {backend.name} | error: {e}")
+                continue
+            self.record(backend, True, time.time() - start_time)
+            if index > 0:
+                logger.info(f"[ROUTER] SERVED_BY_FALLBACK | backend: {backend.name} | decision: {decision.name if decision else None}")
+            return result
+        raise last_error
+
+    async def execute_async(self, fn: Callable[[LLMBackend, Optional[int]], Awaitable[T]], decision: Optional[SafetyDecision] = None) -> T:
+        """execute() 的异步版本。"""
+        candidates = self.rank(decision)
+        last_error: Optional[BaseException] = None
+        for index, backend in enumerate(candidates):
+            max_attempts = None if index == len(candidates) - 1 else 1
+            start_time = time.time()
+            try:
+                result = await fn(backend, max_attempts)
+            except CircuitOpenError as e:
+                last_error = e
+                continue
+            except Exception as e:
+                if self._is_client_error(e):
+                    logger.warning(f"[ROUTER] CLIENT_ERROR | backend: {backend.name} | error: {e}")
+                    raise
+                self.record(backend, False, time.time() - start_time)
+                last_error = e
+                logger.warning(f"[ROUTER] FAILOVER | backend: {backend.name} | error: {e}")
+                continue
+            self.record(backend, True, time.time() - start_time)
+            if index > 0:
+                logger.info(f"[ROUTER] SERVED_BY_FALLBACK | backend: {backend.name} | decision: {decision.name if decision else None}")
+            return result
+        raise last_error
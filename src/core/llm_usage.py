@@ -0,0 +1,98 @@
+"""
+文件职责：LLM 用量与前缀缓存指标 (PromptCacheMetrics)
+记录每次调用响应中的 usage 字段，用于衡量固定 system 消息 (见 PromptBuilder.build_messages)
+带来的服务端前缀缓存命中：缓存 token 占比，以及命中 / 未命中时的延迟与首 token 时间 (TTFT)。
+
+各家返回缓存命中的字段不同，按以下顺序识别，并统计实际出现过哪些字段：
+    prompt_tokens_details.cached_tokens   OpenAI / vLLM / SGLang
+    prompt_cache_hit_tokens               DeepSeek
+    cache_read_input_tokens               Anthropic 兼容接口
+"""
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+CACHE_HIT_FIELDS = (
+    ("prompt_tokens_details", "cached_tokens"),
+    ("prompt_cache_hit_tokens",),
+    ("cache_read_input_tokens",),
+)
+CACHE_WRITE_FIELDS = (("cache_creation_input_tokens",),)
+
+def _lookup(usage: Dict[str, Any], path: Tuple[str, ...]) -> Optional[int]:
+    value: Any = usage
+    for key in path:
+        if not isinstance(value, dict) or value.get(key) is None:
+            return None
+        value = value[key]
+    return int(value)
+
+def _first(usage: Dict[str, Any], candidates) -> Tuple[Optional[str], int]:
+    """返回第一个存在的字段名及其值。"""
+    for path in candidates:
+        value = _lookup(usage, path)
+        if value is not None:
+            return ".".join(path), value
+    return None, 0
+
+def _percentiles(values, prefix: str, data: Dict[str, Any]):
+    ordered = sorted(values)
+    if ordered:
+        data[f"{prefix}_p50"] = ordered[int(0.50 * (len(ordered) - 1))]
+        data[f"{prefix}_p99"] = ordered[int(0.99 * (len(ordered) - 1))]
+
+class PromptCacheMetrics:
+    """线程安全的用量与缓存命中指标。"""
+    LATENCY_WINDOW = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "calls_with_usage": 0,
+            "cache_hit_calls": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "cache_write_tokens": 0,
+            "completion_tokens": 0,
+        }
+        self.fields: Dict[str, int] = {}     # 出现过的缓存字段 -> 次数
+        self.latencies: Dict[bool, Deque[float]] = {hit: deque(maxlen=self.LATENCY_WINDOW) for hit in (True, False)}
+        self.ttfts: Dict[bool, Deque[float]] = {hit: deque(maxlen=self.LATENCY_WINDOW) for hit in (True, False)}
+
+    def record(self, usage: Optional[Dict[str, Any]], latency: float, ttft: Optional[float] = None):
+        """
+        记录一次调用。usage 为响应中的 usage 对象 (流式调用为最后一个 chunk 中的 usage)，可为空。
+        latency 为整次调用耗时，ttft 为流式调用的首 token 时间。
+        """
+        hit_field, cached = _first(usage, CACHE_HIT_FIELDS) if usage else (None, 0)
+        _, written = _first(usage, CACHE_WRITE_FIELDS) if usage else (None, 0)
+        hit = cached > 0
+        with self.lock:
+            self.counters["calls"] += 1
+            if usage:
+                self.counters["calls_with_usage"] += 1
+                self.counters["prompt_tokens"] += int(usage.get("prompt_tokens") or usage.get("input_tokens") or 0)
+                self.counters["completion_tokens"] += int(usage.get("completion_tokens") or usage.get("output_tokens") or 0)
+                self.counters["cached_tokens"] += cached
+                self.counters["cache_write_tokens"] += written
+            if hit_field is not None:
+                self.fields[hit_field] = self.fields.get(hit_field, 0) + 1
+            if hit:
+                self.counters["cache_hit_calls"] += 1
+            self.latencies[hit].append(latency)
+            if ttft is not None:
+                self.ttfts[hit].append(ttft)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            data: Dict[str, Any] = dict(self.counters)
+            data["fields"] = dict(self.fields)
+            latencies = {hit: list(values) for hit, values in self.latencies.items()}
+            ttfts = {hit: list(values) for hit, values in self.ttfts.items()}
+        data["cached_token_ratio"] = data["cached_tokens"] / data["prompt_tokens"] if data["prompt_tokens"] else 0.0
+        for hit, name in ((True, "hit"), (False, "miss")):
+            _percentiles(latencies[hit], f"latency_{name}", data)
+            _percentiles(ttfts[hit], f"ttft_{name}", data)
+        return data
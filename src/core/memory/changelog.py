@@ -0,0 +1,130 @@
+"""
+文件职责：记忆变更日志 (ChangeLog)
+以追加写 (append-only) 的 JSONL 记录记忆库的每一次插入 / 更新 / 删除，替代每次写入后全量重写 CSV。
+每次写入的备份成本只与本次变更的行数成正比。
+
+记录格式 (每行一个 JSON)：
+    {"op": "insert", "row": {"id": 1, "event": ..., ...}}
+    {"op": "update", "id": 1, "set": {"importance": 76.4}}
+    {"op": "delete", "id": 1}
+
+日志增长到存活记录数的 COMPACT_RATIO 倍后做一次压缩：把当前快照写成纯 insert 记录，原子替换旧文件。
+replay() 重放日志得到数据快照，供恢复命令 (scripts/memory_store.py restore) 使用。
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List
+
+from src.core.logger import get_logger
+
+logger = get_logger("MemoryChangeLog")
+
+OP_INSERT = "insert"
+OP_UPDATE = "update"
+OP_DELETE = "delete"
+
+COMPACT_MIN_RECORDS = 1000   # 日志记录少于此数时不压缩
+COMPACT_RATIO = 3            # 记录数超过存活行数的倍数时压缩
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取日志记录。末尾因崩溃写了一半的行会被跳过。"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"[CHANGELOG] SKIP_CORRUPT_LINE | path: {path} | line: {line_no}")
+
+def replay(records: Iterable[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """按顺序重放变更记录，返回 {id: row}。"""
+    rows: Dict[int, Dict[str, Any]] = {}
+    for record in records:
+        op = record.get("op")
+        if op == OP_INSERT:
+            row = record["row"]
+            rows[row["id"]] = dict(row)
+        elif op == OP_UPDATE:
+            row = rows.get(record["id"])
+            if row is not None:
+                row.update(record["set"])
+        elif op == OP_DELETE:
+            rows.pop(record["id"], None)
+    return rows
+
+class MemoryChangeLog:
+    """
+    单个日志文件的追加写入器。通过 MemoryChangeLog.for_path() 获取，同一路径在进程内共享一个实例
+    (共享库模式下所有用户写同一个日志)。
+    """
+    _registry: Dict[str, "MemoryChangeLog"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.record_count = 0
+        self.live_count = 0
+        self._scan()
+
+    @classmethod
+    def for_path(cls, path: str) -> "MemoryChangeLog":
+        key = os.path.abspath(path)
+        with cls._registry_lock:
+            changelog = cls._registry.get(key)
+            if changelog is None:
+                changelog = cls(key)
+                cls._registry[key] = changelog
+            return changelog
+
+    def _scan(self):
+        """启动时扫描一次已有日志，得到记录数与存活行数，用于判断何时压缩。"""
+        records = list(read_records(self.path))
+        self.record_count = len(records)
+        self.live_count = len(replay(records))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def append(self, records: List[Dict[str, Any]]):
+        """追加一批变更记录 (一次 write + flush)。"""
+        if not records:
+            return
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+            self.record_count += len(records)
+            for record in records:
+                if record["op"] == OP_INSERT:
+                    self.live_count += 1
+                elif record["op"] == OP_DELETE:
+                    self.live_count -= 1
+
+    def needs_compaction(self) -> bool:
+        with self.lock:
+            return self.record_count > max(COMPACT_MIN_RECORDS, COMPACT_RATIO * self.live_count)
+
+    def compact(self, rows: List[Dict[str, Any]]):
+        """
+        用当前快照重写日志：先写临时文件再原子替换，过程中崩溃不会损坏旧日志。
+        调用方需保证快照期间没有新的写入 (在数据库写事务内调用)。
+        """
+        tmp_path = self.path + ".tmp"
+        with self.lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps({"op": OP_INSERT, "row": row}, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.record_count = len(rows)
+            self.live_count = len(rows)
+        logger.info(f"[CHANGELOG] COMPACT | path: {self.path} | rows: {len(rows)}")
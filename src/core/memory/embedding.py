@@ -0,0 +1,60 @@
+"""
+文件职责：记忆检索用的 CPU 文本向量 (Embedding)
+采用特征哈希 (hashing trick)，不依赖模型文件或 GPU：
+- 文本先做与去重相同的规范化 (去日期前缀、空白与标点，转小写，见 minhash.normalize_event)。
+- 记忆的向量由事件文本加关键词计算 (memory_text)。
+- 字符 unigram + bigram 经 crc32 映射到 EMBEDDING_DIM 维，另取一位哈希决定符号，减少碰撞带来的偏差。
+- 词频取 1 + log(tf) 做次线性缩放，最后 L2 归一化，内积即余弦相似度。
+
+哈希固定、跨进程稳定，向量可以持久化到数据库 (memory_vectors 表) 后直接复用。
+"""
+
+import math
+import zlib
+from collections import Counter
+from typing import Iterable
+
+import numpy as np
+
+from src.core.memory.minhash import normalize_event
+
+EMBEDDING_DIM = 512
+NGRAM_SIZES = (1, 2)
+DTYPE = np.float32
+
+def _features(text: str) -> Counter:
+    features: Counter = Counter()
+    for n in NGRAM_SIZES:
+        for i in range(len(text) - n + 1):
+            features[text[i:i + n]] += 1
+    return features
+
+def memory_text(event: str, keywords: str = "") -> str:
+    return f"{event} {keywords or ''}"
+
+def embed(text: str) -> np.ndarray:
+    """计算文本向量 (L2 归一化)。规范化后为空的文本返回全零向量。"""
+    vec = np.zeros(EMBEDDING_DIM, dtype=DTYPE)
+    for feature, tf in _features(normalize_event(text)).items():
+        h = zlib.crc32(feature.encode("utf-8"))
+        sign = 1.0 if (h >> 16) & 1 else -1.0
+        vec[h % EMBEDDING_DIM] += sign * (1.0 + math.log(tf))
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec
+
+def embed_batch(texts: Iterable[str]) -> np.ndarray:
+    vectors = [embed(text) for text in texts]
+    if not vectors:
+        return np.zeros((0, EMBEDDING_DIM), dtype=DTYPE)
+    return np.stack(vectors)
+
+def is_empty(vec: np.ndarray) -> bool:
+    return not vec.any()
+
+def to_blob(vec: np.ndarray) -> bytes:
+    return np.asarray(vec, dtype=DTYPE).tobytes()
+
+def from_blob(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=DTYPE)
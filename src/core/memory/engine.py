@@ -0,0 +1,192 @@
+"""
+文件职责：SQLite 连接引擎 (Engine)
+为每个数据库文件维护一组常驻连接，替代 "每次调用 connect/commit/close" 的模式。
+- 单写连接：所有写操作经由同一个连接、同一把写锁串行执行（单写者队列），避免 database is locked。
+- 读连接池：WAL 模式下读不阻塞写，少量只读连接可与写者并发。
+- 连接开启 WAL、synchronous=NORMAL 等 pragma，并放大 sqlite3 的语句缓存 (prepared statements)。
+- transaction() 将多次写合并到一个事务中，事务内同一线程的读走写连接，能看到未提交的修改。
+- after_commit() 注册提交后回调（如追加变更日志），事务回滚时丢弃。
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from src.core.logger import get_logger
+
+logger = get_logger("SQLiteEngine")
+
+READ_POOL_SIZE = 2
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",        # 约 8MB 页缓存
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+class SQLiteEngine:
+    """
+    单个数据库文件的连接引擎。通过 SQLiteEngine.for_path() 获取，同一路径在进程内共享一个实例。
+    """
+    _registry: Dict[str, "SQLiteEngine"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, db_path: str, read_pool_size: int = READ_POOL_SIZE):
+        self.db_path = db_path
+        self._write_lock = threading.RLock()
+        self._tx_owner: Optional[int] = None
+        self._after_commit: List[Callable[[], None]] = []
+        self._savepoint_seq = 0
+        self._writer = self._connect()
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(read_pool_size):
+            self._readers.put(self._connect())
+        self._closed = False
+
+    @classmethod
+    def for_path(cls, db_path: str) -> "SQLiteEngine":
+        """获取 (必要时创建) 指定数据库文件的共享引擎。"""
+        key = os.path.abspath(db_path)
+        with cls._registry_lock:
+            engine = cls._registry.get(key)
+            if engine is None or engine._closed:
+                engine = cls(key)
+                cls._registry[key] = engine
+            return engine
+
+    @classmethod
+    def close_all(cls):
+        """关闭进程内所有引擎（用于退出或测试清理）。"""
+        with cls._registry_lock:
+            engines = list(cls._registry.values())
+            cls._registry.clear()
+        for engine in engines:
+            engine.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: 自动提交，事务由 transaction() 显式控制
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            timeout=BUSY_TIMEOUT_MS / 1000
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _in_own_transaction(self) -> bool:
+        return self._tx_owner == threading.get_ident()
+
+    # ================== 写 ==================
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """
+        开启写事务 (BEGIN IMMEDIATE)，正常退出时提交，异常时回滚。
+        同一线程内可以嵌套调用，嵌套部分并入最外层事务。
+        """
+        with self._write_lock:
+            if self._in_own_transaction():
+                yield self._writer.cursor()
+                return
+
+            cursor = self._writer.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            self._tx_owner = threading.get_ident()
+            try:
+                yield cursor
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                self._after_commit.clear()
+                raise
+            finally:
+                self._tx_owner = None
+
+            # 仍持有写锁，回调顺序与提交顺序一致
+            callbacks, self._after_commit = self._after_commit, []
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"[ENGINE] AFTER_COMMIT_FAIL | db: {self.db_path} | error: {e}")
+
+    @contextmanager
+    def savepoint(self) -> Iterator[sqlite3.Cursor]:
+        """
+        事务内的保存点：块内抛出异常时只回滚块内的修改 (以及块内登记的提交后回调)，再重新抛出，
+        外层事务可以捕获后继续。不在事务中时等同于 transaction()。
+        """
+        with self._write_lock:
+            if not self._in_own_transaction():
+                with self.transaction() as cursor:
+                    yield cursor
+                return
+
+            self._savepoint_seq += 1
+            name = f"sp_{self._savepoint_seq}"
+            mark = len(self._after_commit)
+            cursor = self._writer.cursor()
+            cursor.execute(f"SAVEPOINT {name}")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute(f"ROLLBACK TO {name}")
+                cursor.execute(f"RELEASE {name}")
+                del self._after_commit[mark:]
+                raise
+            cursor.execute(f"RELEASE {name}")
+
+    def after_commit(self, callback: Callable[[], None]):
+        """在当前线程的事务提交后执行 callback；不在事务中时立即执行。"""
+        with self._write_lock:
+            if self._in_own_transaction():
+                self._after_commit.append(callback)
+                return
+        callback()
+
+    def execute(self, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+        """执行单条写语句（不在事务内时自身即一个事务）。"""
+        with self._write_lock:
+            return self._writer.execute(sql, params)
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence]):
+        """在一个事务内批量执行同一条写语句。"""
+        with self.transaction() as cursor:
+            cursor.executemany(sql, seq_of_params)
+
+    def executescript(self, script: str):
+        with self._write_lock:
+            self._writer.executescript(script)
+
+    # ================== 读 ==================
+
+    def query(self, sql: str, params: Sequence = ()) -> List[Tuple]:
+        """执行只读查询。持有事务的线程读写连接，其余线程从读连接池取连接。"""
+        if self._in_own_transaction():
+            return self._writer.execute(sql, params).fetchall()
+
+        conn = self._readers.get()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        with self._write_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._writer.close()
+            while not self._readers.empty():
+                self._readers.get_nowait().close()
+        logger.debug(f"[ENGINE] CLOSED | db: {self.db_path}")
@@ -0,0 +1,25 @@
+"""
+文件职责：记忆关键词规范化
+memories.keywords 以逗号分隔的字符串存储（LLM 输出可能混用中英文逗号、顿号）。
+倒排索引 (memory_keywords) 的写入与查询、以及 MemoryPolicy 的匹配规则都使用同一套规范化，保证结果一致。
+"""
+
+import re
+from typing import Iterable, List
+
+_SEPARATORS = re.compile(r"[,，、]")
+
+def normalize_keyword(keyword: str) -> str:
+    return keyword.strip().lower()
+
+def split_keywords(keywords: str) -> List[str]:
+    """把关键词字符串拆分为去重、规范化后的关键词列表（保持原顺序）。"""
+    return normalize_keywords(_SEPARATORS.split(keywords or ""))
+
+def normalize_keywords(keywords: Iterable[str]) -> List[str]:
+    result: List[str] = []
+    for keyword in keywords:
+        normalized = normalize_keyword(keyword)
+        if normalized and normalized not in result:
+            result.append(normalized)
+    return result
@@ -0,0 +1,75 @@
+"""
+文件职责：记忆去重用的 MinHash / LSH 签名
+纯 CPU 实现，不依赖向量模型：
+- 事件文本 (去掉 "YYYY-MM-DD " 日期前缀、空白与标点并转小写) 切成字符 n-gram。
+- 用 NUM_PERM 个固定种子的哈希函数求 MinHash 签名，两个签名相同位置相等的比例即 Jaccard 相似度估计。
+- 签名分成 LSH_BANDS 段，每段哈希成一个 band key；任意一段相同即成为候选，查找是索引命中而不是全表扫描。
+
+所有哈希基于 crc32 与固定参数，跨进程稳定，签名可以持久化到数据库。
+"""
+
+import random
+import re
+import struct
+import zlib
+from array import array
+from typing import List, Sequence
+
+NGRAM_SIZE = 2            # 字符 bigram，对中文短句效果较好
+NUM_PERM = 64
+LSH_BANDS = 16            # 16 段 × 4 行：相似度 0.6 时约 89% 概率成为候选，0.3 时约 12%
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SEED = 20240601
+
+_rng = random.Random(_SEED)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_DATE_PREFIX = re.compile(r"^\s*\d{4}-\d{1,2}-\d{1,2}\s*")
+_NOISE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+def normalize_event(event: str) -> str:
+    """去掉日期前缀、空白与标点，转小写。"""
+    text = _DATE_PREFIX.sub("", event or "")
+    return _NOISE.sub("", text).lower()
+
+def shingles(text: str, n: int = NGRAM_SIZE) -> List[str]:
+    if len(text) <= n:
+        return [text] if text else []
+    return list({text[i:i + n] for i in range(len(text) - n + 1)})
+
+def signature(event: str) -> List[int]:
+    """计算事件文本的 MinHash 签名。规范化后为空的文本返回空签名，不参与去重。"""
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles(normalize_event(event))]
+    if not hashes:
+        return []
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    """估计 Jaccard 相似度。"""
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+def band_keys(sig: Sequence[int]) -> List[int]:
+    """把签名切成 LSH_BANDS 段，每段得到一个 (段号 << 32 | crc32) 形式的整数 key。"""
+    if len(sig) != NUM_PERM:
+        return []
+    keys = []
+    for band in range(LSH_BANDS):
+        chunk = sig[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        keys.append((band << 32) | zlib.crc32(struct.pack(f"<{LSH_ROWS}I", *chunk)))
+    return keys
+
+def to_blob(sig: Sequence[int]) -> bytes:
+    return array("I", sig).tobytes()
+
+def from_blob(blob: bytes) -> List[int]:
+    sig = array("I")
+    sig.frombytes(blob)
+    return sig.tolist()
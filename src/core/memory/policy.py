@@ -8,14 +8,19 @@ MemoryPolicy = 业务规则 + 查询条件生成
 from datetime import datetime, timedelta
 from typing import List, Tuple, Any
 
+from src.core.memory.keywords import normalize_keywords, split_keywords
+
 class MemoryPolicy:
     # 核心配置常量
     MIN_RETRIEVAL_IMPORTANCE = 30    # 提取记忆的最低重要性阈值
     MIN_STORAGE_IMPORTANCE = 10      # 存储记忆的最低重要性阈值 (低于此值将被清理)
+    MIN_SEARCH_IMPORTANCE = 20       # 关键词搜索的最低重要性阈值
     DECAY_RATE_ACTIVE = 0.98         # 活跃记忆的衰减率 (7天内被提及)
     DECAY_RATE_INACTIVE = 0.95       # 非活跃记忆的衰减率
     PERMANENT_EXPIRY_DAYS = 365      # 永久记忆的 expiry_days 标记
     ACTIVE_WINDOW_DAYS = 7           # 判定为活跃的时间窗口
+    DUPLICATE_SIMILARITY = 0.6       # MinHash 估计相似度达到此值视为重复记忆
+    MIN_RECALL_SIMILARITY = 0.12     # 语义检索的最低余弦相似度 (低于此值视为与当前话题无关)
 
     @staticmethod
     def is_expired(create_time_str: str, expiry_days: int) -> bool:
@@ -46,14 +51,16 @@ class MemoryPolicy:
         return current_importance * MemoryPolicy.DECAY_RATE_INACTIVE
 
     @staticmethod
-    def is_duplicate(new_event: str, existing_event: str) -> bool:
+    def is_duplicate(new_event: str, existing_event: str, similarity: float = 0.0) -> bool:
         """
         判断是否为重复记忆。
-        目前使用简单的包含关系或关键词匹配，未来可升级为语义相似度。
+        similarity 为两条事件 MinHash 签名估计的 Jaccard 相似度 (字符 n-gram)，
+        达到 DUPLICATE_SIMILARITY 即视为近似重复；此外保留原有的子串包含规则。
         """
-        # 简单策略：如果事件描述高度重合 (这里简化为子串检查，实际可能需要更复杂的 NLP)
-        # 假设 event 格式为 "YYYY-MM-DD 具体事件"
-        # 提取具体事件部分
+        if similarity >= MemoryPolicy.DUPLICATE_SIMILARITY:
+            return True
+
+        # 假设 event 格式为 "YYYY-MM-DD 具体事件"，提取具体事件部分做包含检查
         try:
             new_content = new_event.split(' ', 1)[1]
             existing_content = existing_event.split(' ', 1)[1]
@@ -63,9 +70,9 @@ class MemoryPolicy:
 
     @staticmethod
     def match_keywords(memory_keywords_str: str, query_keywords: List[str]) -> bool:
-        """判断记忆关键词是否匹配查询关键词"""
-        mem_kws = [k.strip() for k in memory_keywords_str.split(',')]
-        return any(q_kw in mem_kws for q_kw in query_keywords)
+        """判断记忆关键词是否匹配查询关键词 (与倒排索引使用相同的规范化)"""
+        mem_kws = set(split_keywords(memory_keywords_str))
+        return any(q_kw in mem_kws for q_kw in normalize_keywords(query_keywords))
 
     @staticmethod
     def should_replace_duplicate(new_importance: int, old_importance: int) -> bool:
@@ -132,15 +139,48 @@ class MemoryPolicy:
         """
         return sql, (MemoryPolicy.MIN_RETRIEVAL_IMPORTANCE, MemoryPolicy.PERMANENT_EXPIRY_DAYS)
 
+    # ================== 集合式维护 SQL ==================
+    # 以下 SQL 与 calculate_decay / should_persist_decay / should_delete_memory 的规则一一对应，
+    # 让维护在数据库内一次完成，而不是把整表读进 Python 逐行判断。
+    # 时间统一按 SQLite 的 datetime('now') (UTC) 比较，与 CURRENT_TIMESTAMP 写入的时间一致。
+
+    @staticmethod
+    def _active_sql() -> Tuple[str, tuple]:
+        """'最近 ACTIVE_WINDOW_DAYS 天内被提及' 的 SQL 条件（NULL 或无法解析视为不活跃）。"""
+        sql = "COALESCE(datetime(last_mentioned) >= datetime('now', ?), 0)"
+        return sql, (f"-{MemoryPolicy.ACTIVE_WINDOW_DAYS} days",)
+
+    @staticmethod
+    def get_decay_sql() -> Tuple[str, tuple, str, tuple]:
+        """
+        返回 (新重要性表达式, 表达式参数, WHERE 子句, WHERE 参数)，对应 calculate_decay + should_persist_decay：
+        活跃记忆 ×DECAY_RATE_ACTIVE，否则 ×DECAY_RATE_INACTIVE，仅当变化 > 0.1 时写回。
+        两组参数分开返回，仓储层在 WHERE 前追加用户条件时不会错位。
+        """
+        active_sql, active_params = MemoryPolicy._active_sql()
+        rate_sql = f"(CASE WHEN {active_sql} THEN ? ELSE ? END)"
+        rate_params = active_params + (MemoryPolicy.DECAY_RATE_ACTIVE, MemoryPolicy.DECAY_RATE_INACTIVE)
+
+        value_sql = f"importance * {rate_sql}"
+        where_sql = f"ABS(importance * {rate_sql} - importance) > ?"
+        return value_sql, rate_params, where_sql, rate_params + (0.1,)
+
     @staticmethod
-    def get_duplicate_candidates_sql(event: str) -> Tuple[str, tuple]:
+    def get_cleanup_sql() -> Tuple[str, tuple]:
         """
-        返回用于查找潜在重复记忆的 SQL WHERE 子句和参数。
-        策略：提取事件内容（去除时间前缀），进行模糊匹配。
+        返回需要物理删除的记忆的 SQL WHERE 子句和参数，对应 should_delete_memory：
+        重要性低于阈值，或 (已过期 AND 最近未活跃)。
         """
-        # 提取事件内容部分用于模糊匹配
-        event_content = event.split(' ', 1)[1] if ' ' in event else event
-        return "event LIKE ?", (f"%{event_content}%",)
+        active_sql, active_params = MemoryPolicy._active_sql()
+        sql = f"""
+            importance < ?
+            OR (
+                expiry_days != ?
+                AND datetime(create_time, '+' || expiry_days || ' days') < datetime('now')
+                AND NOT {active_sql}
+            )
+        """
+        return sql, (MemoryPolicy.MIN_STORAGE_IMPORTANCE, MemoryPolicy.PERMANENT_EXPIRY_DAYS) + active_params
 
     @staticmethod
     def get_search_candidates_sql() -> Tuple[str, tuple]:
@@ -149,3 +189,8 @@ class MemoryPolicy:
         策略：仅搜索重要性较高的记忆。
         """
         return "importance >= ?", (MemoryPolicy.MIN_SEARCH_IMPORTANCE,)
+
+    @staticmethod
+    def get_search_order_sql() -> str:
+        """搜索结果排序：重要性优先，其次最近提及 (从未提及时按创建时间)。"""
+        return "importance DESC, COALESCE(last_mentioned, create_time) DESC, id DESC"
@@ -1,48 +1,291 @@
 """
 文件职责：记忆仓储层 (Repository)
-负责底层数据存储与检索，直接操作 SQLite 数据库和 CSV 备份。
+负责底层数据存储与检索，直接操作 SQLite 数据库和增量备份 (变更日志)。
+数据库连接由 SQLiteEngine 常驻复用 (每个数据库文件一个写连接 + 少量读连接)，不再每次调用都重新打开。
 不包含任何业务规则（如过期、重要性筛选），只提供纯粹的 CRUD 接口。
+
+两种存储模式 (memory.storage_mode)：
+- per_user: 每个用户一个 user_{id}.db + 变更日志 user_{id}_changes.jsonl (MemoryRepository)
+- consolidated: 所有用户共用一个 memories.db + memories_changes.jsonl，按 user_id 索引 (ConsolidatedMemoryRepository)，
+  跨用户的维护与导出由 ConsolidatedMemoryStore 一次顺序扫描完成。
+
+每次写操作在同一事务内用 RETURNING 取回受影响的行，提交后追加到变更日志 (见 changelog.py)，
+备份成本与变更行数成正比，而不是每次全量重写。
 """
 
-import sqlite3
 import csv
 import os
+import sqlite3
 import threading
-from typing import List, Tuple, Optional, Any
+from contextlib import contextmanager
+from typing import List, Tuple, Optional, Any, Iterator, Dict, Callable
 from src.core.logger import get_logger
+from src.core.memory.changelog import MemoryChangeLog, OP_DELETE, OP_INSERT, OP_UPDATE, read_records, replay
+from src.core.memory.engine import SQLiteEngine
+from src.core.memory.keywords import split_keywords
+from src.core.memory import embedding, minhash
 
 logger = get_logger("MemoryRepository")
 
+STORAGE_PER_USER = "per_user"
+STORAGE_CONSOLIDATED = "consolidated"
+CONSOLIDATED_DB_NAME = "memories.db"
+CONSOLIDATED_CSV_NAME = "memories_backup.csv"
+CONSOLIDATED_CHANGELOG_NAME = "memories_changes.jsonl"
+
+# 对外返回的记忆行结构，两种存储模式保持一致
+MEMORY_COLUMNS = "id, event, keywords, importance, create_time, expiry_days, last_mentioned"
+CSV_HEADER = ['id', 'event', 'keywords', 'importance', 'create_time', 'expiry_days', 'last_mentioned']
+CONSOLIDATED_COLUMNS = MEMORY_COLUMNS + ", user_id"
+
+MEMORIES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS memories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event TEXT NOT NULL,
+        keywords TEXT NOT NULL,
+        importance INTEGER NOT NULL,
+        create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expiry_days INTEGER NOT NULL,
+        last_mentioned TIMESTAMP
+    );
+    -- 关键词倒排索引：由仓储层在插入时写入，删除记忆时由触发器同步清理
+    CREATE TABLE IF NOT EXISTS memory_keywords (
+        keyword TEXT NOT NULL,
+        memory_id INTEGER NOT NULL,
+        PRIMARY KEY (keyword, memory_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_memory_keywords_memory ON memory_keywords (memory_id);
+    CREATE TRIGGER IF NOT EXISTS trg_memories_delete_keywords AFTER DELETE ON memories
+    BEGIN
+        DELETE FROM memory_keywords WHERE memory_id = old.id;
+    END;
+    -- 去重用的 MinHash 签名与 LSH 分段索引 (见 minhash.py)，同样由触发器随记忆删除
+    CREATE TABLE IF NOT EXISTS memory_minhash (
+        memory_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS memory_lsh (
+        band_key INTEGER NOT NULL,
+        memory_id INTEGER NOT NULL,
+        PRIMARY KEY (band_key, memory_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_memory_lsh_memory ON memory_lsh (memory_id);
+    CREATE TRIGGER IF NOT EXISTS trg_memories_delete_minhash AFTER DELETE ON memories
+    BEGIN
+        DELETE FROM memory_minhash WHERE memory_id = old.id;
+        DELETE FROM memory_lsh WHERE memory_id = old.id;
+    END;
+    -- 语义检索用的文本向量 (见 embedding.py)，内存中的 VectorIndex 由此表载入
+    CREATE TABLE IF NOT EXISTS memory_vectors (
+        memory_id INTEGER PRIMARY KEY,
+        vector BLOB NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_memories_delete_vector AFTER DELETE ON memories
+    BEGIN
+        DELETE FROM memory_vectors WHERE memory_id = old.id;
+    END;
+'''
+
+CONSOLIDATED_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS memories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event TEXT NOT NULL,
+        keywords TEXT NOT NULL,
+        importance INTEGER NOT NULL,
+        create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expiry_days INTEGER NOT NULL,
+        last_mentioned TIMESTAMP,
+        user_id INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_memories_user ON memories (user_id, importance);
+    CREATE TABLE IF NOT EXISTS memory_keywords (
+        user_id INTEGER NOT NULL,
+        keyword TEXT NOT NULL,
+        memory_id INTEGER NOT NULL,
+        PRIMARY KEY (user_id, keyword, memory_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_memory_keywords_memory ON memory_keywords (memory_id);
+    CREATE TRIGGER IF NOT EXISTS trg_memories_delete_keywords AFTER DELETE ON memories
+    BEGIN
+        DELETE FROM memory_keywords WHERE memory_id = old.id;
+    END;
+    CREATE TABLE IF NOT EXISTS memory_minhash (
+        memory_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS memory_lsh (
+        user_id INTEGER NOT NULL,
+        band_key INTEGER NOT NULL,
+        memory_id INTEGER NOT NULL,
+        PRIMARY KEY (user_id, band_key, memory_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_memory_lsh_memory ON memory_lsh (memory_id);
+    CREATE TRIGGER IF NOT EXISTS trg_memories_delete_minhash AFTER DELETE ON memories
+    BEGIN
+        DELETE FROM memory_minhash WHERE memory_id = old.id;
+        DELETE FROM memory_lsh WHERE memory_id = old.id;
+    END;
+    CREATE TABLE IF NOT EXISTS memory_vectors (
+        memory_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        vector BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_memory_vectors_user ON memory_vectors (user_id);
+    CREATE TRIGGER IF NOT EXISTS trg_memories_delete_vector AFTER DELETE ON memories
+    BEGIN
+        DELETE FROM memory_vectors WHERE memory_id = old.id;
+    END;
+'''
+
+# PRAGMA user_version：派生数据 (关键词索引、MinHash/LSH 索引、文本向量) 的版本。低于此版本的库在打开时重建索引，
+# 覆盖升级前的旧库以及 restore 直接写出的库。
+SCHEMA_VERSION = 3
+
+RecordBuilder = Callable[[List[Tuple]], List[Dict[str, Any]]]
+
+def _column_names(columns: str) -> List[str]:
+    return [c.strip() for c in columns.split(',')]
+
+def insert_records(columns: str) -> RecordBuilder:
+    names = _column_names(columns)
+    return lambda rows: [{"op": OP_INSERT, "row": dict(zip(names, row))} for row in rows]
+
+def update_records(column: str) -> RecordBuilder:
+    return lambda rows: [{"op": OP_UPDATE, "id": memory_id, "set": {column: value}} for memory_id, value in rows]
+
+def delete_records(rows: List[Tuple]) -> List[Dict[str, Any]]:
+    return [{"op": OP_DELETE, "id": row[0]} for row in rows]
+
+def write_logged(engine: SQLiteEngine, changelog: MemoryChangeLog, sql: str, params: tuple,
+                 to_records: RecordBuilder) -> List[Tuple]:
+    """
+    执行一条带 RETURNING 的写语句，并把受影响的行转换为变更记录，在事务提交后追加到日志。
+    语句与日志登记在同一事务 (同一把写锁) 内完成，日志顺序与提交顺序一致。
+    """
+    with engine.transaction() as cursor:
+        rows = cursor.execute(sql, params).fetchall()
+        records = to_records(rows)
+        if records:
+            engine.after_commit(lambda: changelog.append(records))
+    return rows
+
+def index_keywords(engine: SQLiteEngine, memory_id: int, keywords: str, user_id: Optional[int] = None):
+    """把一条记忆的关键词写入倒排索引。user_id 仅共享库需要。"""
+    terms = split_keywords(keywords)
+    if not terms:
+        return
+    with engine.transaction() as cursor:
+        if user_id is None:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO memory_keywords (keyword, memory_id) VALUES (?, ?)",
+                [(term, memory_id) for term in terms]
+            )
+        else:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO memory_keywords (user_id, keyword, memory_id) VALUES (?, ?, ?)",
+                [(user_id, term, memory_id) for term in terms]
+            )
+
+def index_signature(engine: SQLiteEngine, memory_id: int, event: str, user_id: Optional[int] = None):
+    """计算事件的 MinHash 签名并写入签名表与 LSH 分段索引。"""
+    sig = minhash.signature(event)
+    if not sig:
+        return
+    keys = minhash.band_keys(sig)
+    with engine.transaction() as cursor:
+        cursor.execute(
+            "INSERT OR REPLACE INTO memory_minhash (memory_id, signature) VALUES (?, ?)",
+            (memory_id, minhash.to_blob(sig))
+        )
+        if user_id is None:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO memory_lsh (band_key, memory_id) VALUES (?, ?)",
+                [(key, memory_id) for key in keys]
+            )
+        else:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO memory_lsh (user_id, band_key, memory_id) VALUES (?, ?, ?)",
+                [(user_id, key, memory_id) for key in keys]
+            )
+
+def index_vector(engine: SQLiteEngine, memory_id: int, event: str, keywords: str, user_id: Optional[int] = None):
+    """计算记忆 (事件 + 关键词) 的文本向量并写入 memory_vectors。"""
+    vec = embedding.embed(embedding.memory_text(event, keywords))
+    if embedding.is_empty(vec):
+        return
+    with engine.transaction() as cursor:
+        if user_id is None:
+            cursor.execute(
+                "INSERT OR REPLACE INTO memory_vectors (memory_id, vector) VALUES (?, ?)",
+                (memory_id, embedding.to_blob(vec))
+            )
+        else:
+            cursor.execute(
+                "INSERT OR REPLACE INTO memory_vectors (memory_id, user_id, vector) VALUES (?, ?, ?)",
+                (memory_id, user_id, embedding.to_blob(vec))
+            )
+
+def index_memory(engine: SQLiteEngine, memory_id: int, event: str, keywords: str, user_id: Optional[int] = None):
+    """写入一条记忆的全部派生索引 (关键词、MinHash/LSH、文本向量)，需在插入记忆的同一事务中调用。"""
+    index_keywords(engine, memory_id, keywords, user_id)
+    index_signature(engine, memory_id, event, user_id)
+    index_vector(engine, memory_id, event, keywords, user_id)
+
+def ensure_derived_indexes(engine: SQLiteEngine, consolidated: bool = False):
+    """派生索引版本落后时从 memories 全量重建。"""
+    if engine.query("PRAGMA user_version")[0][0] >= SCHEMA_VERSION:
+        return
+    columns = "id, event, keywords, user_id" if consolidated else "id, event, keywords, NULL"
+    with engine.transaction() as cursor:
+        for table in ("memory_keywords", "memory_minhash", "memory_lsh", "memory_vectors"):
+            cursor.execute(f"DELETE FROM {table}")
+        rows = engine.query(f"SELECT {columns} FROM memories")
+        for memory_id, event, keywords, user_id in rows:
+            index_memory(engine, memory_id, event, keywords, user_id)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    logger.info(f"[REPO] DERIVED_INDEXES_REBUILT | db: {engine.db_path} | memories: {len(rows)}")
+
 class MemoryRepository:
     def __init__(self, user_id: int, data_dir: str):
         self.user_id = user_id
         self.db_path = os.path.join(data_dir, f"user_{user_id}.db")
-        self.csv_path = os.path.join(data_dir, f"user_{user_id}_backup.csv")
-        self.lock = threading.Lock()
+        self.engine = SQLiteEngine.for_path(self.db_path)
+        self.changelog = MemoryChangeLog.for_path(os.path.join(data_dir, f"user_{user_id}_changes.jsonl"))
         self._init_database()
+        if not self.changelog.exists():
+            # 首次启用变更日志 (或日志丢失)：先写一份完整快照作为基线
+            self.compact_backup()
 
     def _init_database(self):
         """初始化数据库表结构"""
-        with self.lock:
-            try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS memories (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        event TEXT NOT NULL,
-                        keywords TEXT NOT NULL,
-                        importance INTEGER NOT NULL,
-                        create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        expiry_days INTEGER NOT NULL,
-                        last_mentioned TIMESTAMP
-                    )
-                ''')
-                conn.commit()
-                conn.close()
-            except Exception as e:
-                logger.error(f"[REPO] INIT_FAIL | user_id: {self.user_id} | error: {e}")
-                raise
+        try:
+            self.engine.executescript(MEMORIES_SCHEMA)
+            ensure_derived_indexes(self.engine)
+        except Exception as e:
+            logger.error(f"[REPO] INIT_FAIL | user_id: {self.user_id} | error: {e}")
+            raise
+
+    def _scoped(self, where_clause: str, params: tuple = ()) -> Tuple[str, tuple]:
+        """把 WHERE 条件限定在当前用户的数据范围内。单用户库中整张表都属于该用户。"""
+        return where_clause, tuple(params)
+
+    def _write(self, sql: str, params: tuple, to_records: RecordBuilder) -> List[Tuple]:
+        return write_logged(self.engine, self.changelog, sql, params, to_records)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        将块内的多次读写合并为一个事务。
+        块内的查询能看到本事务尚未提交的修改。
+        """
+        with self.engine.transaction():
+            yield
+
+    @contextmanager
+    def savepoint(self) -> Iterator[None]:
+        """事务内的保存点：块内异常只回滚块内的读写 (含变更日志登记)，外层事务继续。"""
+        with self.engine.savepoint():
+            yield
 
     def add_memory(self, event: str, keywords: str, importance: int, expiry_days: int) -> int:
         """
@@ -50,92 +293,324 @@ class MemoryRepository:
         Returns:
             int: 新插入记录的 ID
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
+        with self.transaction():
+            rows = self._write(f'''
                 INSERT INTO memories (event, keywords, importance, expiry_days)
                 VALUES (?, ?, ?, ?)
-            ''', (event, keywords, importance, expiry_days))
-            memory_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return memory_id
+                RETURNING {MEMORY_COLUMNS}
+            ''', (event, keywords, importance, expiry_days), insert_records(MEMORY_COLUMNS))
+            memory_id = rows[0][0]
+            index_memory(self.engine, memory_id, event, keywords)
+        return memory_id
 
     def get_all_memories(self) -> List[Tuple]:
         """获取所有记忆（未过滤）"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM memories")
-            rows = cursor.fetchall()
-            conn.close()
-            return rows
+        return self.get_memories_by_sql("1 = 1")
 
     def get_memories_by_sql(self, where_clause: str, params: tuple = ()) -> List[Tuple]:
         """
         通过自定义 SQL 条件查询记忆。
         注意：仅供 Policy 层构建复杂查询使用。
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            query = f"SELECT * FROM memories WHERE {where_clause}"
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            conn.close()
-            return rows
+        where_clause, params = self._scoped(where_clause, params)
+        return self.engine.query(f"SELECT {MEMORY_COLUMNS} FROM memories WHERE {where_clause}", params)
+
+    def search_by_keywords(self, keywords: List[str], where_clause: str, params: tuple,
+                           order_by: str, limit: int) -> List[Tuple]:
+        """
+        通过关键词倒排索引查找记忆：命中任一关键词，并满足 where_clause，按 order_by 排序取前 limit 条。
+        keywords 需已规范化 (见 keywords.normalize_keywords)。
+        """
+        if not keywords:
+            return []
+        placeholders = ','.join('?' for _ in keywords)
+        index_where, index_params = self._scoped(f"keyword IN ({placeholders})", tuple(keywords))
+        where_clause, params = self._scoped(where_clause, params)
+        return self.engine.query(f'''
+            SELECT {MEMORY_COLUMNS} FROM memories
+            WHERE id IN (SELECT memory_id FROM memory_keywords WHERE {index_where})
+              AND {where_clause}
+            ORDER BY {order_by}
+            LIMIT ?
+        ''', index_params + params + (limit,))
+
+    def get_similar_candidates(self, band_keys: List[int]) -> List[Tuple]:
+        """
+        通过 LSH 分段索引取出近似重复的候选记忆 (任一 band key 相同)。
+        返回的每行在 MEMORY_COLUMNS 之后附带 MinHash 签名 (BLOB)，供调用方精确比较。
+        """
+        if not band_keys:
+            return []
+        placeholders = ','.join('?' for _ in band_keys)
+        lsh_where, lsh_params = self._scoped(f"band_key IN ({placeholders})", tuple(band_keys))
+        return self.engine.query(f'''
+            SELECT {', '.join('m.' + c for c in _column_names(MEMORY_COLUMNS))}, h.signature
+            FROM memories m JOIN memory_minhash h ON h.memory_id = m.id
+            WHERE m.id IN (SELECT memory_id FROM memory_lsh WHERE {lsh_where})
+        ''', lsh_params)
+
+    def get_vectors(self) -> List[Tuple[int, bytes]]:
+        """取出当前用户全部记忆的文本向量 [(memory_id, BLOB), ...]，用于重建内存向量索引。"""
+        where_clause, params = self._scoped("1 = 1")
+        return self.engine.query(f"SELECT memory_id, vector FROM memory_vectors WHERE {where_clause}", params)
+
+    def get_memories_by_ids(self, memory_ids: List[int], where_clause: str, params: tuple = ()) -> List[Tuple]:
+        """
+        按 ID 取出记忆。返回的每行在 MEMORY_COLUMNS 之后附带一列 0/1，表示该行是否满足 where_clause；
+        调用方据此区分 "已删除" (不在结果中) 与 "存在但不符合条件"。
+        """
+        if not memory_ids:
+            return []
+        placeholders = ','.join('?' for _ in memory_ids)
+        id_where, id_params = self._scoped(f"id IN ({placeholders})", tuple(memory_ids))
+        return self.engine.query(
+            f"SELECT {MEMORY_COLUMNS}, ({where_clause}) FROM memories WHERE {id_where}",
+            tuple(params) + id_params
+        )
 
     def update_memory_importance(self, memory_id: int, new_importance: float):
         """更新记忆重要性"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE memories SET importance = ? WHERE id = ?", (new_importance, memory_id))
-            conn.commit()
-            conn.close()
+        where_clause, params = self._scoped("id = ?", (memory_id,))
+        self._write(
+            f"UPDATE memories SET importance = ? WHERE {where_clause} RETURNING id, importance",
+            (new_importance,) + params, update_records("importance")
+        )
+
+    def update_importance_batch(self, updates: List[Tuple[int, float]]):
+        """
+        批量更新记忆重要性，一个事务完成。
+        updates: [(memory_id, new_importance), ...]
+        """
+        if not updates:
+            return
+        with self.transaction():
+            for memory_id, importance in updates:
+                self.update_memory_importance(memory_id, importance)
+
+    def update_importance_by_sql(self, value_sql: str, value_params: tuple, where_clause: str, where_params: tuple = ()) -> int:
+        """
+        按 Policy 生成的表达式集合式更新重要性。
+        value_params / where_params 分别对应 value_sql 与 where_clause 中的占位符；
+        用户范围条件只追加在 WHERE 中，参数按 value_params + 范围参数 + where_params 绑定。
+        Returns:
+            int: 受影响的行数
+        """
+        where_clause, where_params = self._scoped(where_clause, where_params)
+        rows = self._write(
+            f"UPDATE memories SET importance = {value_sql} WHERE {where_clause} RETURNING id, importance",
+            tuple(value_params) + where_params, update_records("importance")
+        )
+        return len(rows)
 
     def update_last_mentioned(self, memory_id: int):
         """更新记忆最后提及时间为当前时间"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE memories SET last_mentioned = CURRENT_TIMESTAMP WHERE id = ?",
-                (memory_id,)
-            )
-            conn.commit()
-            conn.close()
+        where_clause, params = self._scoped("id = ?", (memory_id,))
+        self._write(
+            f"UPDATE memories SET last_mentioned = CURRENT_TIMESTAMP WHERE {where_clause} RETURNING id, last_mentioned",
+            params, update_records("last_mentioned")
+        )
 
     def delete_memory(self, memory_id: int):
         """删除指定 ID 的记忆"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM memories WHERE id = ?", (memory_id,))
-            conn.commit()
-            conn.close()
+        self.delete_memories_by_sql("id = ?", (memory_id,))
 
     def delete_memories_batch(self, memory_ids: List[int]):
         """批量删除记忆"""
         if not memory_ids:
             return
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            placeholders = ','.join('?' for _ in memory_ids)
-            cursor.execute(f"DELETE FROM memories WHERE id IN ({placeholders})", memory_ids)
-            conn.commit()
-            conn.close()
-
-    def backup_to_csv(self):
-        """将当前数据库全量备份到 CSV"""
+        placeholders = ','.join('?' for _ in memory_ids)
+        self.delete_memories_by_sql(f"id IN ({placeholders})", tuple(memory_ids))
+
+    def delete_memories_by_sql(self, where_clause: str, params: tuple = ()) -> int:
+        """
+        按 Policy 生成的条件批量删除记忆。
+        Returns:
+            int: 删除的行数
+        """
+        where_clause, params = self._scoped(where_clause, params)
+        rows = self._write(f"DELETE FROM memories WHERE {where_clause} RETURNING id", params, delete_records)
+        return len(rows)
+
+    # ================== 增量备份 ==================
+
+    def _snapshot_rows(self) -> List[Dict[str, Any]]:
+        """日志压缩用的完整快照 (日志覆盖的整个数据库)。"""
+        names = _column_names(MEMORY_COLUMNS)
+        return [dict(zip(names, row)) for row in self.engine.query(f"SELECT {MEMORY_COLUMNS} FROM memories")]
+
+    def compact_backup(self):
+        """用当前快照重写变更日志。在写事务内完成，快照与日志之间不会插入其他写入。"""
+        try:
+            with self.engine.transaction():
+                self.changelog.compact(self._snapshot_rows())
+        except Exception as e:
+            logger.error(f"[REPO] BACKUP_COMPACT_FAIL | db: {self.db_path} | error: {e}")
+
+    def compact_backup_if_needed(self):
+        """变更日志相对存活数据过长时压缩。"""
+        if self.changelog.needs_compaction():
+            self.compact_backup()
+
+
+class ConsolidatedMemoryStore:
+    """
+    所有用户共用的记忆库 (memories.db)。
+    负责建表与跨用户操作：导入、全库维护、全库导出。单用户视图见 ConsolidatedMemoryRepository。
+    通过 ConsolidatedMemoryStore.for_dir() 获取，同一目录在进程内共享一个实例 (建表与索引检查只做一次)。
+    """
+    _registry: Dict[str, "ConsolidatedMemoryStore"] = {}
+    _registry_lock = threading.Lock()
+
+    @classmethod
+    def for_dir(cls, data_dir: str) -> "ConsolidatedMemoryStore":
+        key = os.path.abspath(data_dir)
+        with cls._registry_lock:
+            store = cls._registry.get(key)
+            if store is None:
+                store = cls(key)
+                cls._registry[key] = store
+            return store
+
+    def __init__(self, data_dir: str):
+        self.db_path = os.path.join(data_dir, CONSOLIDATED_DB_NAME)
+        self.csv_path = os.path.join(data_dir, CONSOLIDATED_CSV_NAME)
+        self.lock = threading.Lock()
+        self.engine = SQLiteEngine.for_path(self.db_path)
+        self.changelog = MemoryChangeLog.for_path(os.path.join(data_dir, CONSOLIDATED_CHANGELOG_NAME))
+        self._init_database()
+        if not self.changelog.exists():
+            self.compact_backup()
+
+    def _init_database(self):
         try:
-            rows = self.get_all_memories()
-            with self.lock:
-                with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['id', 'event', 'keywords', 'importance', 'create_time', 'expiry_days', 'last_mentioned'])
-                    writer.writerows(rows)
+            self.engine.executescript(CONSOLIDATED_SCHEMA)
+            ensure_derived_indexes(self.engine, consolidated=True)
         except Exception as e:
-            logger.error(f"[REPO] CSV_BACKUP_FAIL | user_id: {self.user_id} | error: {e}")
+            logger.error(f"[REPO] INIT_FAIL | db: {self.db_path} | error: {e}")
+            raise
+
+    def user_ids(self) -> List[int]:
+        return [row[0] for row in self.engine.query("SELECT DISTINCT user_id FROM memories")]
+
+    def has_user(self, user_id: int) -> bool:
+        return bool(self.engine.query("SELECT 1 FROM memories WHERE user_id = ? LIMIT 1", (user_id,)))
+
+    def import_rows(self, user_id: int, rows: List[Tuple], replace: bool = False) -> int:
+        """
+        导入某个用户的记忆行 (结构同 MEMORY_COLUMNS，原 id 不保留)，一个事务完成。
+        replace=True 时先清空该用户已有的记忆。
+        """
+        with self.engine.transaction():
+            if replace:
+                write_logged(self.engine, self.changelog, "DELETE FROM memories WHERE user_id = ? RETURNING id",
+                             (user_id,), delete_records)
+            for _, event, keywords, importance, create_time, expiry_days, last_mentioned in rows:
+                inserted = write_logged(self.engine, self.changelog, f'''
+                    INSERT INTO memories (event, keywords, importance, create_time, expiry_days, last_mentioned, user_id)
+                    VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?)
+                    RETURNING {CONSOLIDATED_COLUMNS}
+                ''', (event, keywords, importance, create_time, expiry_days, last_mentioned, user_id),
+                    insert_records(CONSOLIDATED_COLUMNS))
+                index_memory(self.engine, inserted[0][0], event, keywords, user_id)
+        return len(rows)
+
+    def run_maintenance(self, value_sql: str, value_params: tuple, decay_where: str, decay_params: tuple,
+                        cleanup_where: str, cleanup_params: tuple) -> Tuple[int, int]:
+        """对所有用户执行一次衰减 + 清理 (SQL 由 MemoryPolicy 生成)，返回 (衰减行数, 删除行数)。"""
+        with self.engine.transaction():
+            decayed = write_logged(
+                self.engine, self.changelog,
+                f"UPDATE memories SET importance = {value_sql} WHERE {decay_where} RETURNING id, importance",
+                tuple(value_params) + tuple(decay_params), update_records("importance")
+            )
+            deleted = write_logged(
+                self.engine, self.changelog,
+                f"DELETE FROM memories WHERE {cleanup_where} RETURNING id", cleanup_params, delete_records
+            )
+        return len(decayed), len(deleted)
+
+    def snapshot_rows(self) -> List[Dict[str, Any]]:
+        names = _column_names(CONSOLIDATED_COLUMNS)
+        return [dict(zip(names, row)) for row in self.engine.query(f"SELECT {CONSOLIDATED_COLUMNS} FROM memories")]
+
+    def compact_backup(self):
+        """用全库快照重写变更日志。"""
+        try:
+            with self.engine.transaction():
+                self.changelog.compact(self.snapshot_rows())
+        except Exception as e:
+            logger.error(f"[REPO] BACKUP_COMPACT_FAIL | db: {self.db_path} | error: {e}")
+
+    def export_csv(self) -> int:
+        """顺序扫描全库，导出到单个 CSV (额外带 user_id 列)，返回行数。"""
+        rows = self.engine.query(f"SELECT user_id, {MEMORY_COLUMNS} FROM memories ORDER BY user_id, id")
+        with self.lock:
+            with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['user_id'] + CSV_HEADER)
+                writer.writerows(rows)
+        return len(rows)
+
+
+class ConsolidatedMemoryRepository(MemoryRepository):
+    """
+    共享库中单个用户的视图，API 与 MemoryRepository 完全一致。
+    所有读写都附加 user_id 条件；变更日志由所有用户共享。
+    """
+    def __init__(self, user_id: int, data_dir: str):
+        self.user_id = user_id
+        self.store = ConsolidatedMemoryStore.for_dir(data_dir)
+        self.db_path = self.store.db_path
+        self.engine = self.store.engine
+        self.changelog = self.store.changelog
+
+    def _scoped(self, where_clause: str, params: tuple = ()) -> Tuple[str, tuple]:
+        return f"user_id = ? AND ({where_clause})", (self.user_id,) + tuple(params)
+
+    def add_memory(self, event: str, keywords: str, importance: int, expiry_days: int) -> int:
+        with self.transaction():
+            rows = self._write(f'''
+                INSERT INTO memories (event, keywords, importance, expiry_days, user_id)
+                VALUES (?, ?, ?, ?, ?)
+                RETURNING {CONSOLIDATED_COLUMNS}
+            ''', (event, keywords, importance, expiry_days, self.user_id), insert_records(CONSOLIDATED_COLUMNS))
+            memory_id = rows[0][0]
+            index_memory(self.engine, memory_id, event, keywords, self.user_id)
+        return memory_id
+
+    def _snapshot_rows(self) -> List[Dict[str, Any]]:
+        # 日志覆盖整个共享库，快照也必须是全库
+        return self.store.snapshot_rows()
+
+
+def create_memory_repository(user_id: int, data_dir: str, storage_mode: str = STORAGE_PER_USER) -> MemoryRepository:
+    """按存储模式创建仓储实例。"""
+    if storage_mode == STORAGE_CONSOLIDATED:
+        return ConsolidatedMemoryRepository(user_id, data_dir)
+    if storage_mode != STORAGE_PER_USER:
+        raise ValueError(f"未知的记忆存储模式: {storage_mode}")
+    return MemoryRepository(user_id, data_dir)
+
+
+def restore_database(changelog_path: str, db_path: str, consolidated: bool = False) -> int:
+    """
+    重放变更日志，把数据写入 db_path 处的新数据库 (保留原 id)，返回恢复的行数。
+    直接使用 sqlite3 写入，不经过仓储层，避免恢复过程本身再产生日志。
+    """
+    rows = replay(read_records(changelog_path))
+    columns = CONSOLIDATED_COLUMNS if consolidated else MEMORY_COLUMNS
+    names = _column_names(columns)
+    placeholders = ', '.join('?' for _ in names)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(CONSOLIDATED_SCHEMA if consolidated else MEMORIES_SCHEMA)
+        conn.executemany(
+            f"INSERT INTO memories ({columns}) VALUES ({placeholders})",
+            [tuple(row.get(name) for name in names) for _, row in sorted(rows.items())]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info(f"[REPO] RESTORE | db: {db_path} | rows: {len(rows)}")
+    return len(rows)
@@ -2,13 +2,19 @@
 文件职责：记忆服务层 (Service)
 核心业务逻辑入口，组装 Repository 和 Policy。
 对外提供记忆的增删改查、自动维护和检索功能。
+语义检索 (recall) 使用内存中的 VectorIndex，首次检索时从 memory_vectors 表载入，之后随写入增量更新。
+version 在每次修改记忆 (新增 / 衰减 / 删除) 并提交后递增，供上层缓存 (如 MemorySummaryCache) 判断失效。
 """
 
 import os
+import threading
 from typing import List, Tuple, Optional
 from src.core.logger import get_logger
-from src.core.memory.repository import MemoryRepository
+from src.core.memory.repository import STORAGE_PER_USER, create_memory_repository
 from src.core.memory.policy import MemoryPolicy
+from src.core.memory.keywords import normalize_keywords
+from src.core.memory import embedding, minhash
+from src.core.memory.vector_index import VectorIndex
 
 logger = get_logger("MemoryService")
 
@@ -16,11 +22,26 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(o
 USER_MEMORIES_DIR = os.path.join(PROJECT_ROOT, "user_memories")
 os.makedirs(USER_MEMORIES_DIR, exist_ok=True)
 
+RECALL_OVERSAMPLE = 4   # 向量检索多取的倍数，留出被有效性条件过滤掉的余量
+
 class MemoryService:
-    def __init__(self, user_id: int):
+    def __init__(self, user_id: int, data_dir: str = USER_MEMORIES_DIR, storage_mode: str = STORAGE_PER_USER):
         self.user_id = user_id
-        self.repo = MemoryRepository(user_id, USER_MEMORIES_DIR)
+        self.repo = create_memory_repository(user_id, data_dir, storage_mode)
         self.policy = MemoryPolicy()
+        self._vector_index: Optional[VectorIndex] = None
+        self._vector_lock = threading.Lock()
+        self._version = 0
+        self._version_lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        """记忆数据版本号，每次修改提交后递增。"""
+        return self._version
+
+    def _bump_version(self):
+        with self._version_lock:
+            self._version += 1
 
     def add_memories(self, new_memories: List[Tuple[str, str, int, int]]):
         """
@@ -31,46 +52,70 @@ class MemoryService:
         if not new_memories:
             return
 
-        # 1. 执行一次维护（衰减旧记忆）
-        self._perform_maintenance()
+        added: List[Tuple[int, str, str]] = []
+        replaced: List[int] = []
+        # 维护、去重写入与清理合并为一个事务
+        with self.repo.transaction():
+            # 1. 执行一次维护（衰减旧记忆）
+            self._perform_maintenance()
 
-        # 2. 处理新记忆
-        for mem in new_memories:
-            event, keywords, importance, expiry_days = mem
-            
-            try:
-                # 尝试查找包含相同关键词或类似文本的记忆
-                where_clause, params = self.policy.get_duplicate_candidates_sql(event)
-                candidates = self.repo.get_memories_by_sql(where_clause, params)
+            # 2. 处理新记忆：每条在独立的保存点中完成，失败时该条 (包括已删除的旧记忆) 整体回滚，
+            #    不会提交 "删了旧的、没加上新的" 的半截替换；其余记忆照常写入
+            for mem in new_memories:
+                event, keywords, importance, expiry_days = mem
                 
-                is_duplicate = False
-                for existing in candidates:
-                    # existing: id, event, keywords, imp, create, expiry, last
-                    e_id, e_event, _, e_imp, _, _, _ = existing
-                    
-                    if self.policy.is_duplicate(event, e_event):
-                        if self.policy.should_replace_duplicate(importance, e_imp):
-                            # 新记忆更重要，替换旧的（先删旧）
-                            self.repo.delete_memory(e_id)
-                            logger.info(f"[MEMORY] REPLACE | user_id: {self.user_id} | old_id: {e_id} | new_event: {event}")
-                        else:
-                            # 旧记忆更重要，忽略新的
-                            is_duplicate = True
-                            logger.info(f"[MEMORY] IGNORE_DUPLICATE | user_id: {self.user_id} | event: {event}")
-                        break
-                
-                if not is_duplicate:
-                    self.repo.add_memory(event, keywords, importance, expiry_days)
-                    logger.info(f"[MEMORY] ADD | user_id: {self.user_id} | event: {event}")
+                try:
+                    with self.repo.savepoint():
+                        item_added, item_replaced = self._add_one(event, keywords, importance, expiry_days)
+                except Exception as e:
+                    logger.error(f"[MEMORY] ADD_FAIL | user_id: {self.user_id} | event: {event} | error: {e}")
+                    continue
+                added.extend(item_added)
+                replaced.extend(item_replaced)
+
+            # 3. 再次清理低重要性记忆
+            self._cleanup_low_importance()
+
+            # 4. 提交后同步内存向量索引 (尚未载入时无需处理，载入时会读到最新数据)，并使上层缓存失效。
+            #    外层还有事务 (如 MemoryIngestService 的组提交) 时，等最外层提交后才执行。
+            self.repo.engine.after_commit(lambda: self._sync_vector_index(added, replaced))
+            self.repo.engine.after_commit(self._bump_version)
 
-            except Exception as e:
-                logger.error(f"[MEMORY] ADD_FAIL | user_id: {self.user_id} | error: {e}")
+            # 5. 备份：变更已增量写入日志，这里只在日志过长时压缩
+            self.repo.engine.after_commit(self.repo.compact_backup_if_needed)
 
-        # 3. 再次清理低重要性记忆
-        self._cleanup_low_importance()
+    def _add_one(self, event: str, keywords: str, importance: int, expiry_days: int) -> Tuple[List[Tuple[int, str, str]], List[int]]:
+        """去重并写入一条记忆，返回 (新增, 被替换的旧记忆 ID)。"""
+        added: List[Tuple[int, str, str]] = []
+        replaced: List[int] = []
+
+        # 通过 MinHash/LSH 索引查找近似重复的候选记忆（不再全表扫描）
+        signature = minhash.signature(event)
+        candidates = self.repo.get_similar_candidates(minhash.band_keys(signature))
+        
+        is_duplicate = False
+        for existing in candidates:
+            # existing: id, event, keywords, imp, create, expiry, last, signature
+            e_id, e_event, _, e_imp, _, _, _, e_signature = existing
+            similarity = minhash.similarity(signature, minhash.from_blob(e_signature))
+            
+            if self.policy.is_duplicate(event, e_event, similarity):
+                if self.policy.should_replace_duplicate(importance, e_imp):
+                    # 新记忆更重要，替换旧的（先删旧）
+                    self.repo.delete_memory(e_id)
+                    replaced.append(e_id)
+                    logger.info(f"[MEMORY] REPLACE | user_id: {self.user_id} | old_id: {e_id} | new_event: {event}")
+                else:
+                    # 旧记忆更重要，忽略新的
+                    is_duplicate = True
+                    logger.info(f"[MEMORY] IGNORE_DUPLICATE | user_id: {self.user_id} | event: {event}")
+                break
         
-        # 4. 备份
-        self.repo.backup_to_csv()
+        if not is_duplicate:
+            memory_id = self.repo.add_memory(event, keywords, importance, expiry_days)
+            added.append((memory_id, event, keywords))
+            logger.info(f"[MEMORY] ADD | user_id: {self.user_id} | event: {event}")
+        return added, replaced
 
     def get_relevant_memories(self) -> List[Tuple]:
         """
@@ -81,47 +126,77 @@ class MemoryService:
 
     def search_memories(self, query_keywords: List[str], limit: int = 2) -> List[Tuple]:
         """
-        根据关键词搜索相关记忆。
+        根据关键词搜索相关记忆（走关键词倒排索引），按重要性与最近提及时间排序。
         """
-        # 获取所有较高权重的记忆进行匹配
         where_clause, params = self.policy.get_search_candidates_sql()
-        candidates = self.repo.get_memories_by_sql(where_clause, params)
-        
-        matched = []
-        for mem in candidates:
-            # mem[2] is keywords string
-            if self.policy.match_keywords(mem[2], query_keywords):
-                matched.append(mem)
-                if len(matched) >= limit:
-                    break
-        return matched
+        return self.repo.search_by_keywords(
+            normalize_keywords(query_keywords), where_clause, params,
+            self.policy.get_search_order_sql(), limit
+        )
+
+    def recall(self, query: str, k: int = 8) -> List[Tuple]:
+        """
+        语义检索：返回与 query 最相关的至多 k 条有效记忆，按相似度降序。
+        相似度低于 MIN_RECALL_SIMILARITY 的记忆不返回。
+        """
+        query_vec = embedding.embed(query)
+        if embedding.is_empty(query_vec) or k <= 0:
+            return []
+
+        index = self._get_vector_index()
+        hits = [
+            (memory_id, score) for memory_id, score in index.search(query_vec, k * RECALL_OVERSAMPLE)
+            if score >= self.policy.MIN_RECALL_SIMILARITY
+        ]
+        if not hits:
+            return []
+
+        where_clause, params = self.policy.get_valid_memories_sql()
+        rows = {row[0]: row for row in self.repo.get_memories_by_ids([m for m, _ in hits], where_clause, params)}
+
+        # 维护清理删除的记忆不会通知索引，检索时发现后顺带移除
+        stale = [memory_id for memory_id, _ in hits if memory_id not in rows]
+        if stale:
+            index.remove(stale)
+
+        # 每行末尾是 "是否有效" 标记
+        return [rows[m][:-1] for m, _ in hits if m in rows and rows[m][-1]][:k]
+
+    def _get_vector_index(self) -> VectorIndex:
+        with self._vector_lock:
+            if self._vector_index is None:
+                index = VectorIndex()
+                index.upsert_many(
+                    (memory_id, embedding.from_blob(blob)) for memory_id, blob in self.repo.get_vectors()
+                )
+                self._vector_index = index
+                logger.info(f"[MEMORY] VECTOR_INDEX_LOAD | user_id: {self.user_id} | size: {len(index)} | ivf: {index.is_ivf}")
+            return self._vector_index
+
+    def _sync_vector_index(self, added: List[Tuple[int, str, str]], removed: List[int]):
+        index = self._vector_index
+        if index is None:
+            return
+        index.remove(removed)
+        vectors = [
+            (memory_id, embedding.embed(embedding.memory_text(event, keywords)))
+            for memory_id, event, keywords in added
+        ]
+        index.upsert_many((memory_id, vec) for memory_id, vec in vectors if not embedding.is_empty(vec))
 
     def update_last_mentioned(self, memory_id: int):
         """更新记忆的活跃时间"""
         self.repo.update_last_mentioned(memory_id)
 
     def _perform_maintenance(self):
-        """执行维护：衰减重要性"""
-        all_memories = self.repo.get_all_memories()
-        for mem in all_memories:
-            mem_id, _, _, imp, _, _, last_mentioned = mem
-            new_imp = self.policy.calculate_decay(imp, last_mentioned)
-            
-            if self.policy.should_persist_decay(imp, new_imp):
-                self.repo.update_memory_importance(mem_id, new_imp)
+        """执行维护：衰减重要性（一条集合式 UPDATE，在数据库内完成）"""
+        value_sql, value_params, where_clause, where_params = self.policy.get_decay_sql()
+        updated = self.repo.update_importance_by_sql(value_sql, value_params, where_clause, where_params)
+        logger.debug(f"[MEMORY] DECAY | user_id: {self.user_id} | count: {updated}")
 
     def _cleanup_low_importance(self):
-        """清理重要性过低或过期的记忆"""
-        to_delete = []
-        all_memories = self.repo.get_all_memories()
-        
-        for mem in all_memories:
-            # mem结构: id, event, keywords, importance, create_time, expiry_days, last_mentioned
-            mem_id, _, _, imp, create_time, expiry_days, last_mentioned = mem
-            
-            if self.policy.should_delete_memory(imp, create_time, expiry_days, last_mentioned):
-                to_delete.append(mem_id)
-
-        if to_delete:
-            self.repo.delete_memories_batch(to_delete)
-            logger.info(f"[MEMORY] CLEANUP | user_id: {self.user_id} | count: {len(to_delete)}")
+        """清理重要性过低或过期的记忆（一条集合式 DELETE）"""
+        where_clause, params = self.policy.get_cleanup_sql()
+        deleted = self.repo.delete_memories_by_sql(where_clause, params)
+        if deleted:
+            logger.info(f"[MEMORY] CLEANUP | user_id: {self.user_id} | count: {deleted}")
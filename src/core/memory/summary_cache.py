@@ -0,0 +1,75 @@
+"""
+文件职责：记忆摘要缓存 (MemorySummaryCache)
+缓存 ChatService 拼好的 Prompt 记忆摘要，避免每轮对话、每次主动消息检查都重新查询和排序。
+- 失效由版本号驱动：MemoryService 在新增 / 衰减 / 删除记忆后递增 version，缓存项记录生成时的版本，
+  读取时版本不一致即视为失效 (不需要写路径主动通知缓存)。
+- TTL：过期条件依赖当前时间，版本号覆盖不到，超过 ttl 秒的缓存项同样失效。
+- LRU：所有用户共享一个容量上限，超出时淘汰最久未使用的项。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 300.0
+
+class MemorySummaryCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        # (user_id, 子键) -> (version, content, 写入时间)
+        self._entries: "OrderedDict[Tuple[int, Hashable], Tuple[int, str, float]]" = OrderedDict()
+        self._counters: Dict[str, int] = {"hits": 0, "misses": 0, "stale": 0, "expired": 0, "evictions": 0}
+
+    def get(self, user_id: int, key: Hashable, version: int) -> Optional[str]:
+        """返回仍然有效的缓存内容，否则 None (失效项会被移除)。"""
+        cache_key = (user_id, key)
+        with self.lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            cached_version, content, stored_at = entry
+            if cached_version != version:
+                del self._entries[cache_key]
+                self._counters["stale"] += 1
+                self._counters["misses"] += 1
+                return None
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[cache_key]
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self._counters["hits"] += 1
+            return content
+
+    def put(self, user_id: int, key: Hashable, version: int, content: str):
+        cache_key = (user_id, key)
+        with self.lock:
+            self._entries[cache_key] = (version, content, time.monotonic())
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate_user(self, user_id: int):
+        """移除某个用户的全部缓存项 (会话结束时调用)。"""
+        with self.lock:
+            for cache_key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[cache_key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def snapshot(self) -> Dict[str, float]:
+        """返回命中/未命中等计数与当前条目数。"""
+        with self.lock:
+            stats: Dict[str, float] = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,179 @@
+"""
+文件职责：内存向量索引 (VectorIndex)
+为单个用户的记忆向量提供 top-k 内积检索，支持增量 upsert / remove。
+- 记忆较少时 (< IVF_MIN_SIZE) 直接做扁平 (flat) 检索：一次矩阵乘法。
+- 记忆较多时自动训练 IVF (倒排文件) 索引：球面 k-means 得到 nlist 个中心，查询只扫描最近的少数几个簇。
+  新增向量按最近中心归簇，数据量翻倍后重新训练。
+
+索引本身不持久化，向量保存在数据库的 memory_vectors 表中 (见 repository.py)，打开时批量载入即可重建。
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.logger import get_logger
+from src.core.memory.embedding import DTYPE, EMBEDDING_DIM
+
+logger = get_logger("VectorIndex")
+
+IVF_MIN_SIZE = 4096        # 达到该规模后启用 IVF
+IVF_MIN_LISTS = 16
+IVF_MAX_LISTS = 1024
+IVF_NPROBE = 8             # 至少探查的簇数
+IVF_PROBE_FRACTION = 0.1   # 探查的簇占比，簇数增多时按比例增加
+IVF_RETRAIN_GROWTH = 2     # 规模达到上次训练时的倍数后重新训练
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 64
+KMEANS_SEED = 20240601
+INITIAL_CAPACITY = 64
+
+class VectorIndex:
+    def __init__(self, dim: int = EMBEDDING_DIM, ivf_min_size: int = IVF_MIN_SIZE, nprobe: int = IVF_NPROBE):
+        self.dim = dim
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        self._vectors = np.zeros((INITIAL_CAPACITY, dim), dtype=DTYPE)
+        self._ids = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._rows: Dict[int, int] = {}        # memory_id -> 行号
+        self._size = 0
+        # IVF
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def is_ivf(self) -> bool:
+        return self._centroids is not None
+
+    def __contains__(self, memory_id: int) -> bool:
+        return memory_id in self._rows
+
+    # ================== 写 ==================
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._vectors = np.resize(self._vectors, (capacity, self.dim))
+        self._ids = np.resize(self._ids, capacity)
+        self._assign = np.resize(self._assign, capacity)
+
+    def upsert(self, memory_id: int, vector: np.ndarray):
+        self.upsert_many([(memory_id, vector)])
+
+    def upsert_many(self, items: Iterable[Tuple[int, np.ndarray]]):
+        """批量写入 (memory_id, 向量)。已存在的 id 覆盖原向量。"""
+        with self.lock:
+            items = list(items)
+            self._grow(self._size + len(items))
+            touched = []
+            for memory_id, vector in items:
+                row = self._rows.get(memory_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[memory_id] = row
+                    self._ids[row] = memory_id
+                self._vectors[row] = vector
+                touched.append(row)
+
+            if self._needs_training():
+                self._train()
+            elif self._centroids is not None and touched:
+                rows = np.asarray(touched)
+                self._assign[rows] = np.argmax(self._vectors[rows] @ self._centroids.T, axis=1)
+
+    def remove(self, memory_ids: Iterable[int]):
+        """删除向量：用最后一行填补空位，保持存储连续。"""
+        with self.lock:
+            for memory_id in memory_ids:
+                row = self._rows.pop(memory_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    moved_id = int(self._ids[last])
+                    self._vectors[row] = self._vectors[last]
+                    self._ids[row] = moved_id
+                    self._assign[row] = self._assign[last]
+                    self._rows[moved_id] = row
+                self._size = last
+            if self._centroids is not None and self._size < self.ivf_min_size // 2:
+                # 规模回落后退回扁平检索
+                self._centroids = None
+                self._trained_size = 0
+
+    def clear(self):
+        with self.lock:
+            self._rows.clear()
+            self._size = 0
+            self._centroids = None
+            self._trained_size = 0
+
+    # ================== IVF 训练 ==================
+
+    def _needs_training(self) -> bool:
+        if self._size < self.ivf_min_size:
+            return False
+        return self._centroids is None or self._size >= self._trained_size * IVF_RETRAIN_GROWTH
+
+    def _train(self):
+        """球面 k-means：中心归一化，按内积归簇。训练样本最多 KMEANS_SAMPLE_PER_LIST × nlist 条。"""
+        data = self._vectors[:self._size]
+        nlist = min(self._size, IVF_MAX_LISTS, max(IVF_MIN_LISTS, int(math.sqrt(self._size))))
+        rng = np.random.default_rng(KMEANS_SEED)
+        sample_size = min(self._size, nlist * KMEANS_SAMPLE_PER_LIST)
+        sample = data[rng.choice(self._size, sample_size, replace=False)]
+        centroids = sample[:nlist].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assign, minlength=nlist)
+            nonempty = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+            # 按簇排序后分段求和；空簇保留原中心
+            sums = np.add.reduceat(sample[np.argsort(assign, kind="stable")], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids[nonempty] = sums / norms
+
+        self._centroids = centroids
+        self._assign[:self._size] = np.argmax(data @ centroids.T, axis=1)
+        self._trained_size = self._size
+        logger.info(f"[VECTOR] IVF_TRAINED | size: {self._size} | lists: {nlist}")
+
+    # ================== 读 ==================
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """返回内积最高的 k 个 (memory_id, score)，按分数降序。"""
+        with self.lock:
+            if self._size == 0 or k <= 0:
+                return []
+            if self._centroids is None:
+                rows = None
+                scores = self._vectors[:self._size] @ query
+            else:
+                nlist = len(self._centroids)
+                nprobe = min(nlist, max(self.nprobe, int(nlist * IVF_PROBE_FRACTION)))
+                probe = np.argpartition(self._centroids @ query, -nprobe)[-nprobe:]
+                rows = np.flatnonzero(np.isin(self._assign[:self._size], probe))
+                if len(rows) == 0:
+                    return []
+                scores = self._vectors[rows] @ query
+
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            ids = self._ids[top] if rows is None else self._ids[rows[top]]
+            return [(int(memory_id), float(scores[i])) for memory_id, i in zip(ids, top)]
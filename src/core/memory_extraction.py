@@ -0,0 +1,160 @@
+"""
+文件职责：后台记忆提取 (MemoryExtractionWorker)
+ChatService 每 N 条消息提交一次最近的对话窗口，由后台线程调用 LLM 提取记忆并写入长期记忆，
+回复链路上只有一次非阻塞的入队操作。
+- 有界队列：待处理的用户数超过 queue_size 时拒绝新任务并计入 dropped (背压)，不会无限堆积。
+- 合并：同一用户尚未处理的任务被更新的窗口替换 (新窗口覆盖旧窗口的大部分内容)，计入 coalesced。
+- 批处理：工作线程一次取出至多 batch_size 个用户的任务 (最多等待 batch_wait 秒凑批)，
+  合并为一次 LLM 调用 (LLMClient.extract_new_memories_batch)，再逐用户写入。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from src.core.config import MemoryExtractionConfig
+from src.core.logger import get_logger
+
+logger = get_logger("MemoryExtraction")
+
+# writer(user_id, memories)：memories 格式同 MemoryService.add_memories
+MemoryWriter = Callable[[int, List[tuple]], None]
+
+@dataclass
+class ExtractionJob:
+    user_id: int
+    conversation_text: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+class MemoryExtractionWorker:
+    def __init__(self, llm_client, writer: MemoryWriter, config: Optional[MemoryExtractionConfig] = None):
+        self.llm_client = llm_client
+        self.writer = writer
+        self.config = config or MemoryExtractionConfig()
+
+        self._pending: "OrderedDict[int, ExtractionJob]" = OrderedDict()  # user_id -> 任务，按入队顺序
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self._counters: Dict[str, int] = {
+            "submitted": 0, "coalesced": 0, "dropped": 0, "processed": 0,
+            "batches": 0, "failures": 0, "memories": 0
+        }
+
+    # ================== 生命周期 ==================
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping = False
+        for i in range(self.config.workers):
+            thread = threading.Thread(target=self._run, name=f"MemoryExtraction-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"[EXTRACT] START | workers: {self.config.workers} | queue_size: {self.config.queue_size}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止工作线程。已在处理中的批次会完成，队列中剩余的任务被丢弃。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ================== 提交 ==================
+
+    def submit(self, user_id: int, conversation_text: str) -> bool:
+        """
+        非阻塞提交一个对话窗口。
+        Returns:
+            bool: 入队 (或合并进已有任务) 返回 True；队列已满被丢弃返回 False。
+        """
+        if not conversation_text.strip():
+            return False
+        with self._cond:
+            self._counters["submitted"] += 1
+            job = self._pending.get(user_id)
+            if job is not None:
+                # 保留原入队时间与位置，只更新内容
+                job.conversation_text = conversation_text
+                self._counters["coalesced"] += 1
+                return True
+            if len(self._pending) >= self.config.queue_size:
+                self._counters["dropped"] += 1
+                logger.warning(f"[EXTRACT] DROP | user_id: {user_id} | pending: {len(self._pending)}")
+                return False
+            self._pending[user_id] = ExtractionJob(user_id, conversation_text)
+            self._cond.notify()
+            return True
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    # ================== 处理 ==================
+
+    def _take_batch(self) -> List[ExtractionJob]:
+        """等待任务；第一个任务到达后最多再等 batch_wait 秒凑满 batch_size。"""
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return []
+            deadline = time.monotonic() + self.config.batch_wait
+            while len(self._pending) < self.config.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = []
+            while self._pending and len(batch) < self.config.batch_size:
+                batch.append(self._pending.popitem(last=False)[1])
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self.process_batch(batch)
+
+    def process_batch(self, batch: List[ExtractionJob]):
+        """一次 LLM 调用提取整批记忆，然后逐用户写入。单个用户写入失败不影响其他用户。"""
+        start = time.monotonic()
+        try:
+            results = self.llm_client.extract_new_memories_batch([job.conversation_text for job in batch])
+        except Exception as e:
+            with self._cond:
+                self._counters["failures"] += len(batch)
+            logger.error(f"[EXTRACT] BATCH_FAIL | size: {len(batch)} | error: {e}")
+            return
+
+        extracted = 0
+        for job, memories in zip(batch, results):
+            if not memories:
+                continue
+            try:
+                self.writer(job.user_id, memories)
+                extracted += len(memories)
+            except Exception as e:
+                with self._cond:
+                    self._counters["failures"] += 1
+                logger.error(f"[EXTRACT] WRITE_FAIL | user_id: {job.user_id} | error: {e}")
+
+        with self._cond:
+            self._counters["batches"] += 1
+            self._counters["processed"] += len(batch)
+            self._counters["memories"] += extracted
+        wait = start - min(job.enqueued_at for job in batch)
+        logger.info(f"[EXTRACT] BATCH_DONE | users: {len(batch)} | memories: {extracted} | "
+                    f"queue_wait: {wait:.2f}s | duration: {time.monotonic() - start:.2f}s")
+
+    def snapshot(self) -> Dict[str, int]:
+        """返回提交 / 合并 / 丢弃 / 处理等计数与当前队列深度。"""
+        with self._cond:
+            stats = dict(self._counters)
+            stats["pending"] = len(self._pending)
+        return stats
@@ -2,14 +2,32 @@
 文件职责：记忆注入接口
 定义了结构化的记忆数据载体 (MemoryPayload) 和记忆管理接口 (MemoryManagerInterface)。
 确保所有进入长期记忆的数据（无论来源）都遵循统一的格式和追溯标准。
+MemoryIngestService 是接口的实现：校验、去重并以微批组提交的方式写入 MemoryService。
 """
 
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from enum import Enum
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
 from abc import ABC, abstractmethod
 
+from src.core.config import MemoryIngestConfig
+from src.core.logger import get_logger
+from src.core.memory.keywords import normalize_keywords
+from src.core.memory.minhash import normalize_event
+from src.core.memory.policy import MemoryPolicy
+
+if TYPE_CHECKING:
+    from src.core.memory.service import MemoryService
+
+logger = get_logger("MemoryIngest")
+
 class MemorySource(Enum):
     """
     有效记忆来源的枚举。
@@ -33,6 +51,7 @@ class MemoryPayload:
     related_context_ids: List[str]                                 # 生成此总结的原始消息/交互的 ID (用于溯源)
     source_platform: MemorySource                                  # 交互发生的来源平台
     timestamp: datetime                                            # 记忆形成的时间 (通常是现在，或会话结束时间)
+    expiry_days: Optional[int] = None                              # 有效期 (天)，为空时按重要性推断
 
 class MemoryManagerInterface(ABC):
     """
@@ -67,3 +86,281 @@ class MemoryManagerInterface(ABC):
         """
         # TODO: 实现具体的记忆注入逻辑 (SQLite/VectorDB)。
         pass
+
+
+# ================== 实现：批量注入服务 ==================
+
+DATE_PREFIX = re.compile(r"^\s*\d{4}-\d{1,2}-\d{1,2}\s")
+MAX_SUMMARY_LENGTH = 500
+PERMANENT_IMPORTANCE = 0.8        # 重要度达到此值且未指定有效期时视为永久记忆
+DEFAULT_EXPIRY_DAYS = 30
+THROUGHPUT_WINDOW = 60.0          # 吞吐量统计窗口 (秒)
+
+@dataclass
+class _IngestItem:
+    user_id: int
+    memory: Tuple[str, str, int, int]
+    future: Future
+    enqueued_at: float
+
+class IngestMetrics:
+    """线程安全的注入指标：计数、端到端延迟 (入队到提交)、批提交耗时与近期吞吐量。"""
+    LATENCY_WINDOW = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "submitted": 0,
+            "rejected": 0,
+            "dropped": 0,
+            "duplicates": 0,
+            "committed": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+        self.latencies: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+        self.commit_durations: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+        self.recent_commits: Deque[Tuple[float, int]] = deque()
+
+    def incr(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_batch(self, duration: float, latencies: List[float]):
+        now = time.monotonic()
+        with self.lock:
+            self.counters["batches"] += 1
+            self.commit_durations.append(duration)
+            self.latencies.extend(latencies)
+            self.recent_commits.append((now, len(latencies)))
+            while self.recent_commits and now - self.recent_commits[0][0] > THROUGHPUT_WINDOW:
+                self.recent_commits.popleft()
+
+    @staticmethod
+    def _percentiles(values: List[float], prefix: str, data: Dict[str, Any]):
+        if values:
+            ordered = sorted(values)
+            data[f"{prefix}_p50"] = ordered[int(0.50 * (len(ordered) - 1))]
+            data[f"{prefix}_p99"] = ordered[int(0.99 * (len(ordered) - 1))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.lock:
+            data: Dict[str, Any] = dict(self.counters)
+            latencies = list(self.latencies)
+            durations = list(self.commit_durations)
+            recent = sum(count for ts, count in self.recent_commits if now - ts <= THROUGHPUT_WINDOW)
+        data["throughput_per_sec"] = recent / THROUGHPUT_WINDOW
+        self._percentiles(latencies, "latency", data)
+        self._percentiles(durations, "commit", data)
+        return data
+
+class MemoryIngestService(MemoryManagerInterface):
+    """
+    MemoryManagerInterface 的实现：所有来源 (Telegram 后台提取、Live2D 等) 共用的记忆写入路径。
+    - 校验：文本非空且不超长、重要度在 [0, 1]、关键词为字符串、来源合法。
+    - 组提交：单个提交线程从有界队列中攒出微批 (至多 max_batch 条或等待 max_delay 秒)，
+      同一用户的多条记忆合并为一次 MemoryService.add_memories；共用同一数据库的用户 (consolidated 模式)
+      再合并到一个事务中提交。
+    - 去重：微批内同一用户的相同事件只保留重要度最高的一条；与已有记忆的近似重复由
+      MemoryService 通过 MinHash/LSH 索引判断。
+    """
+    def __init__(self, memory_provider: Callable[[int], "MemoryService"], config: Optional[MemoryIngestConfig] = None):
+        self.memory_provider = memory_provider
+        self.config = config or MemoryIngestConfig()
+        self.metrics = IngestMetrics()
+        self._queue: "queue.Queue[_IngestItem]" = queue.Queue(maxsize=self.config.queue_size)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ================== 生命周期 ==================
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="MemoryIngest", daemon=True)
+        self._thread.start()
+        logger.info(f"[INGEST] START | max_batch: {self.config.max_batch} | max_delay: {self.config.max_delay}s")
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止提交线程，队列中剩余的记忆会先提交完。"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ================== 提交 ==================
+
+    @staticmethod
+    def validate(payload: MemoryPayload) -> Optional[str]:
+        """返回不合法的原因；合法时返回 None。"""
+        text = (payload.summary_text or "").strip()
+        if not text:
+            return "empty summary_text"
+        if len(text) > MAX_SUMMARY_LENGTH:
+            return f"summary_text longer than {MAX_SUMMARY_LENGTH}"
+        score = payload.importance_score
+        if not isinstance(score, (int, float)) or not 0.0 <= score <= 1.0:
+            return f"importance_score out of range: {score}"
+        if not all(isinstance(k, str) for k in payload.keywords or []):
+            return "keywords must be strings"
+        if not isinstance(payload.source_platform, MemorySource):
+            return f"unknown source_platform: {payload.source_platform}"
+        if payload.expiry_days is not None and payload.expiry_days <= 0:
+            return f"invalid expiry_days: {payload.expiry_days}"
+        return None
+
+    @staticmethod
+    def to_memory(payload: MemoryPayload) -> Tuple[str, str, int, int]:
+        """转换为 MemoryService.add_memories 的 (event, keywords, importance, expiry_days)。"""
+        text = payload.summary_text.strip()
+        event = text if DATE_PREFIX.match(text) else f"{payload.timestamp:%Y-%m-%d} {text}"
+        importance = int(round(payload.importance_score * 100))
+        expiry_days = payload.expiry_days
+        if expiry_days is None:
+            expiry_days = MemoryPolicy.PERMANENT_EXPIRY_DAYS if payload.importance_score >= PERMANENT_IMPORTANCE else DEFAULT_EXPIRY_DAYS
+        return event, ",".join(normalize_keywords(payload.keywords or [])), importance, expiry_days
+
+    def submit(self, user_id: int, payload: MemoryPayload) -> Future:
+        """
+        非阻塞提交，返回在记忆提交 (或失败) 后得到 bool 结果的 Future。
+        队列已满时最多等待 submit_timeout 秒 (背压)，仍无空位则丢弃。
+        """
+        future: Future = Future()
+        self.metrics.incr("submitted")
+        reason = self.validate(payload)
+        if reason is not None:
+            self.metrics.incr("rejected")
+            logger.warning(f"[INGEST] REJECT | user_id: {user_id} | source: {payload.source_platform} | reason: {reason}")
+            future.set_result(False)
+            return future
+
+        item = _IngestItem(user_id, self.to_memory(payload), future, time.monotonic())
+        try:
+            self._queue.put(item, timeout=self.config.submit_timeout)
+        except queue.Full:
+            self.metrics.incr("dropped")
+            logger.warning(f"[INGEST] DROP | user_id: {user_id} | queue_size: {self.config.queue_size}")
+            future.set_result(False)
+        return future
+
+    def ingest_summary(self, user_id: int, payload: MemoryPayload) -> bool:
+        return self.ingest_many(user_id, [payload])
+
+    def ingest_many(self, user_id: int, payloads: List[MemoryPayload]) -> bool:
+        """提交同一用户的多条记忆并等待提交完成，全部成功时返回 True。"""
+        futures = [self.submit(user_id, payload) for payload in payloads]
+        try:
+            return all([future.result(timeout=self.config.result_timeout) for future in futures])
+        except FutureTimeoutError:
+            logger.warning(f"[INGEST] RESULT_TIMEOUT | user_id: {user_id} | count: {len(payloads)}")
+            return False
+
+    # ================== 组提交 ==================
+
+    def _take_batch(self) -> List[_IngestItem]:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.config.max_delay
+        while len(batch) < self.config.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self.commit_batch(batch)
+
+    @staticmethod
+    def _dedup(items: List[_IngestItem]) -> Tuple[List[_IngestItem], List[_IngestItem]]:
+        """同一用户的相同事件只保留重要度最高的一条，返回 (保留, 重复)。"""
+        best: Dict[str, _IngestItem] = {}
+        duplicates = []
+        for item in items:
+            key = normalize_event(item.memory[0])
+            kept = best.get(key)
+            if kept is None:
+                best[key] = item
+            elif item.memory[2] > kept.memory[2]:
+                best[key] = item
+                duplicates.append(kept)
+            else:
+                duplicates.append(item)
+        return list(best.values()), duplicates
+
+    def commit_batch(self, batch: List[_IngestItem]):
+        start = time.monotonic()
+        by_user: Dict[int, List[_IngestItem]] = OrderedDict()
+        for item in batch:
+            by_user.setdefault(item.user_id, []).append(item)
+
+        # 按数据库引擎分组：共享库中的所有用户在一个事务中提交
+        groups: Dict[int, Tuple[Any, List[Tuple["MemoryService", List[_IngestItem], List[_IngestItem]]]]] = OrderedDict()
+        for user_id, items in by_user.items():
+            kept, duplicates = self._dedup(items)
+            self.metrics.incr("duplicates", len(duplicates))
+            try:
+                service = self.memory_provider(user_id)
+            except Exception as e:
+                logger.error(f"[INGEST] SERVICE_FAIL | user_id: {user_id} | error: {e}")
+                self._finish(items, False)
+                continue
+            engine = service.repo.engine
+            groups.setdefault(id(engine), (engine, []))[1].append((service, kept, duplicates))
+
+        latencies: List[float] = []
+        for engine, members in groups.values():
+            try:
+                with engine.transaction():
+                    for service, kept, _ in members:
+                        service.add_memories([item.memory for item in kept])
+                committed = members
+            except Exception as e:
+                logger.error(f"[INGEST] GROUP_COMMIT_FAIL | db: {engine.db_path} | users: {len(members)} | error: {e}")
+                committed = self._commit_individually(members) if len(members) > 1 else []
+                for member in members:
+                    if member not in committed:
+                        self._finish(member[1] + member[2], False)
+
+            now = time.monotonic()
+            for _, kept, duplicates in committed:
+                self._finish(kept + duplicates, True)
+                self.metrics.incr("committed", len(kept))
+                latencies.extend(now - item.enqueued_at for item in kept + duplicates)
+
+        self.metrics.observe_batch(time.monotonic() - start, latencies)
+        logger.debug(f"[INGEST] BATCH | items: {len(batch)} | users: {len(by_user)} | dbs: {len(groups)} | "
+                     f"duration: {time.monotonic() - start:.3f}s")
+
+    def _commit_individually(self, members):
+        """组提交失败时逐用户重试，避免一个用户的问题拖累整批。返回提交成功的成员。"""
+        committed = []
+        for member in members:
+            service, kept, _ = member
+            try:
+                service.add_memories([item.memory for item in kept])
+                committed.append(member)
+            except Exception as e:
+                logger.error(f"[INGEST] COMMIT_FAIL | user_id: {service.user_id} | error: {e}")
+        return committed
+
+    def _finish(self, items: List[_IngestItem], ok: bool):
+        if not ok:
+            self.metrics.incr("failed", len(items))
+        for item in items:
+            if not item.future.done():
+                item.future.set_result(ok)
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = self.metrics.snapshot()
+        data["pending"] = self._queue.qsize()
+        return data
@@ -0,0 +1,130 @@
+"""
+文件职责：分段回复的节奏发送 (PacedDispatcher)
+多段回复需要按 "人类打字" 的节奏逐段发出 (默认 0.5s + 每字 0.05s，最长 3s)。
+原先在工作线程里 time.sleep 等待，一条多段回复会占住线程数秒；现在片段连同计划发送时间交给
+本调度器，调用方立即返回：
+- 每个会话一个待发队列，同一时刻最多一个片段在时间轮上等待，保证会话内顺序。
+- 片段发出后按其长度计算下一段的最早发送时间；队列为空时记录该时间，
+  流式生成的后续片段到达时仍遵守同样的间隔 (生成本身已超过间隔则立即发送)。
+- 计时使用独立的时间轮 (src/core/timer_wheel.py)，发送在其有界线程池中执行。
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Optional
+
+from src.core.logger import get_logger
+from src.core.timer_wheel import TimerWheel
+
+logger = get_logger("PacedDispatcher")
+
+Sender = Callable[[int, str], None]
+
+def typing_delay(text: str) -> float:
+    """
+    段与段之间的延迟。
+    简单的阅读时间计算：0.5s + 每个字符 0.05s，最长 3s
+    """
+    return min(3.0, 0.5 + len(text) * 0.05)
+
+class _ChatQueue:
+    __slots__ = ("pending", "next_send_at", "scheduled")
+
+    def __init__(self):
+        self.pending: Deque[str] = deque()
+        self.next_send_at = 0.0     # monotonic，上一段发出后下一段的最早发送时间
+        self.scheduled = False      # 是否已有片段在时间轮上等待
+
+class PacedDispatcher:
+    def __init__(self, sender: Optional[Sender] = None, delay_fn: Callable[[str], float] = typing_delay,
+                 tick: float = 0.05, workers: int = 4):
+        self.sender = sender
+        self.delay_fn = delay_fn
+        self._chats: Dict[int, _ChatQueue] = {}
+        self._lock = threading.Lock()
+        self._wheel = TimerWheel(tick=tick, workers=workers, name="PacedDispatcher")
+        self._counters: Dict[str, int] = {"enqueued": 0, "sent": 0, "failed": 0, "dropped": 0}
+
+    def start(self):
+        self._wheel.start()
+
+    def stop(self):
+        self._wheel.stop()
+
+    def enqueue(self, user_id: int, fragments: Iterable[str]):
+        """把片段追加到会话的待发队列，立即返回。"""
+        with self._lock:
+            chat = self._chats.get(user_id)
+            if chat is None:
+                chat = self._chats[user_id] = _ChatQueue()
+            for fragment in fragments:
+                if fragment:
+                    chat.pending.append(fragment)
+                    self._counters["enqueued"] += 1
+            if chat.pending and not chat.scheduled:
+                self._schedule(user_id, chat)
+
+    def cancel(self, user_id: int) -> int:
+        """丢弃会话尚未发出的片段 (例如会话结束)，返回丢弃数量。"""
+        with self._lock:
+            chat = self._chats.pop(user_id, None)
+            if chat is None:
+                return 0
+            self._wheel.cancel(("send", user_id))
+            dropped = len(chat.pending)
+            self._counters["dropped"] += dropped
+            return dropped
+
+    def pending_count(self, user_id: int) -> int:
+        with self._lock:
+            chat = self._chats.get(user_id)
+            return len(chat.pending) if chat else 0
+
+    def _schedule(self, user_id: int, chat: _ChatQueue):
+        """调用方持有 _lock。"""
+        chat.scheduled = True
+        delay = chat.next_send_at - time.monotonic()
+        self._wheel.schedule(("send", user_id), max(0.0, delay), self._send_next, user_id)
+
+    def _send_next(self, user_id: int):
+        with self._lock:
+            chat = self._chats.get(user_id)
+            if chat is None or not chat.pending:
+                if chat is not None:
+                    chat.scheduled = False
+                return
+            fragment = chat.pending.popleft()
+
+        try:
+            if self.sender:
+                self.sender(user_id, fragment)
+            failed = False
+        except Exception as e:
+            failed = True
+            logger.error(f"[DISPATCH] SEND_FAIL | user_id: {user_id} | error: {e}")
+
+        with self._lock:
+            self._counters["failed" if failed else "sent"] += 1
+            if self._chats.get(user_id) is not chat:
+                return  # 发送期间会话被取消
+            chat.next_send_at = time.monotonic() + self.delay_fn(fragment)
+            if chat.pending:
+                self._schedule(user_id, chat)
+            else:
+                chat.scheduled = False
+                # 记录保留到下一段的最早时间之后再清理，流式片段仍需遵守间隔
+                self._wheel.schedule(("expire", user_id), self.delay_fn(fragment), self._expire, user_id, chat)
+
+    def _expire(self, user_id: int, chat: _ChatQueue):
+        with self._lock:
+            if self._chats.get(user_id) is chat and not chat.pending and not chat.scheduled:
+                del self._chats[user_id]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回入队 / 发送 / 失败 / 丢弃计数与有待发片段的会话数。"""
+        with self._lock:
+            data: Dict[str, Any] = dict(self._counters)
+            data["active_chats"] = sum(1 for chat in self._chats.values() if chat.pending)
+        data["timer"] = self._wheel.snapshot()
+        return data
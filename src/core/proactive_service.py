@@ -4,11 +4,12 @@
 实现 Policy (是否发送) 和 Agent (发送什么) 模式，不包含调度逻辑。
 """
 
-from typing import Optional
+from typing import Optional, List, Dict
 import random
 from src.core.session_controller import SessionController
 from src.core.chat_service import ChatService
 from src.core.llm_client import LLMClient
+from src.core.async_llm_client import AsyncLLMClient
 from src.core.config_loader import ConfigLoader
 from src.core.prompt.prompt_builder import PromptBuilder
 from src.core.logger import get_logger
@@ -29,9 +30,9 @@ class ProactiveService:
         self.system_config = self.config_loader.system_config
         self.prompt_builder = PromptBuilder(self.config_loader)
         
-        # 我们使用独立的 LLMClient 或复用现有的。
-        # 由于 LLMClient 是轻量级的，我们可以新建一个。
-        self.llm_client = LLMClient(self.system_config)
+        # 复用 ChatService 的 LLMClient，共享同一个连接池（避免重复握手）
+        self.llm_client: LLMClient = chat_service.llm_client
+        self.async_llm_client: Optional[AsyncLLMClient] = chat_service.orchestrator.async_llm_client
         
         # 策略配置 (目前硬编码，未来可移至 yaml)
         self.send_prob = 0.3
@@ -63,35 +64,58 @@ class ProactiveService:
         """
         try:
             logger.info(f"[AGENT] GEN_START | user_id: {user_id}")
-            
-            # 1. 从 ChatService 获取上下文摘要和记忆
-            # 我们需要 ChatService 提供一个公共方法。
-            # 假设我们使用了 `_get_user_prompt_summary` (虽然是受保护的，但在 Python 中可以访问，建议后续公开化)
-            memory_text = self.chat_service._get_user_prompt_summary(user_id)
-            
-            # 2. 构建 Prompt
-            # TODO: 将此 Prompt 模板移动到 prompt_manager 或配置文件中，避免硬编码
-            instruction = (
-                "（系统指令：请忽略上文的‘回复用户’要求。现在是空闲时间，请根据【用户记忆】主动发起一个温馨的话题。"
-                "语气自然亲切，不要太生硬，一两句话即可。）"
-            )
-            
-            # 使用 PromptBuilder 构建 Prompt
-            final_prompt = self.prompt_builder.build(
-                user_input=instruction, # 这里将指令作为 user_input 传入，因为主要是触发生成
-                memory_str=memory_text,
-                context_str="暂无" 
-            )
-            
+            messages = self._build_messages(user_id)
+
             # 3. 调用 LLM
-            response = self.llm_client.chat_completion(
-                messages=[{"role": "user", "content": final_prompt}]
-            )
-            
+            response = self.llm_client.chat_completion(messages=messages)
+
             content = response.strip()
             logger.info(f"[AGENT] GEN_SUCCESS | user_id: {user_id} | len: {len(content)}")
             return content
-            
+
         except Exception as e:
             logger.error(f"[AGENT] GEN_FAIL | user_id: {user_id} | error: {e}", exc_info=True)
             return None
+
+    async def generate_content_async(self, user_id: int) -> Optional[str]:
+        """
+        generate_content 的异步版本，使用 AsyncLLMClient。
+        """
+        if self.async_llm_client is None:
+            logger.error(f"[AGENT] GEN_FAIL | user_id: {user_id} | error: AsyncLLMClient not configured")
+            return None
+
+        try:
+            logger.info(f"[AGENT] GEN_START | user_id: {user_id} | mode: async")
+            messages = self._build_messages(user_id)
+
+            response = await self.async_llm_client.chat_completion(messages=messages)
+
+            content = response.strip()
+            logger.info(f"[AGENT] GEN_SUCCESS | user_id: {user_id} | len: {len(content)}")
+            return content
+
+        except Exception as e:
+            logger.error(f"[AGENT] GEN_FAIL | user_id: {user_id} | error: {e}", exc_info=True)
+            return None
+
+    def _build_messages(self, user_id: int) -> List[Dict[str, str]]:
+        """构建主动消息的 Prompt 消息列表。"""
+        # 1. 从 ChatService 获取上下文摘要和记忆
+        # 我们需要 ChatService 提供一个公共方法。
+        # 假设我们使用了 `_get_user_prompt_summary` (虽然是受保护的，但在 Python 中可以访问，建议后续公开化)
+        memory_text = self.chat_service._get_user_prompt_summary(user_id)
+
+        # 2. 构建 Prompt
+        # TODO: 将此 Prompt 模板移动到 prompt_manager 或配置文件中，避免硬编码
+        instruction = (
+            "（系统指令：请忽略上文的‘回复用户’要求。现在是空闲时间，请根据【用户记忆】主动发起一个温馨的话题。"
+            "语气自然亲切，不要太生硬，一两句话即可。）"
+        )
+
+        # 使用 PromptBuilder 构建消息 (system 部分与回复链路相同，可共用服务端前缀缓存)
+        return self.prompt_builder.build_messages(
+            user_input=instruction, # 这里将指令作为 user_input 传入，因为主要是触发生成
+            memory_str=memory_text,
+            context_str="暂无"
+        )
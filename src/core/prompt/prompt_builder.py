@@ -2,74 +2,157 @@
 文件职责：Prompt 构建器
 负责将系统规则、人设、记忆、对话历史和用户输入组装成最终发送给 LLM 的 Prompt。
 统一了主动消息和被动回复的 Prompt 结构，确保系统行为的一致性。
+
+Prompt 结构由 config/prompt_template.txt 定义，启动时编译一次 (见 template.py)。
+系统规则与人设在同一人设、同一配置版本下内容不变：渲染一次后绑定进模板并缓存，
+之后每次请求只填入记忆、对话、指令与用户输入，单次 join 完成拼接。
+
+build_messages() 在 prompt.split_system_message 开启时，于模板的 {{cache_boundary}} 处拆分：
+系统规则 + 人设作为逐字节不变的 system 消息，记忆、对话与用户输入作为其后的 user 消息，
+使服务端的前缀缓存 (prefix / KV cache) 能够命中。
 """
 
-from typing import Optional
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
 from src.core.config_loader import ConfigLoader
+from src.core.logger import get_logger
+from src.core.prompt.template import PromptTemplate
+
+logger = get_logger("PromptBuilder")
+
+DEFAULT_PERSONA = "default"
+CACHE_BOUNDARY = "cache_boundary"
+
+# config/prompt_template.txt 缺失时使用的内置模板
+DEFAULT_TEMPLATE = """<system>
+  <protocol>
+{{system_rules}}
+  </protocol>
+</system>
+
+<persona>
+{{persona}}
+</persona>{{cache_boundary}}
+
+<context>
+  <memory type="summary">
+{{memory}}
+  </memory>
+
+  <conversation type="recent">
+{{conversation}}
+  </conversation>
+</context>
+
+{{instruction}}
+
+<user>
+{{user_message}}
+</user>"""
+
+class _StaticParts(NamedTuple):
+    """某人设、某配置版本下预先绑定好的模板。"""
+    template: PromptTemplate                # 单条消息模式
+    system: Optional[str]                   # 拆分模式的 system 消息，模板不支持拆分时为 None
+    dynamic: Optional[PromptTemplate]       # 拆分模式的 user 消息模板
 
 class PromptBuilder:
     def __init__(self, config_loader: ConfigLoader):
         self.config_loader = config_loader
+        self._lock = threading.Lock()
+        self._template_version = -1
+        self._template: Optional[PromptTemplate] = None
+        # (人设名, 配置版本) -> 已绑定系统规则与人设的模板
+        self._static_cache: Dict[Tuple[str, int], _StaticParts] = {}
+
+    def _get_parts(self, persona: str) -> _StaticParts:
+        version = self.config_loader.version
+        key = (persona, version)
+        parts = self._static_cache.get(key)
+        if parts is not None:
+            return parts
+
+        with self._lock:
+            if self._template_version != version:
+                # 配置已重新加载：重新编译模板，旧版本的静态块全部作废
+                source = self.config_loader.prompt_template or DEFAULT_TEMPLATE
+                self._template = PromptTemplate(source.rstrip("\n"))
+                self._template_version = version
+                self._static_cache = {k: v for k, v in self._static_cache.items() if k[1] == version}
+            parts = self._static_cache.get(key)
+            if parts is None:
+                parts = self._bind(persona)
+                self._static_cache[key] = parts
+            return parts
+
+    def _bind(self, persona: str) -> _StaticParts:
+        bound = self._template.partial(
+            system_rules=self.config_loader.ai_rules_config.format(),
+            persona=self._get_persona(persona).format()
+        )
+        system, dynamic = None, None
+        halves = bound.split(CACHE_BOUNDARY)
+        if halves is not None and not halves[0].slots:
+            system, dynamic = halves[0].render_static(), halves[1]
+        else:
+            logger.warning(f"[PROMPT] NO_CACHE_BOUNDARY | persona: {persona} | 模板无法拆分出静态 system 消息，使用单条消息")
+        return _StaticParts(bound.partial(cache_boundary=""), system, dynamic)
+
+    def _get_persona(self, persona: str):
+        persona_config = self.config_loader.persona_config
+        if persona == DEFAULT_PERSONA:
+            return persona_config.default
+        return persona_config.extra_personas.get(persona, persona_config.default)
 
-    def build(self, 
-              user_input: str, 
-              context_str: str = "暂无", 
-              memory_str: str = "暂无", 
-              instruction: Optional[str] = None) -> str:
+    def build(self,
+              user_input: str,
+              context_str: str = "暂无",
+              memory_str: str = "暂无",
+              instruction: Optional[str] = None,
+              persona: str = DEFAULT_PERSONA) -> str:
         """
         构建标准的 XML 格式 Prompt。
-        
+
         Args:
             user_input: 用户的当前输入或特定的指令内容
             context_str: 近期对话历史摘要或原始内容
             memory_str: 相关记忆摘要
             instruction: 额外的动态指令（例如 Orchestrator 的风格指导）
-            
+            persona: 人设名称，默认 default
+
         Returns:
             组装好的 Prompt 字符串
         """
-        
-        # 1. 获取静态配置
-        ai_rules = self.config_loader.ai_rules_config.format()
-        persona = self.config_loader.persona_config.default.format()
-        
-        # 2. 组装 System 部分
-        system_section = f"""<system>
-  <protocol>
-{ai_rules}
-  </protocol>
-</system>"""
+        # 顺序由模板决定，通常 System -> Persona -> Context -> Instruction -> User
+        return self._get_parts(persona).template.render(
+            **self._dynamic_values(user_input, context_str, memory_str, instruction)
+        )
 
-        # 3. 组装 Persona 部分
-        persona_section = f"""<persona>
-{persona}
-</persona>"""
-
-        # 4. 组装 Context 部分
-        context_section = f"""<context>
-  <memory type="summary">
-{memory_str}
-  </memory>
-
-  <conversation type="recent">
-{context_str}
-  </conversation>
-</context>"""
-
-        # 5. 组装 Instruction 部分 (如果有)
-        instruction_section = ""
-        if instruction:
-            instruction_section = f"""<instruction>
-{instruction}
-</instruction>"""
-
-        # 6. 组装 User 部分
-        user_section = f"""<user>
-{user_input}
-</user>"""
+    def build_messages(self,
+                       user_input: str,
+                       context_str: str = "暂无",
+                       memory_str: str = "暂无",
+                       instruction: Optional[str] = None,
+                       persona: str = DEFAULT_PERSONA) -> List[Dict[str, str]]:
+        """
+        构建发送给 LLM 的消息列表。参数同 build()。
+        拆分模式下返回 [system (静态), user (动态)]，否则为单条 user 消息。
+        """
+        parts = self._get_parts(persona)
+        values = self._dynamic_values(user_input, context_str, memory_str, instruction)
+        if parts.system is None or not self.config_loader.system_config.prompt.split_system_message:
+            return [{"role": "user", "content": parts.template.render(**values)}]
+        return [
+            {"role": "system", "content": parts.system},
+            {"role": "user", "content": parts.dynamic.render(**values)}
+        ]
 
-        # 7. 最终拼接
-        # 注意：顺序很重要，通常 System -> Persona -> Context -> Instruction -> User
-        final_prompt = f"{system_section}\n\n{persona_section}\n\n{context_section}\n\n{instruction_section}\n\n{user_section}"
-        
-        return final_prompt
+    @staticmethod
+    def _dynamic_values(user_input: str, context_str: str, memory_str: str, instruction: Optional[str]) -> Dict[str, str]:
+        return {
+            "memory": memory_str,
+            "conversation": context_str,
+            "instruction": f"<instruction>\n{instruction}\n</instruction>" if instruction else "",
+            "user_message": user_input
+        }
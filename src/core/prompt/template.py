@@ -0,0 +1,84 @@
+"""
+文件职责：Prompt 模板引擎
+把带 {{name}} 占位符的模板 (如 config/prompt_template.txt) 一次性编译为静态片段与槽位：
+- render()：按槽位下标填入变量，单次 "".join 得到结果，不做任何字符串扫描或替换。
+- partial()：预先绑定部分变量 (系统规则、人设等静态内容)，相邻静态片段合并，
+  得到只剩动态槽位的新模板，可缓存复用。
+- split()：在指定槽位处一分为二 (如 {{cache_boundary}})，前半为稳定的 system 消息，后半为动态部分。
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+SLOT_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+class PromptTemplate:
+    def __init__(self, source: str):
+        segments: List[Tuple[bool, str]] = []   # (是否为槽位, 文本或槽位名)
+        pos = 0
+        for match in SLOT_PATTERN.finditer(source):
+            segments.append((False, source[pos:match.start()]))
+            segments.append((True, match.group(1)))
+            pos = match.end()
+        segments.append((False, source[pos:]))
+        self._compile(segments)
+
+    @classmethod
+    def _from_segments(cls, segments: List[Tuple[bool, str]]) -> "PromptTemplate":
+        template = cls.__new__(cls)
+        template._compile(segments)
+        return template
+
+    def _compile(self, segments: List[Tuple[bool, str]]):
+        """合并相邻静态片段，记录槽位在 parts 中的下标。"""
+        self._segments: List[Tuple[bool, str]] = []
+        for is_slot, text in segments:
+            if not is_slot and not text:
+                continue
+            if not is_slot and self._segments and not self._segments[-1][0]:
+                self._segments[-1] = (False, self._segments[-1][1] + text)
+            else:
+                self._segments.append((is_slot, text))
+        self._parts = [text if not is_slot else "" for is_slot, text in self._segments]
+        self._slots = [(i, text) for i, (is_slot, text) in enumerate(self._segments) if is_slot]
+
+    @property
+    def slots(self) -> List[str]:
+        return [name for _, name in self._slots]
+
+    def partial(self, **values: str) -> "PromptTemplate":
+        """绑定部分变量，返回新模板 (原模板不变)。"""
+        return self._from_segments([
+            (False, values[text]) if is_slot and text in values else (is_slot, text)
+            for is_slot, text in self._segments
+        ])
+
+    def split(self, name: str) -> Optional[Tuple["PromptTemplate", "PromptTemplate"]]:
+        """
+        在第一个名为 name 的槽位处拆分，槽位本身及其两侧紧邻的空白被丢弃。
+        模板中没有该槽位时返回 None。
+        """
+        for i, (is_slot, text) in enumerate(self._segments):
+            if is_slot and text == name:
+                before, after = list(self._segments[:i]), list(self._segments[i + 1:])
+                if before and not before[-1][0]:
+                    before[-1] = (False, before[-1][1].rstrip())
+                if after and not after[0][0]:
+                    after[0] = (False, after[0][1].lstrip())
+                return self._from_segments(before), self._from_segments(after)
+        return None
+
+    def render(self, **values: str) -> str:
+        parts = self._parts.copy()
+        for index, name in self._slots:
+            try:
+                parts[index] = values[name]
+            except KeyError:
+                raise KeyError(f"Prompt 模板缺少变量: {name}") from None
+        return "".join(parts)
+
+    def render_static(self) -> str:
+        """模板不含槽位时直接返回其文本。"""
+        if self._slots:
+            raise KeyError(f"Prompt 模板仍有未绑定的变量: {', '.join(self.slots)}")
+        return "".join(self._parts)
@@ -0,0 +1,173 @@
+"""
+文件职责：滚动摘要任务 (RollingSummaryService)
+把滑出短期上下文窗口的对话异步并入 ConversationContext.summary，回复链路上只做一次策略判断。
+- 触发：ChatService 每写入一条消息调用 on_message()，生成 CONTEXT_LIMIT / PERIODIC 提示；
+  后台巡检线程每 check_interval 秒为闲置用户生成 USER_IDLE 提示；stop_chat 等场景可调用 request()。
+  是否执行由 ISummaryTriggerPolicy (见 summary_policy.py) 决定。
+- 执行：单个工作线程按用户串行处理，同一用户同时最多一个任务 (排队中的重复请求被合并)。
+  LLM 失败时把取出的消息放回上下文，下次触发时重试。
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from src.core.config import RollingSummaryConfig
+from src.core.context import ConversationContext
+from src.core.logger import get_logger
+from src.core.memory_ingest import MemorySource
+from src.core.summary_contract import ISummaryTriggerPolicy, SummaryHint, SummaryTriggerReason
+from src.core.summary_policy import (
+    AnySummaryTriggerPolicy, ContextLimitTriggerPolicy, PeriodicTriggerPolicy, UserIdleTriggerPolicy
+)
+
+logger = get_logger("RollingSummary")
+
+# 这些原因下窗口中只保留最近 keep_recent 条，其余一并并入摘要
+COMPACT_REASONS = (SummaryTriggerReason.USER_IDLE, SummaryTriggerReason.SESSION_END, SummaryTriggerReason.MANUAL)
+
+def build_default_policy(config: RollingSummaryConfig) -> ISummaryTriggerPolicy:
+    return AnySummaryTriggerPolicy([
+        ContextLimitTriggerPolicy(config.min_evicted_turns),
+        UserIdleTriggerPolicy(config.idle_seconds, config.idle_min_depth),
+        PeriodicTriggerPolicy(config.periodic_turns),
+    ])
+
+class RollingSummaryService:
+    def __init__(self, llm_client, context_provider: Callable[[int], Optional[ConversationContext]],
+                 user_lister: Callable[[], List[int]], config: Optional[RollingSummaryConfig] = None,
+                 policy: Optional[ISummaryTriggerPolicy] = None, source: MemorySource = MemorySource.TELEGRAM):
+        self.llm_client = llm_client
+        self.context_provider = context_provider
+        self.user_lister = user_lister
+        self.config = config or RollingSummaryConfig()
+        self.policy = policy or build_default_policy(self.config)
+        self.source = source
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._scheduled: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._counters: Dict[str, int] = {"triggered": 0, "succeeded": 0, "failed": 0, "folded_turns": 0}
+
+    # ================== 生命周期 ==================
+
+    def start(self):
+        if self._threads or not self.config.enabled:
+            return
+        self._stopping.clear()
+        for name, target in (("RollingSummary", self._run), ("RollingSummaryIdle", self._sweep_idle)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"[SUMMARY] START | idle_seconds: {self.config.idle_seconds} | min_evicted: {self.config.min_evicted_turns}")
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stopping.set()
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ================== 触发 ==================
+
+    def on_message(self, user_id: int):
+        """每写入一条消息后调用：检查 CONTEXT_LIMIT 与 PERIODIC。"""
+        if not self.config.enabled:
+            return
+        ctx = self.context_provider(user_id)
+        if ctx is None:
+            return
+        foldable = ctx.foldable_count()
+        if foldable == 0:
+            return
+        snapshot = ctx.to_snapshot(user_id)
+        for reason in (SummaryTriggerReason.CONTEXT_LIMIT, SummaryTriggerReason.PERIODIC):
+            hint = SummaryHint(user_id, self.source, reason, payload={"foldable_turns": foldable})
+            if self.policy.should_trigger(snapshot, hint):
+                self._schedule(user_id, reason)
+                return
+
+    def request(self, user_id: int, reason: SummaryTriggerReason, payload: Optional[dict] = None) -> bool:
+        """外部提示 (如会话结束、手动触发)，经策略判断后排队。返回是否排队。"""
+        if not self.config.enabled:
+            return False
+        ctx = self.context_provider(user_id)
+        if ctx is None:
+            return False
+        keep_recent = self.config.keep_recent if reason in COMPACT_REASONS else None
+        payload = dict(payload or {}, foldable_turns=ctx.foldable_count(keep_recent))
+        if not self.policy.should_trigger(ctx.to_snapshot(user_id), SummaryHint(user_id, self.source, reason, payload=payload)):
+            return False
+        self._schedule(user_id, reason)
+        return True
+
+    def _sweep_idle(self):
+        while not self._stopping.wait(self.config.check_interval):
+            now = time.time()
+            for user_id in self.user_lister():
+                ctx = self.context_provider(user_id)
+                if ctx is None or now - ctx.last_active < self.config.idle_seconds:
+                    continue
+                self.request(user_id, SummaryTriggerReason.USER_IDLE, {"idle_seconds": now - ctx.last_active})
+
+    def _schedule(self, user_id: int, reason: SummaryTriggerReason):
+        with self._lock:
+            if user_id in self._scheduled:
+                return
+            self._scheduled.add(user_id)
+            self._counters["triggered"] += 1
+        self._queue.put((user_id, reason))
+        logger.debug(f"[SUMMARY] SCHEDULE | user_id: {user_id} | reason: {reason.value}")
+
+    # ================== 执行 ==================
+
+    def _run(self):
+        while not self._stopping.is_set():
+            job = self._queue.get()
+            if job is None:
+                return
+            user_id, reason = job
+            with self._lock:
+                self._scheduled.discard(user_id)
+            try:
+                self.fold(user_id, reason)
+            except Exception as e:
+                logger.error(f"[SUMMARY] JOB_FAIL | user_id: {user_id} | error: {e}", exc_info=True)
+
+    def fold(self, user_id: int, reason: SummaryTriggerReason) -> bool:
+        """取出待并入的消息，调用 LLM 生成新摘要并写回上下文。"""
+        ctx = self.context_provider(user_id)
+        if ctx is None:
+            return False
+        keep_recent = self.config.keep_recent if reason in COMPACT_REASONS else None
+        previous, messages = ctx.take_for_summary(keep_recent)
+        if not messages:
+            return False
+
+        start = time.time()
+        summary = self.llm_client.summarize_conversation(
+            previous, ConversationContext.format_messages(messages), self.config.max_chars
+        )
+        with self._lock:
+            if summary is None:
+                self._counters["failed"] += 1
+            else:
+                self._counters["succeeded"] += 1
+                self._counters["folded_turns"] += len(messages)
+
+        if summary is None:
+            ctx.restore_for_summary(messages)
+            return False
+        ctx.update_summary(summary)
+        logger.info(f"[SUMMARY] FOLD | user_id: {user_id} | reason: {reason.value} | turns: {len(messages)} | "
+                    f"length: {len(summary)} | duration: {time.time() - start:.2f}s")
+        return True
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["scheduled"] = len(self._scheduled)
+        return stats
@@ -0,0 +1,64 @@
+"""
+文件职责：流式输出切分
+将 LLM 流式返回的增量文本 (delta) 按 ai_rules 约定的 '$' 分隔符切分成可以立即发送的消息片段。
+切分规则与 InteractionManager 的非流式切分保持一致：优先 '$'，整段回复都没有 '$' 时按换行切分。
+"""
+
+from typing import Iterable, Iterator, List
+
+FRAGMENT_DELIMITER = "$"
+
+def split_fragments(text: str) -> List[str]:
+    """
+    非流式切分：优先使用 '$'，然后是换行符。
+    Prompt 通常指示使用 '$' 进行分割。
+    """
+    if not text:
+        return []
+
+    if FRAGMENT_DELIMITER in text:
+        parts = text.split(FRAGMENT_DELIMITER)
+    else:
+        # 如果没有 '$'，则回退到换行符分割
+        parts = text.split('\n')
+
+    chunks = [p.strip() for p in parts if p.strip()]
+    return chunks or [text]
+
+class FragmentSplitter:
+    """
+    增量切分器。
+    feed() 每收到一个 delta 就返回已经完整的片段（遇到 '$' 即切分），
+    flush() 在流结束时返回剩余内容。
+    """
+    def __init__(self, delimiter: str = FRAGMENT_DELIMITER):
+        self.delimiter = delimiter
+        self._buffer = ""
+        self._seen_delimiter = False
+
+    def feed(self, delta: str) -> List[str]:
+        if not delta:
+            return []
+        self._buffer += delta
+        if self.delimiter not in self._buffer:
+            return []
+
+        self._seen_delimiter = True
+        *finished, self._buffer = self._buffer.split(self.delimiter)
+        return [f.strip() for f in finished if f.strip()]
+
+    def flush(self) -> List[str]:
+        rest, self._buffer = self._buffer, ""
+        if not rest.strip():
+            return []
+        if self._seen_delimiter:
+            return [rest.strip()]
+        # 整段回复都没有 '$'，与非流式行为一致，按换行切分
+        return split_fragments(rest)
+
+def iter_fragments(deltas: Iterable[str], delimiter: str = FRAGMENT_DELIMITER) -> Iterator[str]:
+    """将 delta 流转换为完整片段流。"""
+    splitter = FragmentSplitter(delimiter)
+    for delta in deltas:
+        yield from splitter.feed(delta)
+    yield from splitter.flush()
@@ -0,0 +1,64 @@
+"""
+文件职责：总结触发策略
+ISummaryTriggerPolicy (见 summary_contract.py) 的具体实现，决定何时把滑出窗口的对话并入滚动摘要：
+- ContextLimitTriggerPolicy：短期上下文已满，滑出的消息累计到一定数量 (CONTEXT_LIMIT)。
+- UserIdleTriggerPolicy：用户闲置超过阈值，且对话足够长 (USER_IDLE)。
+- PeriodicTriggerPolicy：每 N 轮例行检查一次 (PERIODIC)。
+- AnySummaryTriggerPolicy：组合以上策略，任一满足即触发；SESSION_END / MANUAL 总是触发。
+
+hint.payload 约定的字段：
+    foldable_turns  当前可并入摘要的消息数
+    idle_seconds    用户已闲置的秒数 (USER_IDLE)
+"""
+
+from typing import List, Optional
+
+from src.core.context_snapshot import ContextSnapshot
+from src.core.summary_contract import ISummaryTriggerPolicy, SummaryHint, SummaryTriggerReason
+
+def _foldable(hint: Optional[SummaryHint]) -> int:
+    return int(hint.payload.get("foldable_turns", 0)) if hint else 0
+
+class ContextLimitTriggerPolicy(ISummaryTriggerPolicy):
+    def __init__(self, min_evicted_turns: int = 6):
+        self.min_evicted_turns = min_evicted_turns
+
+    def should_trigger(self, snapshot: ContextSnapshot, hint: Optional[SummaryHint] = None) -> bool:
+        if hint is None or hint.reason != SummaryTriggerReason.CONTEXT_LIMIT:
+            return False
+        return _foldable(hint) >= self.min_evicted_turns
+
+class UserIdleTriggerPolicy(ISummaryTriggerPolicy):
+    def __init__(self, idle_seconds: float = 600, min_depth: int = 4):
+        self.idle_seconds = idle_seconds
+        self.min_depth = min_depth
+
+    def should_trigger(self, snapshot: ContextSnapshot, hint: Optional[SummaryHint] = None) -> bool:
+        if hint is None or hint.reason != SummaryTriggerReason.USER_IDLE:
+            return False
+        if snapshot.state.interaction_depth < self.min_depth:
+            return False  # 对话太短，不值得总结
+        return hint.payload.get("idle_seconds", 0) >= self.idle_seconds and _foldable(hint) > 0
+
+class PeriodicTriggerPolicy(ISummaryTriggerPolicy):
+    def __init__(self, every_n_turns: int):
+        self.every_n_turns = every_n_turns
+
+    def should_trigger(self, snapshot: ContextSnapshot, hint: Optional[SummaryHint] = None) -> bool:
+        if self.every_n_turns <= 0:
+            return False
+        if hint is not None and hint.reason != SummaryTriggerReason.PERIODIC:
+            return False
+        depth = snapshot.state.interaction_depth
+        return depth > 0 and depth % self.every_n_turns == 0 and (hint is None or _foldable(hint) > 0)
+
+class AnySummaryTriggerPolicy(ISummaryTriggerPolicy):
+    ALWAYS = (SummaryTriggerReason.SESSION_END, SummaryTriggerReason.MANUAL)
+
+    def __init__(self, policies: List[ISummaryTriggerPolicy]):
+        self.policies = policies
+
+    def should_trigger(self, snapshot: ContextSnapshot, hint: Optional[SummaryHint] = None) -> bool:
+        if hint is not None and hint.reason in self.ALWAYS:
+            return _foldable(hint) > 0
+        return any(policy.should_trigger(snapshot, hint) for policy in self.policies)
@@ -0,0 +1,143 @@
+"""
+文件职责：时间轮定时器 (TimerWheel)
+替代 "每个延迟任务一个 threading.Timer" 的做法：所有定时任务挂在一个哈希时间轮上，
+由单个线程按 tick 推进，到期任务交给有界线程池执行。
+- schedule(key, delay, fn, *args)：同一 key 已有任务时直接替换 (防抖重置)，O(1)。
+- cancel(key)：O(1)。
+- 精度为 tick (默认 50ms)；超过一圈的任务留在槽中，直到所在圈到达才触发。
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+from src.core.logger import get_logger
+
+logger = get_logger("TimerWheel")
+
+DEFAULT_TICK = 0.05
+DEFAULT_WHEEL_SIZE = 512
+LAG_WINDOW = 1000
+
+class _TimerEntry:
+    __slots__ = ("key", "target_tick", "deadline", "callback", "args")
+
+    def __init__(self, key: Hashable, target_tick: int, deadline: float, callback: Callable[..., Any], args: tuple):
+        self.key = key
+        self.target_tick = target_tick
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+
+class TimerWheel:
+    def __init__(self, tick: float = DEFAULT_TICK, wheel_size: int = DEFAULT_WHEEL_SIZE,
+                 workers: int = 8, name: str = "TimerWheel"):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.name = name
+        self.workers = workers
+
+        self._slots: List[Dict[Hashable, _TimerEntry]] = [{} for _ in range(wheel_size)]
+        self._entries: Dict[Hashable, _TimerEntry] = {}
+        self._origin = time.monotonic()
+        self._current_tick = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self._counters: Dict[str, int] = {"scheduled": 0, "rescheduled": 0, "cancelled": 0, "fired": 0, "failed": 0}
+        self._lags: Deque[float] = deque(maxlen=LAG_WINDOW)    # 实际触发时间 - 期望时间
+
+    # ================== 生命周期 ==================
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-worker")
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"[TIMER] WHEEL_START | name: {self.name} | tick: {self.tick}s | slots: {self.wheel_size} | workers: {self.workers}")
+
+    def stop(self, wait: bool = True):
+        """停止推进时间轮；未到期的任务被丢弃，已提交到线程池的任务按 wait 决定是否等待完成。"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    # ================== 调度 ==================
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[..., Any], *args):
+        """delay 秒后在工作线程中执行 callback(*args)。同一 key 的未触发任务被替换。"""
+        deadline = time.monotonic() + max(0.0, delay)
+        with self._lock:
+            target = max(self._current_tick + 1, math.ceil((deadline - self._origin) / self.tick))
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._slots[old.target_tick % self.wheel_size].pop(key, None)
+                self._counters["rescheduled"] += 1
+            entry = _TimerEntry(key, target, deadline, callback, args)
+            self._entries[key] = entry
+            self._slots[target % self.wheel_size][key] = entry
+            self._counters["scheduled"] += 1
+
+    def cancel(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._slots[entry.target_tick % self.wheel_size].pop(key, None)
+            self._counters["cancelled"] += 1
+            return True
+
+    def pending(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    # ================== 推进 ==================
+
+    def _run(self):
+        while not self._stopping.is_set():
+            wait = self._origin + (self._current_tick + 1) * self.tick - time.monotonic()
+            if wait > 0 and self._stopping.wait(wait):
+                return
+            with self._lock:
+                self._current_tick += 1
+                slot = self._slots[self._current_tick % self.wheel_size]
+                due = [entry for entry in slot.values() if entry.target_tick <= self._current_tick]
+                for entry in due:
+                    del slot[entry.key]
+                    del self._entries[entry.key]
+            for entry in due:
+                self._executor.submit(self._fire, entry)
+
+    def _fire(self, entry: _TimerEntry):
+        lag = time.monotonic() - entry.deadline
+        try:
+            entry.callback(*entry.args)
+            failed = False
+        except Exception as e:
+            failed = True
+            logger.error(f"[TIMER] CALLBACK_FAIL | name: {self.name} | key: {entry.key} | error: {e}", exc_info=True)
+        with self._lock:
+            self._counters["failed" if failed else "fired"] += 1
+            self._lags.append(lag)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回调度 / 重置 / 取消 / 触发计数、待触发任务数与触发延迟 (lag) 分位数。"""
+        with self._lock:
+            data: Dict[str, Any] = dict(self._counters)
+            data["pending"] = len(self._entries)
+            ordered = sorted(self._lags)
+        if ordered:
+            data["lag_p50"] = ordered[int(0.50 * (len(ordered) - 1))]
+            data["lag_p99"] = ordered[int(0.99 * (len(ordered) - 1))]
+        return data
@@ -0,0 +1,70 @@
+"""
+文件职责：Token 计数 (Tokenizer)
+上下文窗口按 token 预算裁剪历史时使用的计数器，可插拔：
+- ByteLengthTokenizer：按 UTF-8 字节数估算 (默认，无依赖)。中文一个字 3 字节约 1 token，
+  英文约 4 字节 1 token，按 3 字节折算对英文偏保守。
+- HuggingFaceTokenizer：加载 transformers 的分词器精确计数 (context.tokenizer 填模型名或本地路径)。
+  transformers 不可用或加载失败时回退到字节估算。
+"""
+
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from src.core.logger import get_logger
+
+logger = get_logger("Tokenizer")
+
+BYTES_PER_TOKEN = 3
+TOKENIZER_BYTES = "bytes"
+
+class Tokenizer(ABC):
+    """计数接口：只需要实现 count()。"""
+    name = "base"
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        pass
+
+class ByteLengthTokenizer(Tokenizer):
+    name = TOKENIZER_BYTES
+
+    def __init__(self, bytes_per_token: int = BYTES_PER_TOKEN):
+        self.bytes_per_token = bytes_per_token
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text.encode("utf-8")) / self.bytes_per_token)
+
+class HuggingFaceTokenizer(Tokenizer):
+    def __init__(self, name_or_path: str):
+        from transformers import AutoTokenizer  # 可选依赖，仅在配置了分词器时导入
+        self.name = name_or_path
+        self._tokenizer = AutoTokenizer.from_pretrained(name_or_path)
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False))
+
+_cache: Dict[str, Tokenizer] = {}
+_cache_lock = threading.Lock()
+
+def get_tokenizer(name: Optional[str] = None) -> Tokenizer:
+    """按名称获取 (并缓存) 分词器。为空或 "bytes" 时使用字节估算。"""
+    key = name or TOKENIZER_BYTES
+    with _cache_lock:
+        tokenizer = _cache.get(key)
+        if tokenizer is None:
+            tokenizer = _load(key)
+            _cache[key] = tokenizer
+        return tokenizer
+
+def _load(name: str) -> Tokenizer:
+    if name == TOKENIZER_BYTES:
+        return ByteLengthTokenizer()
+    try:
+        tokenizer = HuggingFaceTokenizer(name)
+        logger.info(f"[TOKENIZER] LOADED | name: {name}")
+        return tokenizer
+    except Exception as e:
+        logger.warning(f"[TOKENIZER] FALLBACK_BYTES | name: {name} | error: {e}")
+        return ByteLengthTokenizer()
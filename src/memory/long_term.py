@@ -1,23 +1,38 @@
+import time
+
+from src.core.memory import embedding
+from src.core.memory.vector_index import VectorIndex
+
 class LongTermMemory:
     """
     长期记忆 (Episodic / Semantic Memory)
     负责存储重要的对话摘要、事实性信息
-    通常需要向量数据库支持，这里先做简单的接口抽象
+    检索使用 CPU 文本向量 + 内存向量索引 (见 src/core/memory/embedding.py、vector_index.py)
     """
     
+    MIN_SIMILARITY = 0.12
+
     def __init__(self):
-        # 简单示例：用列表模拟
         self.memories = []
+        self.index = VectorIndex()
 
     def remember(self, content: str, tags: list = None):
         """存储一条长期记忆"""
         self.memories.append({
             "content": content,
             "tags": tags or [],
-            "timestamp": "..."
+            "timestamp": time.time()
         })
+        vec = embedding.embed(embedding.memory_text(content, ",".join(tags or [])))
+        if not embedding.is_empty(vec):
+            self.index.upsert(len(self.memories) - 1, vec)
         
-    def recall(self, query: str) -> list:
-        """检索相关记忆"""
-        # TODO: 实现语义搜索
-        return [m for m in self.memories if query in m["content"]]
+    def recall(self, query: str, k: int = 5) -> list:
+        """检索与 query 语义最相关的至多 k 条记忆，按相似度降序"""
+        query_vec = embedding.embed(query)
+        if embedding.is_empty(query_vec):
+            return []
+        return [
+            self.memories[i] for i, score in self.index.search(query_vec, k)
+            if score >= self.MIN_SIMILARITY
+        ]